@@ -0,0 +1,301 @@
+"""
+Measures the throughput of AwsScanner.scan against a fake AWS, without network access or credentials.
+
+The scan runs real boto3 clients (request serialization, response parsing, pagination and retries), but every request is
+answered by a stand-in transport (a botocore `before-send` handler) after a configurable latency, and a configurable share of
+the requests is throttled. The fake account holds the given number of resources, split evenly between its regions and between
+DynamoDB tables (listed, then described one by one) and CloudWatch log groups (listed in pages).
+
+Reports the wall time, the calls per second, the peak RSS and the peak thread count of the scan. The report is compared to
+the stored baseline of the same scenario in --baseline (benchmarks/baselines.json by default, which has the baseline of the
+default scenario), and the benchmark fails (exit code 1) if the scan regressed beyond the tolerance.
+--save-baseline stores the report as the baseline of its scenario, e.g. after an intended change of performance,
+or to add the baseline of another scenario. The baselines are machine dependent, so compare runs on the machine that stored them.
+
+Usage:
+    python -m benchmarks.benchmark_aws_scan [--resources 1000] [--regions us-east-1,eu-west-1] [--latency-ms 20] [--throttle-rate 0.0]
+                                            [--max-workers 20] [--stream-results] [--baseline FILE] [--save-baseline FILE] [--tolerance 0.2]
+
+    # Compares the default scenario to its stored baseline
+    python -m benchmarks.benchmark_aws_scan
+    # Stores a new baseline of the default scenario
+    python -m benchmarks.benchmark_aws_scan --save-baseline benchmarks/baselines.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import boto3
+import botocore.session
+from botocore.awsrequest import AWSResponse
+
+from dragoneye.cloud_scanner.aws.aws_scanner import AwsScanner, AwsCloudScanSettings
+from dragoneye.config import config
+
+SCAN_COMMANDS = """
+- Service: dynamodb
+  Request: list-tables
+- Service: dynamodb
+  Request: describe-table
+  Parameters:
+    - Name: TableName
+      Value: dynamodb-list-tables.json|.TableNames[]
+- Service: logs
+  Request: describe-log-groups
+"""
+
+TABLES_PAGE_SIZE = 100
+LOG_GROUPS_PAGE_SIZE = 50
+REGION_PATTERN = re.compile(r'\.([a-z]{2}(?:-[a-z]+)+-\d)\.')
+# The measures that regress when they grow, and when they shrink
+HIGHER_IS_WORSE = ['wall_seconds', 'peak_rss_mb', 'peak_threads']
+LOWER_IS_WORSE = ['calls_per_second']
+# The stored baselines, which the runs are compared to by default
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+
+class _RawBody:
+    def __init__(self, body: bytes):
+        self._body = body
+
+    def stream(self, **_kwargs):
+        yield self._body
+
+
+class FakeAws:
+    """
+    Answers the requests of boto3 clients instead of AWS, from a synthetic account.
+    """
+
+    def __init__(self, resources: int, regions: List[str], latency: float, throttle_rate: float, seed: int = 0):
+        self.regions: List[str] = regions
+        per_region = max(resources // len(regions), 1)
+        self.tables_per_region: int = per_region // 2
+        self.log_groups_per_region: int = per_region - self.tables_per_region
+        self.latency: float = latency
+        self.throttle_rate: float = throttle_rate
+        self.calls: int = 0
+        self.throttled_calls: int = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def create_session(self, region: str):
+        botocore_session = botocore.session.Session()
+        botocore_session.register('before-send', self.handle_request)
+        return boto3.Session(aws_access_key_id='benchmark', aws_secret_access_key='benchmark',
+                             region_name=region, botocore_session=botocore_session)
+
+    def handle_request(self, request, **_kwargs) -> AWSResponse:
+        with self._lock:
+            self.calls += 1
+            throttled = self._random.random() < self.throttle_rate
+            if throttled:
+                self.throttled_calls += 1
+        time.sleep(self.latency)
+
+        target = request.headers.get('X-Amz-Target')
+        if target is None:
+            # The query protocol of ec2, which is only called for the regions of the account
+            return self._respond(request, 200, self._describe_regions_xml(), {'Content-Type': 'text/xml'})
+        if throttled:
+            return self._respond_json(request, 400, {'__type': 'ThrottlingException', 'message': 'Rate exceeded'})
+
+        operation = (target.decode() if isinstance(target, bytes) else target).split('.')[-1]
+        body = json.loads(request.body or b'{}')
+        handlers = {
+            'ListTables': self._list_tables,
+            'DescribeTable': self._describe_table,
+            'DescribeLogGroups': self._describe_log_groups,
+        }
+        return self._respond_json(request, 200, handlers[operation](REGION_PATTERN.search(request.url).group(1), body))
+
+    def _list_tables(self, _region: str, body: dict) -> dict:
+        start = int(body['ExclusiveStartTableName'].split('-')[-1]) + 1 if 'ExclusiveStartTableName' in body else 0
+        end = min(start + body.get('Limit', TABLES_PAGE_SIZE), self.tables_per_region)
+        result = {'TableNames': [f'table-{index:06}' for index in range(start, end)]}
+        if end < self.tables_per_region:
+            result['LastEvaluatedTableName'] = result['TableNames'][-1]
+        return result
+
+    @staticmethod
+    def _describe_table(region: str, body: dict) -> dict:
+        name = body['TableName']
+        return {'Table': {
+            'TableName': name,
+            'TableArn': f'arn:aws:dynamodb:{region}:123456789012:table/{name}',
+            'TableStatus': 'ACTIVE',
+            'CreationDateTime': 1609459200.0,
+            'ItemCount': 1000,
+            'TableSizeBytes': 65536,
+            'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [{'AttributeName': 'id', 'AttributeType': 'S'}],
+            'BillingModeSummary': {'BillingMode': 'PAY_PER_REQUEST'},
+            'SSEDescription': {'Status': 'ENABLED', 'SSEType': 'KMS'}
+        }}
+
+    def _describe_log_groups(self, region: str, body: dict) -> dict:
+        start = int(body.get('nextToken', 0))
+        end = min(start + LOG_GROUPS_PAGE_SIZE, self.log_groups_per_region)
+        result = {'logGroups': [{
+            'logGroupName': f'/aws/lambda/function-{index:06}',
+            'arn': f'arn:aws:logs:{region}:123456789012:log-group:/aws/lambda/function-{index:06}:*',
+            'creationTime': 1609459200000,
+            'retentionInDays': 30,
+            'storedBytes': 1024
+        } for index in range(start, end)]}
+        if end < self.log_groups_per_region:
+            result['nextToken'] = str(end)
+        return result
+
+    def _describe_regions_xml(self) -> bytes:
+        items = ''.join(f'<item><regionName>{region}</regionName><regionEndpoint>ec2.{region}.amazonaws.com</regionEndpoint>'
+                        f'<optInStatus>opt-in-not-required</optInStatus></item>' for region in self.regions)
+        return (f'<DescribeRegionsResponse xmlns="http://ec2.amazonaws.com/doc/2016-11-15/"><requestId>benchmark</requestId>'
+                f'<regionInfo>{items}</regionInfo></DescribeRegionsResponse>').encode()
+
+    @staticmethod
+    def _respond(request, status_code: int, body: bytes, headers: Dict[str, str]) -> AWSResponse:
+        return AWSResponse(request.url, status_code, headers, _RawBody(body))
+
+    def _respond_json(self, request, status_code: int, result: dict) -> AWSResponse:
+        return self._respond(request, status_code, json.dumps(result).encode(), {'Content-Type': 'application/x-amz-json-1.0'})
+
+
+class _ThreadsMonitor:
+    """
+    Samples the number of threads of the process until it is stopped, since threads come and go during the scan.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.peak_threads: int = threading.active_count()
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    def _sample(self):
+        while not self._stopped.wait(self._interval):
+            # The monitor thread itself is not counted
+            self.peak_threads = max(self.peak_threads, threading.active_count() - 1)
+
+
+def _get_peak_rss_mb() -> float:
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def run_scan(fake_aws: FakeAws, max_workers: int, stream_results: bool) -> dict:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        commands_path = os.path.join(temp_dir, 'scan_commands.yaml')
+        with open(commands_path, 'w') as commands_file:
+            commands_file.write(SCAN_COMMANDS)
+        settings = AwsCloudScanSettings(commands_path=commands_path,
+                                        account_name='benchmark',
+                                        regions_filter=fake_aws.regions,
+                                        default_region=fake_aws.regions[0],
+                                        output_path=os.path.join(temp_dir, 'output'),
+                                        max_workers=max_workers,
+                                        # The rate of the scanner is not limited, so the benchmark measures its overhead
+                                        max_requests_per_second=100000,
+                                        stream_results=stream_results)
+        scanner = AwsScanner(fake_aws.create_session(fake_aws.regions[0]), settings)
+
+        with _ThreadsMonitor() as threads_monitor:
+            start = time.perf_counter()
+            scanner.scan()
+            wall_seconds = time.perf_counter() - start
+
+    return {
+        'calls': fake_aws.calls,
+        'throttled_calls': fake_aws.throttled_calls,
+        'wall_seconds': round(wall_seconds, 3),
+        'calls_per_second': round(fake_aws.calls / wall_seconds, 1),
+        'peak_rss_mb': round(_get_peak_rss_mb(), 1),
+        'peak_threads': threads_monitor.peak_threads,
+    }
+
+
+def compare_to_baseline(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Returns the regressions of the report, as messages.
+    """
+    regressions = []
+    for measure in HIGHER_IS_WORSE:
+        if report[measure] > baseline[measure] * (1 + tolerance):
+            regressions.append(f'{measure} grew from {baseline[measure]} to {report[measure]}')
+    for measure in LOWER_IS_WORSE:
+        if report[measure] < baseline[measure] * (1 - tolerance):
+            regressions.append(f'{measure} dropped from {baseline[measure]} to {report[measure]}')
+    return regressions
+
+
+def _load_baselines(path: Optional[str]) -> dict:
+    if path is None or not os.path.isfile(path):
+        return {}
+    with open(path, 'r') as baselines_file:
+        return json.load(baselines_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--resources', type=int, default=1000, help='The number of resources in the fake account')
+    parser.add_argument('--regions', default='us-east-1,eu-west-1', help='The regions of the fake account, comma separated')
+    parser.add_argument('--latency-ms', type=float, default=20, help='The latency of every call to the fake AWS')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='The share of the calls that the fake AWS throttles (0 to 1)')
+    parser.add_argument('--max-workers', type=int, default=config.get('MAX_WORKERS'), help='The max_workers of the scan')
+    parser.add_argument('--stream-results', action='store_true', help='Scan with stream_results')
+    parser.add_argument('--baseline', default=BASELINES_FILE, help='A JSON file of baselines to compare the report to')
+    parser.add_argument('--save-baseline', help='A JSON file of baselines to store the report in, as the baseline of its scenario')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='The change from the baseline that counts as a regression')
+    args = parser.parse_args()
+
+    regions = args.regions.split(',')
+    scenario = (f'resources={args.resources} regions={len(regions)} latency_ms={args.latency_ms} throttle_rate={args.throttle_rate} '
+                f'max_workers={args.max_workers} stream_results={args.stream_results}')
+    fake_aws = FakeAws(args.resources, regions, args.latency_ms / 1000, args.throttle_rate)
+    report = run_scan(fake_aws, args.max_workers, args.stream_results)
+
+    print(scenario)
+    for measure, value in report.items():
+        print(f'{measure:<20}{value:>12}')
+
+    exit_code = 0
+    baseline = _load_baselines(args.baseline).get(scenario)
+    if args.baseline and baseline is None:
+        print(f'{args.baseline} has no baseline for this scenario')
+    elif baseline is not None:
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION: {regression}')
+        if not regressions:
+            print(f'No regressions from the baseline (tolerance: {args.tolerance:.0%})')
+        exit_code = 1 if regressions else 0
+
+    if args.save_baseline:
+        baselines = _load_baselines(args.save_baseline)
+        baselines[scenario] = report
+        with open(args.save_baseline, 'w') as baselines_file:
+            json.dump(baselines, baselines_file, indent=4, sort_keys=True)
+        print(f'Saved the baseline of the scenario to {args.save_baseline}')
+
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
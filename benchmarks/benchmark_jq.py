@@ -0,0 +1,52 @@
+"""
+Compares the cost of a single evaluation of a dynamic parameter expression: compiling the jq filter on every evaluation
+(`pyjq.all`, as dynamic parameters used to be resolved) versus reusing the cached compiled program (`compile_jq`).
+
+Usage:
+    python -m benchmarks.benchmark_jq [--items 10] [--evaluations 1000]
+"""
+import argparse
+import timeit
+
+import pyjq
+
+from dragoneye.utils.misc_utils import compile_jq
+
+QUERIES = [
+    '.Vpcs[].VpcId',
+    '.Vpcs[] | select(.IsDefault == false) | [.VpcId, .CidrBlock]',
+    '.Vpcs[] | {VpcId: .VpcId, Tags: ([.Tags[]? | select(.Key == "Name") | .Value] | first)}',
+]
+
+
+def _build_result(items_count: int) -> dict:
+    return {
+        'Vpcs': [
+            {
+                'VpcId': f'vpc-{index:017x}',
+                'CidrBlock': f'10.{index % 256}.0.0/16',
+                'IsDefault': index == 0,
+                'State': 'available',
+                'Tags': [{'Key': 'Name', 'Value': f'vpc-{index}'}]
+            }
+            for index in range(items_count)
+        ]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=10, help='The number of items in the queried result')
+    parser.add_argument('--evaluations', type=int, default=1000, help='The number of evaluations of each expression')
+    args = parser.parse_args()
+
+    result = _build_result(args.items)
+    print(f'{"expression":<90}{"pyjq.all (us)":>15}{"compiled (us)":>15}{"speedup":>10}')
+    for query in QUERIES:
+        uncached = min(timeit.repeat(lambda: pyjq.all(query, result), number=args.evaluations, repeat=3)) / args.evaluations
+        cached = min(timeit.repeat(lambda: compile_jq(query).all(result), number=args.evaluations, repeat=3)) / args.evaluations
+        print(f'{query:<90}{uncached * 1e6:>15.1f}{cached * 1e6:>15.1f}{uncached / cached:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
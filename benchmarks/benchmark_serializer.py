@@ -0,0 +1,74 @@
+"""
+Compares the result file formats of dragoneye: the time it takes to encode a scan result and the size of the encoded result.
+
+Usage:
+    python -m benchmarks.benchmark_serializer [--items 20000] [--repeats 5]
+"""
+import argparse
+import timeit
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from dragoneye.utils import json_serializer
+from dragoneye.utils.json_serializer import ResultsFormat, dumps
+
+
+def _build_result(items_count: int) -> dict:
+    launch_time = datetime(2021, 1, 1)
+    return {
+        'Reservations': [
+            {
+                'ReservationId': f'r-{index:017x}',
+                'OwnerId': '123456789012',
+                'Instances': [{
+                    'InstanceId': f'i-{index:017x}',
+                    'InstanceType': 't3.medium',
+                    'LaunchTime': launch_time + timedelta(minutes=index),
+                    'PrivateIpAddress': f'10.0.{index // 256 % 256}.{index % 256}',
+                    'State': {'Code': 16, 'Name': 'running'},
+                    'SecurityGroups': [{'GroupId': f'sg-{index:017x}', 'GroupName': 'default'}],
+                    'Tags': [{'Key': 'Name', 'Value': f'instance-{index}'}, {'Key': 'Environment', 'Value': 'production'}],
+                    'UserData': b'#!/bin/bash\necho hello',
+                    'EbsOptimized': False,
+                    'CpuOptions': {'CoreCount': 1, 'ThreadsPerCore': 2}
+                }]
+            }
+            for index in range(items_count)
+        ]
+    }
+
+
+def _benchmark(result: dict, repeats: int, results_format: ResultsFormat, sort_keys: bool, native_encoder: bool):
+    with patch.object(json_serializer, 'orjson', json_serializer.orjson if native_encoder else None):
+        seconds = min(timeit.repeat(lambda: dumps(result, results_format, sort_keys), number=1, repeat=repeats))
+        size = len(dumps(result, results_format, sort_keys).encode('utf-8'))
+    return seconds, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=20000, help='The number of items in the scan result')
+    parser.add_argument('--repeats', type=int, default=5, help='The number of times each format is encoded (the fastest run is reported)')
+    args = parser.parse_args()
+
+    result = _build_result(args.items)
+    cases = [
+        ('pretty, sorted (current output)', ResultsFormat.PRETTY, True, False),
+        ('compact, stdlib encoder', ResultsFormat.COMPACT, False, False),
+    ]
+    if json_serializer.is_native_encoder_available():
+        cases.append(('compact, native encoder', ResultsFormat.COMPACT, False, True))
+    else:
+        print('orjson is not installed, so the native encoder is not benchmarked (pip install .[fast-json])')
+
+    baseline_seconds, baseline_size = None, None
+    print(f'{"format":<35}{"time (ms)":>12}{"speedup":>10}{"size (KB)":>12}{"size":>8}')
+    for name, results_format, sort_keys, native_encoder in cases:
+        seconds, size = _benchmark(result, args.repeats, results_format, sort_keys, native_encoder)
+        baseline_seconds = baseline_seconds or seconds
+        baseline_size = baseline_size or size
+        print(f'{name:<35}{seconds * 1000:>12.1f}{baseline_seconds / seconds:>9.1f}x{size / 1024:>12.0f}{size / baseline_size:>8.0%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+from botocore.config import Config
+
+from dragoneye.utils.retry_policy import RetryPolicy
+
+
+class AwsClientPool:
+    """
+    Creates each boto3 client once per (service, region, config) and shares it between all the threads of a scan.
+
+    boto3 clients are thread safe, but creating them from a shared boto3 Session is not,
+    so client creation is serialized by a lock.
+
+    If a retry policy is given, every client retries its transient errors under it.
+    """
+
+    def __init__(self, session, client_config: Optional[Config] = None, retry_policy: Optional[RetryPolicy] = None):
+        self.session = session
+        self.client_config: Optional[Config] = client_config
+        self.retry_policy: Optional[RetryPolicy] = retry_policy
+        self.hits: int = 0
+        self.misses: int = 0
+        self._clients: Dict[Tuple[str, str, Optional[Config]], object] = {}
+        self._lock = threading.Lock()
+
+    def get_client(self, service: str, region_name: str, config: Optional[Config] = None):
+        config = config or self.client_config
+        key = (service, region_name, config)
+        client = self._clients.get(key)
+        if client is not None:
+            with self._lock:
+                self.hits += 1
+            return client
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.hits += 1
+                return client
+            self.misses += 1
+            client = self.session.client(service, region_name=region_name, config=config)
+            if self.retry_policy is not None:
+                self.retry_policy.register_botocore_handler(client)
+            self._clients[key] = client
+            return client
+
+    def close(self) -> None:
+        """
+        Closes the connections of all the clients. Clients that are requested afterwards are created again.
+        """
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {'clients': len(self._clients), 'hits': self.hits, 'misses': self.misses}
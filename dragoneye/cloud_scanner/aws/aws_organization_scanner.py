@@ -0,0 +1,85 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+from dragoneye.cloud_scanner.aws.aws_scan_settings import AwsOrganizationScanSettings
+from dragoneye.cloud_scanner.aws.aws_scanner import AwsScanner
+from dragoneye.cloud_scanner.aws.aws_session_factory import AwsSessionFactory
+from dragoneye.cloud_scanner.base_multi_account_scanner import BaseMultiAccountScanner
+from dragoneye.utils.app_logger import logger
+from dragoneye.utils.misc_utils import elapsed_time
+
+
+@dataclass
+class AwsAccount:
+    account_id: str
+    # The role to assume in the account, or None to scan it with the session of the organization scan
+    role_arn: Optional[str] = None
+
+
+class AwsOrganizationScanner(BaseMultiAccountScanner):
+    """
+    Scans many AWS accounts (e.g. all the accounts of an organization) through a single scheduler,
+    so all the accounts share one budget of threads (max_workers).
+
+    The role of an account is assumed only when its scan starts, so its credentials are fresh,
+    and its clients (and their connections) are closed once it is done.
+    """
+
+    def __init__(self, session, settings: AwsOrganizationScanSettings):
+        """
+        :param session: The session that assumes the roles of the accounts, and discovers them when no accounts are given.
+        """
+        super().__init__(settings.max_workers, settings.max_parallel_accounts, settings.output_path, settings.metrics_interval)
+        self.session = session
+        self.settings = settings
+
+    @elapsed_time('Scanning AWS organization took {} seconds')
+    def scan(self) -> str:
+        return self._scan_accounts(self._get_accounts())
+
+    def _get_accounts(self) -> List[AwsAccount]:
+        if self.settings.accounts:
+            account_ids_or_arns = self.settings.accounts
+        else:
+            account_ids_or_arns = self._discover_accounts()
+        caller_account_id = self.session.client('sts').get_caller_identity()['Account']
+
+        accounts = []
+        for account_id_or_arn in account_ids_or_arns:
+            if account_id_or_arn.startswith('arn:'):
+                # arn:aws:iam::<account ID>:role/<role name>
+                accounts.append(AwsAccount(account_id_or_arn.split(':')[4], account_id_or_arn))
+            elif account_id_or_arn == caller_account_id:
+                # The account of the session itself is scanned with the session, since it has no role to assume in it
+                accounts.append(AwsAccount(account_id_or_arn))
+            else:
+                accounts.append(AwsAccount(account_id_or_arn, f'arn:aws:iam::{account_id_or_arn}:role/{self.settings.role_name}'))
+        return accounts
+
+    def _discover_accounts(self) -> List[str]:
+        logger.info('* Discovering the accounts of the organization')
+        paginator = self.session.client('organizations').get_paginator('list_accounts')
+        account_ids = []
+        for page in paginator.paginate():
+            for account in page['Accounts']:
+                if account['Status'] == 'ACTIVE':
+                    account_ids.append(account['Id'])
+                else:
+                    logger.info(f'Skipping account {account["Id"]}, as its status is {account["Status"]}')
+        return account_ids
+
+    def _create_account_scanner(self, account: AwsAccount) -> AwsScanner:
+        return AwsScanner(self._get_account_session(account), self.settings.get_account_settings(account.account_id),
+                          self.concurrency_limiters, self.metrics)
+
+    @staticmethod
+    def _get_account_name(account: AwsAccount) -> str:
+        return account.account_id
+
+    def _get_account_session(self, account: AwsAccount):
+        if account.role_arn is None:
+            return self.session
+        return AwsSessionFactory.get_session_using_assume_role(account.role_arn,
+                                                               self.settings.external_id,
+                                                               self.settings.default_region or self.session.region_name,
+                                                               source_session=self.session)
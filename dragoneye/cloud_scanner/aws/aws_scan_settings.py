@@ -1,7 +1,10 @@
+import copy
 import os
 from typing import List, Optional
 
 from dragoneye.cloud_scanner.base_cloud_scanner import CloudScanSettings, CloudProvider
+from dragoneye.config import config
+from dragoneye.utils.json_serializer import ResultsFormat
 
 
 class AwsCloudScanSettings(CloudScanSettings):
@@ -9,30 +12,104 @@ class AwsCloudScanSettings(CloudScanSettings):
                  commands_path: str,
                  account_name: str,
                  regions_filter: List[str] = None,
-                 max_attempts: int = 10,
+                 max_attempts: int = 5,
                  max_pool_connections: int = 50,
-                 command_timeout: int = 600,
+                 command_timeout: Optional[float] = 600,
                  output_path: str = os.getcwd(),
                  should_clean_before_scan: bool = True,
-                 default_region: Optional[str] = None):
+                 default_region: Optional[str] = None,
+                 max_workers: Optional[int] = None,
+                 max_requests_per_second: float = 25.0,
+                 retry_budget: int = 500,
+                 stream_results: bool = False,
+                 results_format: ResultsFormat = ResultsFormat.PRETTY,
+                 resume: bool = False,
+                 refresh: bool = False,
+                 writer_processes: int = 0,
+                 metrics_interval: float = 0,
+                 scan_timeout: Optional[float] = None):
         """
         The settings that the AwsScanner uses for aws scanning.
 
             :param commands_path: The path of a YAML file that describes the scan commands to be used.
             :param account_name: A name for the scan results.
             :param regions_filter: A list of regions to scan resources on.
-            :param max_attempts: The amount of times that the boto client will attempt to call AWS's api before giving up.
+            :param max_attempts: The amount of times that a single call to AWS's api is attempted before giving up.
+                It covers every reason to retry a call: transient errors and throttling.
             :param max_pool_connections: The maximum number of connections to keep in a connection pool.
-            :param command_timeout: The timeout period for a single scan command.
+            :param command_timeout: How long (in seconds) a single scan command may run in a single region. Once it passes,
+                the command stops issuing calls and fetching pages, and saves the results it has, which the scan reports as cut off.
+                None for no limit.
             :param output_path: The directory where results will be saved. Defaults to current working directory.
             :param should_clean_before_scan: A flag that determines if prior results of this specific account (identified by account_name)
                 should be deleted before scanning.
             :param default_region: The region to be used for making requests for universal services.
                 If not specified, the session's default region will be used.
+            :param max_workers: The maximum number of API calls that run in parallel over the whole scan (all regions together).
+                If not specified, MAX_WORKERS from the configuration file will be used.
+            :param max_requests_per_second: The highest rate of calls to a single API operation in a single region.
+                The rate is lowered automatically when the API throttles the calls, and recovers while the calls succeed.
+            :param retry_budget: The amount of retries of failing calls that the whole scan may use. Once it is used up, failing calls
+                are not retried. Throttled calls are retried up to max_attempts regardless of it.
+            :param stream_results: A flag that determines if paginated results are written to disk page by page as they arrive,
+                instead of being collected in memory first. The result files are the same either way.
+            :param results_format: The format of the result files. `ResultsFormat.COMPACT` writes smaller, unsorted JSON
+                with a native encoder when one is installed. Defaults to `ResultsFormat.PRETTY`, the indented format.
+            :param resume: A flag that determines if the scan continues a previous, interrupted scan of the account:
+                the previous results are kept, and the calls that the scan journal records as completed are skipped.
+            :param refresh: A flag that determines if the scan refreshes the results of previous scans of the account:
+                only the results that are older than the `Ttl` (in seconds) of their command in the commands YAML are fetched again,
+                as well as the results of commands whose inputs were changed by the refresh. Commands without a `Ttl` are always fetched again.
+            :param writer_processes: The number of processes that encode and write the results, so that the CPU work of saving
+                the results is spread over the cores, instead of running in the threads that fetch them. 0 (the default) writes the results
+                in the fetching threads. Results that are streamed to disk (stream_results) are always written by the fetching threads.
+            :param metrics_interval: How often (in seconds) the metrics of the calls are exported to metrics.json and metrics.prom
+                in the account-data directory during the scan, for long scans. 0 (the default) exports them only at the end of the scan.
+            :param scan_timeout: How long (in seconds) the scan (of every account) may run. Once it passes, the scan stops issuing calls
+                and fetching pages, and saves the results it has, which it reports as cut off. None (the default) for no limit.
         """
-        super().__init__(CloudProvider.AWS, account_name, should_clean_before_scan, output_path, commands_path)
+        super().__init__(CloudProvider.AWS, account_name, should_clean_before_scan, output_path, commands_path,
+                         stream_results, results_format, resume, refresh, writer_processes, metrics_interval, command_timeout, scan_timeout)
         self.regions_filter: str = ','.join(regions_filter) if regions_filter else ''
         self.max_attempts: int = max_attempts
         self.max_pool_connections: int = max_pool_connections
-        self.command_timeout: int = command_timeout
         self.default_region: Optional[str] = default_region
+        self.max_workers: int = max_workers or config.get('MAX_WORKERS')
+        self.max_requests_per_second: float = max_requests_per_second
+        self.retry_budget: int = retry_budget
+
+
+class AwsOrganizationScanSettings(AwsCloudScanSettings):
+    def __init__(self,
+                 commands_path: str,
+                 accounts: Optional[List[str]] = None,
+                 role_name: str = 'OrganizationAccountAccessRole',
+                 external_id: Optional[str] = None,
+                 max_parallel_accounts: int = 10,
+                 **kwargs):
+        """
+        The settings that the AwsOrganizationScanner uses for scanning many aws accounts together.
+
+            :param commands_path: The path of a YAML file that describes the scan commands to be used.
+            :param accounts: The accounts to scan, as account IDs or as ARNs of the roles to assume in them.
+                If not specified, the accounts are discovered with organizations.list_accounts, which requires the
+                session to belong to the management account of the organization (or to a delegated administrator).
+            :param role_name: The name of the role to assume in accounts that are given (or discovered) by their account ID.
+            :param external_id: The external ID to assume the roles with, if they require one.
+            :param max_parallel_accounts: The maximum number of accounts that are scanned at the same time.
+                The role of an account is assumed only when its scan starts, and its clients are closed once it is done.
+            :param kwargs: The settings of the scan of every account, as in AwsCloudScanSettings (except account_name,
+                which is the account ID). max_workers is the budget of the whole organization scan, shared by all of its accounts.
+        """
+        super().__init__(commands_path=commands_path, account_name='', **kwargs)
+        self.accounts: List[str] = accounts or []
+        self.role_name: str = role_name
+        self.external_id: Optional[str] = external_id
+        self.max_parallel_accounts: int = max(max_parallel_accounts, 1)
+
+    def get_account_settings(self, account_id: str) -> AwsCloudScanSettings:
+        account_settings = copy.copy(self)
+        account_settings.account_name = account_id
+        # No scan can use more connections than there are calls in flight, which is bounded by the budget of the organization scan
+        account_settings.max_pool_connections = min(self.max_pool_connections, self.max_workers)
+        return account_settings
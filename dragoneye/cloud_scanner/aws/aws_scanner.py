@@ -1,34 +1,55 @@
-import collections
 import copy
+import json
 import logging
 import os.path
 import os
 import re
-import json
 import time
+from dataclasses import dataclass
 from functools import lru_cache
-from typing import List, Dict, Optional, Deque
+from typing import Hashable, List, Dict, Optional, Set, Tuple, Union
 
 import urllib.parse
 from botocore.exceptions import ClientError, EndpointConnectionError
 from botocore.config import Config
 
+from dragoneye.cloud_scanner.aws.aws_client_pool import AwsClientPool
 from dragoneye.cloud_scanner.aws.aws_scan_settings import AwsCloudScanSettings
-from dragoneye.config import config
-from dragoneye.utils.boto_backoff import rate_limiter
+from dragoneye.utils.boto_backoff import AdaptiveRateLimiters, is_throttling_error
 from dragoneye.cloud_scanner.base_cloud_scanner import BaseCloudScanner
+from dragoneye.cloud_scanner.scan_plan import FanOutFactor
+from dragoneye.config import config
 from dragoneye.utils.app_logger import logger
-from dragoneye.utils.misc_utils import get_dynamic_values_from_files, custom_serializer, make_directory, init_directory, snakecase, \
-    elapsed_time
-from dragoneye.utils.threading_utils import execute_parallel_functions_in_threads, ThreadedFunctionData
-
-MAX_RETRIES = 3
+from dragoneye.utils.concurrency_limiter import AdaptiveConcurrencyLimiters
+from dragoneye.utils.deadline import Deadline
+from dragoneye.utils.json_serializer import dump_to_file
+from dragoneye.utils.json_stream_writer import JsonStreamWriter
+from dragoneye.utils.misc_utils import make_directory, snakecase, elapsed_time
+from dragoneye.utils.retry_policy import RetryPolicy, CallRetries
+from dragoneye.utils.scan_metrics import CallLabels, CallMeasurement, ScanMetrics
+from dragoneye.utils.threading_utils import ThreadedFunctionData, TaskScheduler, TaskFanOut, TaskRetry
+
+
+@dataclass
+class CommandCheck:
+    """
+    The Check of a scan command: the command is polled every `interval` seconds until its response passes all the conditions,
+    for at most `timeout` seconds.
+    """
+    conditions: List[dict]
+    interval: float
+    timeout: float
 
 
 class AwsScanner(BaseCloudScanner):
 
-    def __init__(self, session, settings: AwsCloudScanSettings):
-        super().__init__(settings)
+    def __init__(self, session, settings: AwsCloudScanSettings, concurrency_limiters: Optional[AdaptiveConcurrencyLimiters] = None,
+                 metrics: Optional[ScanMetrics] = None):
+        """
+        :param concurrency_limiters: The concurrency limiters of the scheduler that runs the scan, when it is shared with other scans.
+        :param metrics: The metrics of the calls of the scan, when they are shared with other scans.
+        """
+        super().__init__(settings, metrics)
         self.session = session
         self.settings = settings
         # Services that will only be queried in the default region
@@ -46,38 +67,70 @@ class AwsScanner(BaseCloudScanner):
         if self.default_region is None:
             raise ValueError('Default region cannot be empty. '
                              'You must specify the default region or set the AWS_DEFAULT_REGION environment variable')
-        self.handler_config = Config(retries={'max_attempts': self.settings.max_attempts, 'mode': 'standard'},
+        # Clients do not retry on their own, their transient errors are retried under the retry policy of the scan
+        self.handler_config = Config(retries={'total_max_attempts': 1, 'mode': 'standard'},
                                      max_pool_connections=self.settings.max_pool_connections)
+        # Created for every scan, from the settings at the time of the scan
+        self.retry_policy: Optional[RetryPolicy] = None
+        self.client_pool: Optional[AwsClientPool] = None
+        self.rate_limiters = AdaptiveRateLimiters(self.settings.max_requests_per_second)
+        self.concurrency_limiters = concurrency_limiters or \
+            AdaptiveConcurrencyLimiters(config.get('INITIAL_CONCURRENCY_PER_ENDPOINT'), self.settings.max_workers)
         logging.getLogger("botocore").setLevel(logging.WARN)
 
     @elapsed_time('Scanning AWS live environment took {} seconds')
     def scan(self) -> str:
-        self.account_data_dir = init_directory(self.settings.output_path, self.settings.account_name, self.settings.clean)
-        region_dict_list = self._create_regions_file_structure()
-        dependent_commands, independent_commands = self._get_scan_commands()
+        scheduler = TaskScheduler(self.settings.max_workers, self.concurrency_limiters)
+        self.prepare_scan(scheduler)
+        with self.metrics.exporting(os.path.join(self.account_data_dir, '..'), self.settings.metrics_interval):
+            scheduler.run()
+            self.finish_scan()
+        self.concurrency_limiters.log_limits()
 
-        tasks: List[ThreadedFunctionData] = []
+        return os.path.abspath(os.path.join(self.account_data_dir, '..'))
 
-        for region in region_dict_list:
-            tasks.append(ThreadedFunctionData(
-                self._scan_region_data,
-                (region, dependent_commands, independent_commands),
-                'An unknown exception has occurred'
-            ))
+    def prepare_scan(self, scheduler: TaskScheduler, task_key_prefix: tuple = ()) -> List[Hashable]:
+        """
+        Creates the directory of the account and of its regions, and adds the scan commands of every region to the scheduler,
+        which may be shared with the scans of other accounts.
+        The scan is complete once all the added tasks are done, and finish_scan was called.
 
-        deque_tasks: Deque[List[ThreadedFunctionData]] = collections.deque()
-        deque_tasks.append(tasks)
-        execute_parallel_functions_in_threads(deque_tasks, len(region_dict_list))
+        :param task_key_prefix: A prefix to the keys of the added tasks, that distinguishes them from the tasks of other scans.
+        :return: The keys of the added tasks.
+        """
+        self._init_account_data_dir()
+        self.retry_policy = RetryPolicy(self.settings.max_attempts, self.settings.retry_budget)
+        self.client_pool = AwsClientPool(self.session, self.handler_config, self.retry_policy)
+        region_dict_list = self._create_regions_file_structure()
+        scan_commands = self._get_scan_commands()
+        dependencies = self._get_commands_dependencies(scan_commands)
+        self.result_store = self._create_result_store(scan_commands)
 
-        self._print_summary()
+        service_regions = self._plan_service_regions(scan_commands, [region['RegionName'] for region in region_dict_list])
 
-        return os.path.abspath(os.path.join(self.account_data_dir, '..'))
+        task_keys = []
+        for region in region_dict_list:
+            task_keys.extend(self._schedule_region_data(scheduler, region, scan_commands, dependencies, service_regions, task_key_prefix))
+        return task_keys
+
+    def finish_scan(self, report_directory: Optional[str] = None) -> None:
+        """
+        Summarizes the scan, and releases its journal and clients.
+        :param report_directory: The directory to write the failures report to. Defaults to the parent directory of the account.
+        """
+        self.result_writer.wait()
+        self.journal.close()
+        self._print_summary(report_directory)
+        logger.info('AWS clients: {clients} created, {hits} cache hits, {misses} cache misses'.format(**self.client_pool.get_stats()))
+        logger.info(f'Retries: {self.retry_policy.retries_used} of the scan budget of {self.retry_policy.scan_budget} were used')
+        for (service, region, operation), rate in self.rate_limiters.get_throttled_rates().items():
+            logger.info(f'Rate of {service}.{operation} on {region} was throttled down to {rate:.2f} requests per second')
+        self.client_pool.close()
 
     def _create_regions_file_structure(self):
         region_list = self._get_region_list()
 
-        with open(f"{self.account_data_dir}/describe-regions.json", "w+") as file:
-            file.write(json.dumps(region_list, indent=4, sort_keys=True))
+        dump_to_file(region_list, f"{self.account_data_dir}/describe-regions.json", self.settings.results_format, sort_keys=True)
 
         logger.info("* Creating directory for each region name")
         region_dict_list: List[dict] = region_list["Regions"]
@@ -88,12 +141,7 @@ class AwsScanner(BaseCloudScanner):
         return region_dict_list
 
     def _get_region_list(self):
-        regions_filter = None
-        if len(self.settings.regions_filter) > 0:
-            regions_filter = self.settings.regions_filter.lower().split(",")
-            # Force include of default region -- seems to be required
-            if self.default_region not in regions_filter:
-                regions_filter.append(self.default_region)
+        regions_filter = self._get_regions_filter()
 
         logger.info("* Getting region names")
         ec2 = self.session.client("ec2", region_name=self.default_region)
@@ -105,6 +153,52 @@ class AwsScanner(BaseCloudScanner):
 
         return region_list
 
+    def _get_regions_filter(self) -> Optional[List[str]]:
+        if len(self.settings.regions_filter) == 0:
+            return None
+        regions_filter = self.settings.regions_filter.lower().split(",")
+        # Force include of default region -- seems to be required
+        if self.default_region not in regions_filter:
+            regions_filter.append(self.default_region)
+        return regions_filter
+
+    def _get_plan_scopes(self) -> Dict[str, str]:
+        # The regions of the previous scan are planned when there is one, since listing the regions of the account calls AWS
+        regions_file = os.path.join(self.account_data_dir, 'describe-regions.json')
+        if os.path.isfile(regions_file):
+            with open(regions_file, 'r') as file:
+                region_names = [region['RegionName'] for region in json.load(file)['Regions']]
+        else:
+            region_names = self.session.get_available_regions('ec2')
+        regions_filter = self._get_regions_filter()
+        if regions_filter is not None:
+            region_names = [region_name for region_name in region_names if region_name in regions_filter]
+        return {region_name: os.path.join(self.account_data_dir, region_name) for region_name in region_names}
+
+    def _get_fan_out(self, scan_command: dict, scope: str, directory: str) -> Optional[List[FanOutFactor]]:
+        if self._get_service_client_region(self._get_client_service(scan_command['Service']), scope) is None:
+            return None
+        # Follows _get_parameter_group: the first parameter starts the parameter groups,
+        # and every following parameter with several values (that are not grouped) multiplies them
+        factors: List[FanOutFactor] = []
+        has_groups = False
+        for parameter in scan_command.get('Parameters', []):
+            name = parameter['Name']
+            value = parameter.get('Value', parameter.get('Values'))
+            if not self._is_dynamic_parameter(parameter):
+                if has_groups and 'Values' in parameter:
+                    factors.append(FanOutFactor((name,), len(value)))
+            elif not parameter.get('Group', False):
+                # A templated value (e.g. `{{VpcId}}`) is read for every value of the parameters it is templated with,
+                # so its values replace theirs rather than multiply them
+                templated_names = set(re.findall(r'{{([^|]*)}}', value))
+                replaced_factors = [factor for factor in factors if templated_names & set(factor.parameters)]
+                factors = [factor for factor in factors if not templated_names & set(factor.parameters)]
+                replaced_names = tuple(parameter_name for factor in replaced_factors for parameter_name in factor.parameters)
+                factors.append(FanOutFactor((*replaced_names, name), self._count_previous_values(value, directory)))
+            has_groups = True
+        return factors
+
     @staticmethod
     def _get_identifier_from_parameter(parameter):
         if isinstance(parameter, list):
@@ -132,20 +226,21 @@ class AwsScanner(BaseCloudScanner):
 
         return urllib.parse.quote_plus(filename)
 
-    def _get_and_save_data(self, output_file, handler, method_to_call, parameters, checks, region):
+    def _get_and_save_data(self, output_file, handler, method_to_call, parameters, check: Optional[CommandCheck], region,
+                           deadline: Optional[Deadline] = None, retries: Optional[CallRetries] = None, reserved: bool = False,
+                           poll_deadline: Optional[float] = None) -> Optional[TaskRetry]:
         """
         Calls the AWS API function and downloads the data
 
-        check: Value to check and repeat the call if it fails
-        summary: Keeps tracks of failures
-        """
-        # TODO: Decorate this with rate limiters from
-        # https://github.com/Netflix-Skunkworks/cloudaux/blob/master/cloudaux/aws/decorators.py
-        if os.path.isfile(output_file):
-            # Data already scanned, so skip
-            logger.warning("Response already present at {}".format(output_file))
-            return
+        check: The conditions the data has to pass, and how to poll the call until it does
+        deadline: The deadline of the command. Once it has passed, the call is not made, or stops fetching pages and saves the pages it has
+        retries: The retries the call already used, under the retry policy of the scan
+        reserved: Whether a token of the call's rate limiter was already reserved for this call
+        poll_deadline: The time (time.monotonic) after which the call is not polled anymore, set on its first poll
 
+        Returns a TaskRetry when the call has to wait for its rate limiter, when it was throttled, or when its data did not pass the check yet,
+        instead of sleeping on the worker thread.
+        """
         call_summary = {
             "service": handler.meta.service_model.service_name,
             "action": method_to_call,
@@ -155,33 +250,88 @@ class AwsScanner(BaseCloudScanner):
 
         params_string = '' if not parameters else ', '.join(f'{k}={v}' for k, v in parameters.items())
         function_msg = f'{call_summary["service"]}.{call_summary["action"]}({params_string})'
+        labels = self._get_call_labels(call_summary["service"], method_to_call, region)
+        cut_off = deadline.get_cut_off_reason() if deadline is not None else None
+        if cut_off is not None:
+            self._cut_off_call(labels, function_msg, cut_off)
+            return None
+
+        retries = retries or CallRetries()
+        rate_limiter_key = (call_summary["service"], region, method_to_call)
+        if not reserved:
+            delay = self.rate_limiters.reserve(rate_limiter_key)
+            if delay > 0:
+                return TaskRetry(delay, (self, output_file, handler, method_to_call, parameters, check, region, deadline, retries, True, poll_deadline))
+
         logger.info(f'Invoking {function_msg}')
-        data = AwsScanner._get_data(output_file, handler, method_to_call, parameters, checks, call_summary)
+        writer = JsonStreamWriter(output_file, sort_keys=True, results_format=self.settings.results_format) if self.settings.stream_results else None
+        retries_before_call = retries.retries
+        with self.metrics.measure_call(labels) as measurement:
+            try:
+                with self.retry_policy.bind(retries):
+                    data = AwsScanner._get_data(output_file, handler, method_to_call, parameters, call_summary, writer, measurement, deadline)
+                self.rate_limiters.on_success(rate_limiter_key)
+            except ClientError as ex:
+                # Only throttling errors are raised by _get_data
+                measurement.throttled = True
+                if writer is not None:
+                    writer.discard()
+                self.rate_limiters.on_throttled(rate_limiter_key)
+                self.concurrency_limiters.on_throttled(self._get_endpoint_key(handler, region))
+                logger.warning(f'Throttling error on {function_msg} on attempt #{retries.retries + 1}/{self.retry_policy.max_attempts}')
+                delay = self.retry_policy.get_retry_delay(retries, throttled=True)
+                if delay is not None:
+                    # The call also reserves a new token when it runs again, so its rate limiter may delay it further
+                    return TaskRetry(delay, (self, output_file, handler, method_to_call, parameters, check, region, deadline, retries, False,
+                                             poll_deadline))
+                logger.warning(f"ClientError {ex}")
+                call_summary["exception"] = ex
+                data = None
+            finally:
+                measurement.retries = retries.retries - retries_before_call
+            if check and data is not None and "exception" not in call_summary and not AwsScanner._is_data_passing_check(data, check.conditions):
+                now = time.monotonic()
+                poll_deadline = poll_deadline or now + check.timeout
+                if now + check.interval <= poll_deadline:
+                    if writer is not None:
+                        writer.discard()
+                    logger.info(f'  {function_msg} did not pass its check yet, polling again in {check.interval} seconds')
+                    return TaskRetry(check.interval, (self, output_file, handler, method_to_call, parameters, check, region, deadline, retries,
+                                                      False, poll_deadline))
+                ex = Exception("One of the following checks has repeatedly failed: {}".format(
+                    ', '.join(f'{condition["Name"]}={condition["Value"]}' for condition in check.conditions)))
+                logger.warning("Exception: {}".format(ex))
+                call_summary["exception"] = ex
+            # The call is observed once the context exits, so it is marked as failed only after its check was evaluated,
+            # the same as in the run log and the failures report
+            measurement.failed = "exception" in call_summary
         AwsScanner._remove_unused_values(data)
-        AwsScanner._save_results_to_file(output_file, data)
-
-        logger.info(f'Results from {function_msg} were saved to {output_file}')
-        self.summary.put_nowait(call_summary)
+        # Partial results are saved, but not recorded in the journal, so resuming the scan fetches them again
+        self._save_results_to_file(output_file, data, labels, function_msg, call_summary,
+                                   record="exception" not in call_summary and measurement.cut_off is None)
+        if isinstance(data, dict):
+            self.result_store.publish(output_file, data, os.path.join(self.account_data_dir, region))
+        if writer is not None and data is not writer:
+            writer.discard()
+
+        if measurement.cut_off is not None:
+            logger.warning(f'{function_msg} was cut off by the {measurement.cut_off} after {measurement.pages} pages, '
+                           f'its partial results were saved to {output_file}')
+        else:
+            logger.info(f'Results from {function_msg} were saved to {output_file}')
+        self.run_log.record_call(labels, function_msg, measurement, output_file, call_summary if "exception" in call_summary else None)
+        return None
 
     @staticmethod
-    def _get_data(output_file, handler, method_to_call, parameters, checks, call_summary):
+    def _get_data(output_file, handler, method_to_call, parameters, call_summary, writer: Optional[JsonStreamWriter] = None,
+                  measurement: Optional[CallMeasurement] = None, deadline: Optional[Deadline] = None):
         data = None
         try:
-            for retries in range(MAX_RETRIES):
-                data = AwsScanner._call_boto_function(output_file, handler, method_to_call, parameters)
-                if not checks or AwsScanner._is_data_passing_check(data, checks):
-                    break
-                elif retries == MAX_RETRIES - 1:
-                    raise Exception(
-                        "One of the following checks has repeatedly failed: {}".format(
-                            ', '.join(f'{check["Name"]}={check["Value"]}' for check in checks)
-                        )
-                    )
-                else:
-                    logger.info("  Sleeping and retrying")
-                    time.sleep(3)
-
+            data = AwsScanner._call_boto_function(output_file, handler, method_to_call, parameters, writer, measurement, deadline)
         except ClientError as ex:
+            if is_throttling_error(ex):
+                # Throttled calls are queued again by the caller, instead of being retried here
+                raise
             if "NoSuchBucketPolicy" in str(ex):
                 # This error occurs when you try to get the bucket policy for a bucket that has no bucket policy, so this can be ignored.
                 logger.warning("  - No bucket policy")
@@ -277,13 +427,33 @@ class AwsScanner(BaseCloudScanner):
         return data
 
     @staticmethod
-    @rate_limiter()
-    def _call_boto_function(output_file, handler, method_to_call, parameters):
+    def _call_boto_function(output_file, handler, method_to_call, parameters, writer: Optional[JsonStreamWriter] = None,
+                            measurement: Optional[CallMeasurement] = None, deadline: Optional[Deadline] = None):
+        """
+        Calls the AWS API function, following all of its pages, and counts the pages in the measurement of the call, if one is given.
+        If a writer is given, the pages of a paginated function are streamed to it, and the writer is returned instead of the data.
+        If a deadline is given, no more pages are fetched once it has passed, and the pages fetched so far are returned,
+        with the reason of the cut off in the measurement.
+        """
         data = {}
         if handler.can_paginate(method_to_call):
             paginator = handler.get_paginator(method_to_call)
             page_iterator = paginator.paginate(**parameters)
+            if writer is not None:
+                writer.discard()
+                for response in page_iterator:
+                    if measurement is not None:
+                        measurement.pages += 1
+                    if writer.pages:
+                        logger.info("  ...paginating {}".format(output_file))
+                    writer.add_page(response)
+                    if AwsScanner._is_cut_off(deadline, measurement):
+                        break
+                return writer
+
             for response in page_iterator:
+                if measurement is not None:
+                    measurement.pages += 1
                 if not data:
                     data = response
 
@@ -292,12 +462,26 @@ class AwsScanner(BaseCloudScanner):
                     for key, value in data.items():
                         if isinstance(value, list):
                             value.extend(response[key])
+                if AwsScanner._is_cut_off(deadline, measurement):
+                    break
         else:
             function = getattr(handler, method_to_call)
             data = function(**parameters)
+            if measurement is not None:
+                measurement.pages = 1
 
         return data
 
+    @staticmethod
+    def _is_cut_off(deadline: Optional[Deadline], measurement: Optional[CallMeasurement]) -> bool:
+        """
+        Checks whether the deadline cuts off the call before its next page, and reports the reason in its measurement if it does.
+        """
+        if deadline is None or measurement is None:
+            return False
+        measurement.cut_off = deadline.get_cut_off_reason()
+        return measurement.cut_off is not None
+
     @staticmethod
     def _is_data_passing_check(data: dict, checks: Optional[dict]) -> bool:
         if checks:
@@ -309,46 +493,47 @@ class AwsScanner(BaseCloudScanner):
         return True
 
     @staticmethod
-    def _remove_unused_values(data: dict) -> None:
+    def _remove_unused_values(data: Union[Dict, JsonStreamWriter, None]) -> None:
         if data is not None:
             data.pop("ResponseMetadata", None)
             data.pop("Marker", None)
             data.pop("IsTruncated", None)
 
-    @staticmethod
-    def _save_results_to_file(output_file: str, data: Optional[Dict]) -> None:
-        if data is not None:
-            with open(output_file, "w+") as file:
-                file.write(
-                    json.dumps(data, indent=4, sort_keys=True, default=custom_serializer)
-                )
-
-    def _run_scan_commands(self, region, runner):
-        region = copy.deepcopy(region)
-        runner = copy.deepcopy(runner)
-        region_name = region["RegionName"]
+    def _save_results_to_file(self, output_file: str, data: Union[Dict, JsonStreamWriter, None], labels: CallLabels, call: str,
+                              call_summary: dict, record: bool) -> None:
+        """
+        Saves the results, and records them in the journal once they are completely written, if `record` is set.
+        """
+        if data is None or isinstance(data, JsonStreamWriter):
+            if data is not None:
+                data.close()
+                self._record_result_size(labels, output_file)
+            if record:
+                self.journal.record(output_file, has_result=data is not None)
+            return
 
-        if runner['Service'] == 'configservice':
-            runner['Service'] = 'config'  # This is due to service name change between API (configservice) and python SDK (config)
+        def on_written(sha256: str) -> None:
+            if record:
+                self.journal.record(output_file, sha256=sha256)
+            self._record_result_size(labels, output_file)
 
-        client_region = region_name
-        if runner['Service'] == 'globalaccelerator':
-            # globalaccelerator only has api endpoint in us-west-2
-            if region_name == self.default_region:
-                client_region = 'us-west-2'
-            else:
-                return
-        else:
-            if not self._should_run_command_on_region(runner, region):
-                return
+        self._write_result(data, output_file, labels, call, lambda ex: {**call_summary, 'exception': ex}, on_written, sort_keys=True)
 
-        handler = self.session.client(
-            runner["Service"], region_name=client_region,
-            config=self.handler_config
-        )
-
-        filepath = os.path.join(self.account_data_dir, region_name, f'{runner["Service"]}-{runner["Request"]}')
+    def _run_scan_commands(self, region, runner, client_region: str) -> Optional[TaskFanOut]:
+        """
+        :param client_region: The region of the client that runs the command, which is planned by _plan_service_regions.
+        """
+        region_name = region["RegionName"]
+        service = self._get_client_service(runner['Service'])
         method_to_call = snakecase(runner["Request"])
+        deadline = self._get_command_deadline()
+        cut_off = deadline.get_cut_off_reason()
+        if cut_off is not None:
+            self._cut_off_call(self._get_call_labels(service, method_to_call, region_name), f'{service}.{method_to_call}', cut_off)
+            return None
+        handler = self.client_pool.get_client(service, client_region)
+
+        filepath = os.path.join(self.account_data_dir, region_name, f'{service}-{runner["Request"]}')
         parameter_keys = set()
         param_groups = self._get_parameter_group(runner, self.account_data_dir, region, parameter_keys)
         suffix = runner.get('FilenameSuffix', '')
@@ -356,6 +541,9 @@ class AwsScanner(BaseCloudScanner):
             suffix = '_' + suffix
 
         tasks: List[ThreadedFunctionData] = []
+        check = self._get_command_check(runner)
+        endpoint_key = self._get_endpoint_key(handler, region_name)
+        ttl = self._get_refresh_ttl(runner, os.path.join(self.account_data_dir, region_name))
 
         if runner.get("Parameters"):
             make_directory(filepath)
@@ -365,6 +553,8 @@ class AwsScanner(BaseCloudScanner):
                 unparsed_file_name = '_'.join([f'{k}-{v}' if not isinstance(v, list) else k for k, v in param_group.items()])
                 file_name = urllib.parse.quote_plus(unparsed_file_name) + suffix
                 output_file = os.path.join(filepath, f'{file_name}.json')
+                if self._is_completed(output_file, ttl):
+                    continue
                 tasks.append(ThreadedFunctionData(
                     AwsScanner._get_and_save_data,
                     (self,
@@ -372,12 +562,15 @@ class AwsScanner(BaseCloudScanner):
                      handler,
                      method_to_call,
                      param_group,
-                     runner.get("Check", None),
-                     region_name),
+                     check,
+                     region_name,
+                     deadline),
                     'exception on command {}'.format(runner),
-                    'timeout on command {}'.format(runner)))
+                    concurrency_key=endpoint_key))
         else:
             output_file = filepath + suffix + ".json"
+            if self._is_completed(output_file, ttl):
+                return None
             tasks.append(ThreadedFunctionData(
                 AwsScanner._get_and_save_data,
                 (self,
@@ -385,35 +578,35 @@ class AwsScanner(BaseCloudScanner):
                  handler,
                  method_to_call,
                  {},
-                 runner.get("Check", None),
-                 region_name), 'exception on command {}'.format(runner), 'timeout on command {}'.format(runner)))
-
-        deque_tasks: Deque[List[ThreadedFunctionData]] = collections.deque()
-        deque_tasks.append(tasks)
-        execute_parallel_functions_in_threads(deque_tasks, config.get('MAX_WORKERS'), self.settings.command_timeout)
-
-    def _scan_region_data(self, region: dict, dependent_commands: List[dict], independent_commands: List[dict]):
-        non_dependable_tasks: List[ThreadedFunctionData] = []
-        dependable_tasks: List[ThreadedFunctionData] = []
-        deque_tasks: Deque[List[ThreadedFunctionData]] = collections.deque()
+                 check,
+                 region_name,
+                 deadline), 'exception on command {}'.format(runner),
+                concurrency_key=endpoint_key))
 
-        for independent_command in independent_commands:
-            non_dependable_tasks.append(ThreadedFunctionData(
-                self._run_scan_commands,
-                (region, independent_command),
-                'exception on command {}'.format(independent_command)))
+        return TaskFanOut(tasks)
 
-        deque_tasks.append(non_dependable_tasks)
-
-        for dependent_command in dependent_commands:
-            dependable_tasks.append(ThreadedFunctionData(
-                self._run_scan_commands,
-                (region, dependent_command),
-                'exception on command {}'.format(dependent_command)))
-
-        for dependable_task in dependable_tasks:
-            deque_tasks.append([dependable_task])
-        execute_parallel_functions_in_threads(deque_tasks, config.get('MAX_WORKERS'))
+    def _schedule_region_data(self, scheduler: TaskScheduler, region: dict, scan_commands: List[dict], dependencies: Dict[int, Set[int]],
+                              service_regions: Dict[Tuple[str, str], str], task_key_prefix: tuple = ()) -> List[Hashable]:
+        """
+        Adds a task for every command whose service is supported in the region, according to the plan of _plan_service_regions.
+        The dependencies on the commands that have no task in the region are ignored by the scheduler.
+        """
+        group = (*task_key_prefix, region['RegionName'])
+        task_keys = []
+        for index, scan_command in enumerate(scan_commands):
+            client_region = service_regions.get((self._get_client_service(scan_command['Service']), region['RegionName']))
+            if client_region is None:
+                continue
+            task_key = (*group, index)
+            scheduler.add_task(task_key,
+                               ThreadedFunctionData(
+                                   self._run_scan_commands,
+                                   (region, scan_command, client_region),
+                                   'exception on command {}'.format(scan_command)),
+                               [(*group, dependency) for dependency in dependencies[index]],
+                               group=group)
+            task_keys.append(task_key)
+        return task_keys
 
     @staticmethod
     def _get_call_parameters(call_parameters: dict, parameters_def: list) -> List[dict]:
@@ -459,8 +652,8 @@ class AwsScanner(BaseCloudScanner):
                 param_groups.extend(additional_param_group)
             return param_groups
 
-    @staticmethod
-    def _fill_dynamic_params(param_groups: List[dict],
+    def _fill_dynamic_params(self,
+                             param_groups: List[dict],
                              name: str,
                              value: str,
                              group: bool,
@@ -471,7 +664,7 @@ class AwsScanner(BaseCloudScanner):
         if not param_groups and depends_on_keys:
             return param_groups
         if not param_groups and not depends_on_keys:
-            values = get_dynamic_values_from_files(value, region_account_dir)
+            values = self.result_store.get_dynamic_values(value, region_account_dir)
             if group:
                 param_groups.append({name: values})
                 return param_groups
@@ -485,7 +678,7 @@ class AwsScanner(BaseCloudScanner):
             real_value = value
             for key in depends_on_keys:
                 real_value = real_value.replace(f'{{{{{key}}}}}', param_group[key])
-            dynamic_params_list: list = get_dynamic_values_from_files(real_value, region_account_dir)
+            dynamic_params_list: list = self.result_store.get_dynamic_values(real_value, region_account_dir)
             if group:
                 param_group[name] = dynamic_params_list
                 result_param_groups.append(param_group)
@@ -496,17 +689,42 @@ class AwsScanner(BaseCloudScanner):
                     result_param_groups.append(clone_param_group)
         return result_param_groups
 
-    def _should_run_command_on_region(self, runner: dict, region_dict: dict) -> bool:
-        service = runner["Service"]
-        region_name = region_dict["RegionName"]
+    def _plan_service_regions(self, scan_commands: List[dict], region_names: List[str]) -> Dict[Tuple[str, str], str]:
+        """
+        Plans which regions every service of the commands is scanned in, once before any task is created.
+        Universal services are scanned only in the default region, globalaccelerator is scanned only in the default region
+        with a client of us-west-2 (its only endpoint), and other services in the regions they are available in.
 
+        :return: The region of the client to use, by the service and the region that it is scanned in.
+            A service is not scanned in regions that are missing.
+        """
+        service_regions = {}
+        for service in sorted({self._get_client_service(scan_command['Service']) for scan_command in scan_commands}):
+            skipped_regions = []
+            for region_name in region_names:
+                client_region = self._get_service_client_region(service, region_name)
+                if client_region is None:
+                    skipped_regions.append(region_name)
+                else:
+                    service_regions[(service, region_name)] = client_region
+            if skipped_regions and service not in self.universal_services and service != 'globalaccelerator':
+                logger.info("Skipping regions {}, as {} does not exist there".format(', '.join(skipped_regions), service))
+        return service_regions
+
+    def _get_service_client_region(self, service: str, region_name: str) -> Optional[str]:
+        if service == 'globalaccelerator':
+            # globalaccelerator only has api endpoint in us-west-2
+            return 'us-west-2' if region_name == self.default_region else None
         if service in self.universal_services:
-            if region_name != self.default_region:
-                return False
-        elif service != 'eks' and region_name not in self._get_available_regions(service):
-            logger.info("Skipping region {}, as {} does not exist there".format(region_name, service))
-            return False
-        return True
+            return region_name if region_name == self.default_region else None
+        if service != 'eks' and region_name not in self._get_available_regions(service):
+            return None
+        return region_name
+
+    @staticmethod
+    def _get_client_service(service: str) -> str:
+        # This is due to service name change between API (configservice) and python SDK (config)
+        return 'config' if service == 'configservice' else service
 
     def _get_parameter_group(self, runner, account_dir, region, parameter_keys: set):
         param_groups = []
@@ -521,10 +739,32 @@ class AwsScanner(BaseCloudScanner):
                 param_groups = self._fill_dynamic_params(param_groups, name, value, group, account_dir, region)
         return param_groups
 
+    @staticmethod
+    def _get_command_check(runner: dict) -> Optional[CommandCheck]:
+        if not runner.get('Check'):
+            return None
+        return CommandCheck(runner['Check'],
+                            runner.get('CheckInterval', config.get('CHECK_POLL_INTERVAL')),
+                            runner.get('CheckTimeout', config.get('CHECK_POLL_TIMEOUT')))
+
+    def _get_endpoint_key(self, handler, region_name: str) -> str:
+        # The concurrency limiters may be shared by the scans of several accounts, which AWS throttles separately
+        return f'{self.settings.account_name}/{handler.meta.service_model.service_name}/{region_name}'
+
     @lru_cache(maxsize=None)
     def _get_available_regions(self, service: str):
         return self.session.get_available_regions(service)
 
+    @staticmethod
+    def _get_command_output_name(scan_command: dict) -> str:
+        output_name = f'{AwsScanner._get_client_service(scan_command["Service"])}-{scan_command["Request"]}'
+        if scan_command.get('Parameters'):
+            return output_name
+        suffix = scan_command.get('FilenameSuffix', '')
+        if suffix:
+            suffix = '_' + suffix
+        return f'{output_name}{suffix}.json'
+
     @staticmethod
     def _parse_error(call_summary: dict) -> str:
         return "  {}.{}({}): {}".format(
@@ -31,15 +31,22 @@ class AwsSessionFactory:
         return session
 
     @staticmethod
-    def get_session_using_assume_role(role_arn: str, external_id: str, region: Optional[str] = None, session_duration: int = 3600):
+    def get_session_using_assume_role(role_arn: str, external_id: Optional[str], region: Optional[str] = None, session_duration: int = 3600,
+                                      source_session=None):
+        """
+        :param source_session: The session that assumes the role. Defaults to the AWS auth-chain.
+        """
         role_session_name = "DragoneyeSession"
         logger.info('Will try to assume role using ARN: {} and external id {}...'.format(role_arn, external_id))
         try:
-            client = boto3.client('sts')
+            client = (source_session or boto3).client('sts')
+            assume_role_args = {}
+            if external_id:
+                assume_role_args['ExternalId'] = external_id
             response = client.assume_role(RoleArn=role_arn,
                                           RoleSessionName=role_session_name,
                                           DurationSeconds=session_duration,
-                                          ExternalId=external_id)
+                                          **assume_role_args)
             credentials = response['Credentials']
             session_data = {
                 "aws_access_key_id": credentials['AccessKeyId'],
@@ -9,11 +9,13 @@ from dragoneye.dragoneye_exception import DragoneyeException
 from dragoneye.utils.misc_utils import invoke_get_request
 from dragoneye.utils.value_validator import validate_uuid
 
+SUBSCRIPTIONS_URL = 'https://management.azure.com/subscriptions'
+
 
 class AzureAuthorizer:
 
     @staticmethod
-    def get_authorization_token(subscription_id: str,
+    def get_authorization_token(subscription_id: Optional[str],
                                 tenant_id: Optional[str] = None,
                                 client_id: Optional[str] = None,
                                 client_secret: Optional[str] = None) -> str:
@@ -24,8 +26,12 @@ class AzureAuthorizer:
 
         Otherwise, it will attempt to generate a token from your CLI credentials, using
         `az account get-access-token <https://docs.microsoft.com/en-us/cli/azure/account?view=azure-cli-latest#az_account_get_access_token>`__
+
+        The token is tested against the subscription, or, if no subscription is given (to scan many subscriptions with the same token),
+        against the listing of the subscriptions of the tenant.
         """
-        validate_uuid(subscription_id, 'Invalid subscription id')
+        if subscription_id is not None:
+            validate_uuid(subscription_id, 'Invalid subscription id')
         if not (client_id and client_secret and tenant_id):
             token = AzureAuthorizer._get_token_from_az_cli()
         else:
@@ -79,11 +85,14 @@ class AzureAuthorizer:
             return json.loads(output)['accessToken']
 
     @staticmethod
-    def test_connectivity(subscription_id, token):
+    def test_connectivity(subscription_id: Optional[str], token):
         headers = {
             'Authorization': token
         }
-        url = f'https://management.azure.com/subscriptions/{subscription_id}/resourcegroups?api-version=2020-09-01'
+        if subscription_id is None:
+            url = f'{SUBSCRIPTIONS_URL}?api-version=2020-01-01'
+        else:
+            url = f'{SUBSCRIPTIONS_URL}/{subscription_id}/resourcegroups?api-version=2020-09-01'
         response = invoke_get_request(url, headers)
         if response.status_code != 200:
             raise DragoneyeException(f'Failed to authenticate. status code: {response.status_code}\n'
@@ -1,6 +1,9 @@
+import copy
 import os
+from typing import List, Optional
 
 from dragoneye.cloud_scanner.base_cloud_scanner import CloudScanSettings, CloudProvider
+from dragoneye.utils.json_serializer import ResultsFormat
 
 
 class AzureCloudScanSettings(CloudScanSettings):
@@ -9,7 +12,16 @@ class AzureCloudScanSettings(CloudScanSettings):
                  subscription_id: str,
                  account_name: str,
                  output_path: str = os.getcwd(),
-                 should_clean_before_scan: bool = True
+                 should_clean_before_scan: bool = True,
+                 max_parallel_requests_per_command: Optional[int] = None,
+                 stream_results: bool = False,
+                 results_format: ResultsFormat = ResultsFormat.PRETTY,
+                 resume: bool = False,
+                 refresh: bool = False,
+                 writer_processes: int = 0,
+                 metrics_interval: float = 0,
+                 command_timeout: Optional[float] = None,
+                 scan_timeout: Optional[float] = None
                  ):
         """
         The settings that the AzureScanner uses for azure scanning.
@@ -19,10 +31,64 @@ class AzureCloudScanSettings(CloudScanSettings):
         :param output_path: The directory where results will be saved. Defaults to current working directory.
         :param should_clean_before_scan: A flag that determines if prior results of this specific account (identified by account_name)
             should be deleted before scanning.
+        :param max_parallel_requests_per_command: The maximum number of requests of a single command that run in parallel.
+            Can be overridden per command with `MaxParallelRequests` in the commands YAML. Unlimited (bounded only by MAX_WORKERS) if not specified.
+        :param stream_results: A flag that determines if paginated results are written to disk page by page as they arrive,
+            instead of being collected in memory first. The result files are the same either way.
+        :param results_format: The format of the result files. `ResultsFormat.COMPACT` writes smaller, unsorted JSON
+            with a native encoder when one is installed. Defaults to `ResultsFormat.PRETTY`, the indented format.
+        :param resume: A flag that determines if the scan continues a previous, interrupted scan of the account:
+            the previous results are kept, and the calls that the scan journal records as completed are skipped.
+        :param refresh: A flag that determines if the scan refreshes the results of previous scans of the account:
+            only the results that are older than the `Ttl` (in seconds) of their command in the commands YAML are fetched again,
+            as well as the results of commands whose inputs were changed by the refresh. Commands without a `Ttl` are always fetched again.
+        :param writer_processes: The number of processes that encode and write the results, so that the CPU work of saving
+            the results is spread over the cores, instead of running in the threads that fetch them. 0 (the default) writes the results
+            in the fetching threads. Results that are streamed to disk (stream_results) are always written by the fetching threads.
+        :param metrics_interval: How often (in seconds) the metrics of the calls are exported to metrics.json and metrics.prom
+            in the account-data directory during the scan, for long scans. 0 (the default) exports them only at the end of the scan.
+        :param command_timeout: How long (in seconds) a single scan command may run. Once it passes, the command stops issuing requests,
+            and saves the results it has, which the scan reports as cut off. None (the default) for no limit.
+        :param scan_timeout: How long (in seconds) the scan (of every subscription) may run. Once it passes, the scan stops issuing requests,
+            and saves the results it has, which it reports as cut off. None (the default) for no limit.
         """
         super().__init__(cloud_provider=CloudProvider.AZURE,
                          account_name=account_name,
                          should_clean_before_scan=should_clean_before_scan,
                          output_path=output_path,
-                         commands_path=commands_path)
+                         commands_path=commands_path,
+                         stream_results=stream_results,
+                         results_format=results_format,
+                         resume=resume,
+                         refresh=refresh,
+                         writer_processes=writer_processes,
+                         metrics_interval=metrics_interval,
+                         command_timeout=command_timeout,
+                         scan_timeout=scan_timeout)
         self.subscription_id = subscription_id
+        self.max_parallel_requests_per_command: Optional[int] = max_parallel_requests_per_command
+
+
+class AzureTenantScanSettings(AzureCloudScanSettings):
+    def __init__(self,
+                 commands_path: str,
+                 subscription_ids: Optional[List[str]] = None,
+                 max_parallel_subscriptions: int = 10,
+                 **kwargs):
+        """
+        The settings that the AzureTenantScanner uses for scanning many azure subscriptions together.
+        :param commands_path: The path of a YAML file that describes the scan commands to be used.
+        :param subscription_ids: The subscriptions to scan. If not specified, all the enabled subscriptions that the credentials can access are scanned.
+        :param max_parallel_subscriptions: The maximum number of subscriptions that are scanned at the same time.
+        :param kwargs: The settings of the scan of every subscription, as in AzureCloudScanSettings
+            (except subscription_id and account_name, which is the subscription ID).
+        """
+        super().__init__(commands_path=commands_path, subscription_id='', account_name='', **kwargs)
+        self.subscription_ids: List[str] = subscription_ids or []
+        self.max_parallel_subscriptions: int = max(max_parallel_subscriptions, 1)
+
+    def get_subscription_settings(self, subscription_id: str) -> AzureCloudScanSettings:
+        subscription_settings = copy.copy(self)
+        subscription_settings.subscription_id = subscription_id
+        subscription_settings.account_name = subscription_id
+        return subscription_settings
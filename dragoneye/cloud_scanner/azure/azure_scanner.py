@@ -1,6 +1,6 @@
-import collections
 import os
-from typing import List, Deque
+import re
+from typing import Hashable, List, Optional, Union
 
 import json
 
@@ -8,87 +8,199 @@ from requests import Response
 
 from dragoneye.cloud_scanner.azure.azure_scan_settings import AzureCloudScanSettings
 from dragoneye.cloud_scanner.base_cloud_scanner import BaseCloudScanner
+from dragoneye.cloud_scanner.scan_plan import FanOutFactor
 from dragoneye.config import config
-from dragoneye.utils.misc_utils import elapsed_time, invoke_get_request, init_directory, get_dynamic_values_from_files, custom_serializer
+from dragoneye.utils.misc_utils import elapsed_time, invoke_get_request
 from dragoneye.utils.app_logger import logger
-from dragoneye.utils.threading_utils import ThreadedFunctionData, execute_parallel_functions_in_threads
+from dragoneye.utils.concurrency_limiter import AdaptiveConcurrencyLimiters
+from dragoneye.utils.deadline import Deadline
+from dragoneye.utils.http_session import get_http_session
+from dragoneye.utils.json_stream_writer import JsonStreamWriter, JsonItemsSpool
+from dragoneye.utils.scan_metrics import CallLabels, CallMeasurement, ScanMetrics
+from dragoneye.utils.threading_utils import ThreadedFunctionData, TaskScheduler, TaskFanOut
+
+RESOURCE_GROUPS_FILE_NAME = 'resource-groups.json'
+RESOURCE_GROUPS_OPERATION = 'resource-groups'
 
 
 class AzureScanner(BaseCloudScanner):
 
-    def __init__(self, auth_header: str, settings: AzureCloudScanSettings):
-        super().__init__(settings)
+    def __init__(self, auth_header: str, settings: AzureCloudScanSettings, concurrency_limiters: Optional[AdaptiveConcurrencyLimiters] = None,
+                 metrics: Optional[ScanMetrics] = None):
+        """
+        :param concurrency_limiters: The concurrency limiters of the scheduler that runs the scan, when it is shared with other scans.
+        :param metrics: The metrics of the calls of the scan, when they are shared with other scans.
+        """
+        super().__init__(settings, metrics)
         self.auth_header = auth_header
         self.subscription_id = settings.subscription_id
+        self.concurrency_limiters = concurrency_limiters or \
+            AdaptiveConcurrencyLimiters(config.get('INITIAL_CONCURRENCY_PER_ENDPOINT'), config.get('MAX_WORKERS'))
 
     @elapsed_time('Scanning Azure live environment took {} seconds')
     def scan(self) -> str:
+        scheduler = TaskScheduler(config.get('MAX_WORKERS'), self.concurrency_limiters)
+        self.prepare_scan(scheduler)
+        with self.metrics.exporting(os.path.join(self.account_data_dir, '..'), self.settings.metrics_interval):
+            scheduler.run()
+            self.finish_scan()
+        self.concurrency_limiters.log_limits()
+        logger.info('HTTP connections: {requests} requests, {connections} connections opened, '
+                    '{reused_connections} requests reused an open connection'.format(**get_http_session().get_stats()))
+
+        return os.path.abspath(os.path.join(self.account_data_dir, '..'))
+
+    def prepare_scan(self, scheduler: TaskScheduler, task_key_prefix: tuple = ()) -> List[Hashable]:
+        """
+        Creates the directory of the subscription, fetches its resource groups, and adds the scan commands to the scheduler,
+        which may be shared with the scans of other subscriptions.
+        The scan is complete once all the added tasks are done, and finish_scan was called.
+
+        :param task_key_prefix: A prefix to the keys of the added tasks, that distinguishes them from the tasks of other scans.
+        :return: The keys of the added tasks.
+        """
         headers = {
             'Authorization': self.auth_header
         }
 
-        self.account_data_dir = init_directory(self.settings.output_path, self.settings.account_name, self.settings.clean)
+        self._init_account_data_dir()
+        scan_commands = self._get_scan_commands()
+        dependencies = self._get_commands_dependencies(scan_commands)
+        self.result_store = self._create_result_store(scan_commands, [RESOURCE_GROUPS_FILE_NAME])
         resource_groups = self._get_resource_groups(headers)
 
-        dependent_commands, independent_commands = self._get_scan_commands()
-
-        non_dependable_tasks: List[ThreadedFunctionData] = []
-        dependable_tasks: List[ThreadedFunctionData] = []
-        deque_tasks: Deque[List[ThreadedFunctionData]] = collections.deque()
-
-        for independent_command in independent_commands:
-            non_dependable_tasks.append(ThreadedFunctionData(
-                self._execute_scan_commands,
-                (independent_command, headers, resource_groups),
-                'exception on command {}'.format(independent_command)))
-
-        deque_tasks.append(non_dependable_tasks)
-
-        for dependent_command in dependent_commands:
-            dependable_tasks.append(ThreadedFunctionData(
-                self._execute_scan_commands,
-                (dependent_command, headers, resource_groups),
-                'exception on command {}'.format(dependent_command)))
-
-        for dependable_task in dependable_tasks:
-            deque_tasks.append([dependable_task])
-        execute_parallel_functions_in_threads(deque_tasks, config.get('MAX_WORKERS'))
-
-        self._print_summary()
+        task_keys = []
+        for index, scan_command in enumerate(scan_commands):
+            task_key = (*task_key_prefix, index)
+            scheduler.add_task(task_key,
+                               ThreadedFunctionData(
+                                   self._execute_scan_commands,
+                                   (scan_command, headers, resource_groups),
+                                   'exception on command {}'.format(scan_command)),
+                               [(*task_key_prefix, dependency) for dependency in dependencies[index]],
+                               group=task_key_prefix)
+            task_keys.append(task_key)
+        return task_keys
+
+    def finish_scan(self, report_directory: Optional[str] = None) -> None:
+        """
+        Summarizes the scan, and closes its journal.
+        :param report_directory: The directory to write the failures report to. Defaults to the parent directory of the subscription.
+        """
+        self.result_writer.wait()
+        self.journal.close()
+        self._print_summary(report_directory)
+
+    def _execute_scan_commands(self, scan_command: dict, headers: dict, resource_groups: List[str]) -> Optional[TaskFanOut]:
+        output_file = self._get_result_file_path(self.account_data_dir, scan_command['Name'])
+        request = scan_command['Request']
+        ttl = self._get_refresh_ttl(scan_command, self.account_data_dir,
+                                    [RESOURCE_GROUPS_FILE_NAME] if '{resourceGroupName}' in request else [])
+        if self._is_completed(output_file, ttl):
+            return None
+
+        parameters = scan_command.get('Parameters', [])
+        base_url = request.replace('{subscriptionId}', self.subscription_id)
+        urls = self._build_urls(base_url, parameters, self.account_data_dir, resource_groups)
+        deadline = self._get_command_deadline()
+        cut_off_urls: List[str] = []
+        tasks = [ThreadedFunctionData(self._get_url_results,
+                                      (url, headers, scan_command, deadline, cut_off_urls),
+                                      'exception on command {}'.format(scan_command),
+                                      concurrency_key=self._get_concurrency_key(url)) for url in urls]
+        return TaskFanOut(tasks,
+                          lambda urls_results: self._save_command_results(scan_command, urls, urls_results, output_file, cut_off_urls),
+                          scan_command.get('MaxParallelRequests', self.settings.max_parallel_requests_per_command))
+
+    def _get_url_results(self, url: str, headers: dict, scan_command: dict, deadline: Optional[Deadline] = None,
+                         cut_off_urls: Optional[List[str]] = None) -> Union[dict, JsonItemsSpool, None]:
+        """
+        :param deadline: The deadline of the command. Once it has passed, the url is not invoked, and its results are empty.
+        :param cut_off_urls: The urls of the command that its deadline cut off, which the url is added to if it is cut off.
+        """
+        cut_off = deadline.get_cut_off_reason() if deadline is not None else None
+        if cut_off is not None:
+            self._cut_off_call(self._get_call_labels(self._get_endpoint_key(url), scan_command['Name']), url, cut_off)
+            if cut_off_urls is not None:
+                cut_off_urls.append(url)
+            url_results = {'value': []}
+        else:
+            try:
+                url_results = self._invoke_url(url, headers, scan_command['Name'])
+            except Exception as ex:
+                logger.exception('Exception occurred: {} while running command {}'.format(ex, scan_command))
+                return None
+
+        if not self.settings.stream_results:
+            return url_results
+        self._add_resource_group(url_results)
+        spool = JsonItemsSpool(results_format=self.settings.results_format)
+        spool.extend(url_results['value'])
+        return spool
+
+    def _save_command_results(self, scan_command: dict, urls: List[str], urls_results: List[Union[dict, JsonItemsSpool, None]], output_file: str,
+                              cut_off_urls: Optional[List[str]] = None) -> None:
+        """
+        Saves the results of all the urls of the command. If a deadline cut off some of its urls, the partial results are saved,
+        but they are not recorded in the journal, so resuming the scan invokes the urls again.
+        """
+        if any(url_results is None for url_results in urls_results):
+            logger.error(f'Results of command {scan_command["Name"]} were not saved, since some of its requests have failed')
+            for url_results in urls_results:
+                if isinstance(url_results, JsonItemsSpool):
+                    url_results.close()
+            return
+
+        labels = self._get_call_labels(self._get_endpoint_key(scan_command['Request']), scan_command['Name'])
+        if self.settings.stream_results:
+            writer = JsonStreamWriter(output_file, results_format=self.settings.results_format)
+            writer.extend('value', [])
+            for spool in urls_results:
+                writer.extend_from_spool('value', spool)
+                spool.close()
+            writer.set('urls', urls)
+            writer.close()
+            if not cut_off_urls:
+                self.journal.record(output_file)
+            self._record_result_size(labels, output_file)
+        else:
+            results = {'value': [item for url_results in urls_results for item in url_results['value']], 'urls': urls}
+            self._save_result(results, output_file, labels, scan_command['Request'], record=not cut_off_urls)
+        if cut_off_urls:
+            logger.warning(f'{len(cut_off_urls)} of the {len(urls)} requests of command {scan_command["Name"]} were cut off, '
+                           f'its partial results were saved to {output_file}')
+        for url in urls:
+            if url not in (cut_off_urls or []):
+                logger.info(f'Results from {url} were saved to {output_file}')
 
-        return os.path.abspath(os.path.join(self.account_data_dir, '..'))
+    def _save_result(self, result: dict, filepath: str, labels: CallLabels, request: str, record: bool = True) -> None:
+        """
+        Saves the result, and records it in the journal once it is completely written (unless record is False).
+        :param request: The request (or the request template of the command) that the result is of.
+        """
+        if self.result_store.is_referenced(filepath, self.account_data_dir):
+            # Dependent commands query the result from memory, so it is enriched here rather than by the writer
+            self._add_resource_group(result)
+            transform = None
+        else:
+            transform = AzureScanner._add_resource_group
 
-    def _execute_scan_commands(self, scan_command: dict, headers: dict, resource_groups: List[str]) -> None:
-        try:
-            output_file = self._get_result_file_path(self.account_data_dir, scan_command['Name'])
-            if os.path.isfile(output_file):
-                # Data already scanned, so skip
-                logger.warning('Response already present at {}'.format(output_file))
-                return
-
-            request = scan_command['Request']
-            parameters = scan_command.get('Parameters', [])
-            base_url = request.replace('{subscriptionId}', self.subscription_id)
-            results = self._get_results(base_url, headers, parameters, self.account_data_dir, resource_groups)
-            self._save_result(results, output_file)
-            for url in results['urls']:
-                logger.info(f'Results from {url} were saved to {output_file}')
-        except Exception as ex:
-            logger.exception('Exception occurred: {} while running command {}'.format(ex, scan_command))
+        def on_written(sha256: str) -> None:
+            if record:
+                self.journal.record(filepath, sha256=sha256)
+            self._record_result_size(labels, filepath)
 
-    def _save_result(self, result: dict, filepath: str) -> None:
-        self._add_resource_group(result)
-        with open(filepath, "w") as file:
-            json.dump(result, file, indent=4, default=custom_serializer)
+        self._write_result(result, filepath, labels, request,
+                           lambda ex: {'request': request, 'error': {'code': type(ex).__name__, 'message': str(ex)}}, on_written, transform=transform)
+        self.result_store.publish(filepath, result, self.account_data_dir)
 
-    @staticmethod
-    def _build_urls(_url: str, parameters: List[dict], account_data_dir: str, resource_groups: List[str]):
+    def _build_urls(self, _url: str, parameters: List[dict], account_data_dir: str, resource_groups: List[str]):
         urls_with_params = []
         if parameters:
             for parameter in parameters:
                 param_names = parameter['Name']
                 param_dynamic_value = parameter['Value']
-                param_real_values = get_dynamic_values_from_files(param_dynamic_value, account_data_dir)
+                param_real_values = self.result_store.get_dynamic_values(param_dynamic_value, account_data_dir)
 
                 for param_real_value in param_real_values:
                     modified_url = _url
@@ -111,24 +223,71 @@ class AzureScanner(BaseCloudScanner):
 
         return complete_urls
 
-    def _get_results(self, base_url: str, headers: dict, parameters: List[dict], account_data_dir: str, resource_groups: List[str]) -> dict:
+    def _get_results(self, base_url: str, headers: dict, parameters: List[dict], account_data_dir: str, resource_groups: List[str],
+                     operation: str, deadline: Optional[Deadline] = None, cut_off_urls: Optional[List[str]] = None) -> dict:
+        """
+        Invokes the urls one after another. Once the deadline has passed, the remaining urls are not invoked.
+        :param cut_off_urls: The urls that the deadline cut off are added to it, if it is given.
+        """
         results = {'value': []}
-        urls = AzureScanner._build_urls(base_url, parameters, account_data_dir, resource_groups)
-        for url in urls:
-            logger.info(f'Invoking {url}')
-            call_summary = {
-                'request': url
-            }
-            response = invoke_get_request(url, headers, on_giveup=self._default_on_backoff_giveup)
+        urls = self._build_urls(base_url, parameters, account_data_dir, resource_groups)
+        for index, url in enumerate(urls):
+            cut_off = deadline.get_cut_off_reason() if deadline is not None else None
+            if cut_off is not None:
+                for cut_off_url in urls[index:]:
+                    self._cut_off_call(self._get_call_labels(self._get_endpoint_key(cut_off_url), operation), cut_off_url, cut_off)
+                if cut_off_urls is not None:
+                    cut_off_urls.extend(urls[index:])
+                break
+            results['value'].extend(self._invoke_url(url, headers, operation)['value'])
+        results['urls'] = urls
+        return results
+
+    def _invoke_url(self, url: str, headers: dict, operation: str) -> dict:
+        """
+        :param operation: The name of the command (or of the built-in call) that invokes the url, which its metrics are labeled with.
+        """
+        results = {'value': []}
+        logger.info(f'Invoking {url}')
+        call_summary = {
+            'request': url
+        }
+        labels = self._get_call_labels(self._get_endpoint_key(url), operation)
+        with self.metrics.measure_call(labels) as measurement:
+            response = invoke_get_request(url, headers,
+                                          on_backoff=lambda details: self._on_backoff(details, measurement),
+                                          on_giveup=self._default_on_backoff_giveup)
+            measurement.pages = 1
             if response.status_code == 200:
                 AzureScanner._concat_results(results, response)
             else:
+                if response.status_code == 429:
+                    measurement.throttled = True
+                    self.concurrency_limiters.on_throttled(self._get_concurrency_key(url))
+                measurement.failed = True
                 call_summary['error'] = json.loads(response.content.decode('utf-8'))['error']
                 logger.error(self._parse_error(call_summary))
-            self.summary.put_nowait(call_summary)
-        results['urls'] = urls
+        self.run_log.record_call(labels, url, measurement, failure=call_summary if 'error' in call_summary else None)
         return results
 
+    @staticmethod
+    def _on_backoff(details: dict, measurement: CallMeasurement) -> None:
+        measurement.retries += 1
+        if getattr(details.get('value'), 'status_code', None) == 429:
+            measurement.throttled = True
+
+    def _get_concurrency_key(self, url: str) -> str:
+        # The concurrency limiters may be shared by the scans of several subscriptions, which are throttled separately
+        return f'{self.subscription_id}/{self._get_endpoint_key(url)}'
+
+    @staticmethod
+    def _get_endpoint_key(url: str) -> str:
+        """
+        Azure Resource Manager throttles the requests of a subscription per resource provider, so each provider is an endpoint.
+        """
+        match = re.search(r'/providers/([^/?]+)', url, re.IGNORECASE)
+        return match.group(1).lower() if match else 'resources'
+
     @staticmethod
     def _default_on_backoff_giveup(details: dict) -> None:
         logger.error('Given up on request for {args[0]} after {tries} tries'.format(**details))
@@ -145,13 +304,29 @@ class AzureScanner(BaseCloudScanner):
                 else:
                     results['value'].append(result)
 
+    def _get_fan_out(self, scan_command: dict, scope: str, directory: str) -> Optional[List[FanOutFactor]]:
+        # Follows _build_urls: the urls of all the parameters are added up,
+        # and each of them is requested for every resource group, unless a parameter is the resource group
+        factors = []
+        parameters = scan_command.get('Parameters', [])
+        param_names = [param_name for parameter in parameters for param_name in parameter['Name'].split(' ')]
+        if parameters:
+            counts = [self._count_previous_values(parameter['Value'], directory) for parameter in parameters]
+            factors.append(FanOutFactor(tuple(param_names), None if None in counts else sum(counts)))
+        if '/{resourceGroupName}/' in scan_command['Request'] and 'resourceGroupName' not in param_names:
+            factors.append(FanOutFactor(('resourceGroupName',),
+                                        self._count_previous_values(f'{RESOURCE_GROUPS_FILE_NAME}|.value[].name', directory)))
+        return factors
+
     def _get_resource_groups(self, headers: dict) -> List[str]:
         url = f'https://management.azure.com/subscriptions/{self.subscription_id}/resourcegroups?api-version=2020-09-01'
-        results = self._get_results(url, headers, [], self.account_data_dir, [])
+        cut_off_urls: List[str] = []
+        results = self._get_results(url, headers, [], self.account_data_dir, [], RESOURCE_GROUPS_OPERATION, self.deadline, cut_off_urls)
         output_file = self._get_result_file_path(self.account_data_dir, 'resource-groups')
-        self._save_result(results, output_file)
+        self._save_result(results, output_file, self._get_call_labels(self._get_endpoint_key(url), RESOURCE_GROUPS_OPERATION), url,
+                          record=not cut_off_urls)
         logger.info(f'Results from {url} were saved to {output_file}')
-        return get_dynamic_values_from_files('resource-groups.json|.value[].name', self.account_data_dir)
+        return self.result_store.get_dynamic_values(f'{RESOURCE_GROUPS_FILE_NAME}|.value[].name', self.account_data_dir)
 
     @staticmethod
     def _add_resource_group(results: dict) -> None:
@@ -164,6 +339,10 @@ class AzureScanner(BaseCloudScanner):
                 except Exception:
                     pass
 
+    @staticmethod
+    def _get_command_output_name(scan_command: dict) -> str:
+        return scan_command['Name'] + '.json'
+
     @staticmethod
     def _get_result_file_path(account_data_dir: str, filename: str):
         return os.path.join(account_data_dir, filename + '.json')
@@ -0,0 +1,59 @@
+import json
+from typing import List
+
+from dragoneye.cloud_scanner.azure.azure_authorizer import SUBSCRIPTIONS_URL
+from dragoneye.cloud_scanner.azure.azure_scan_settings import AzureTenantScanSettings
+from dragoneye.cloud_scanner.azure.azure_scanner import AzureScanner
+from dragoneye.cloud_scanner.base_multi_account_scanner import BaseMultiAccountScanner
+from dragoneye.config import config
+from dragoneye.dragoneye_exception import DragoneyeException
+from dragoneye.utils.app_logger import logger
+from dragoneye.utils.http_session import get_http_session
+from dragoneye.utils.misc_utils import elapsed_time, invoke_get_request
+
+
+class AzureTenantScanner(BaseMultiAccountScanner):
+    """
+    Scans many Azure subscriptions (e.g. all the subscriptions of a tenant) through a single scheduler,
+    so all the subscriptions share one budget of threads (MAX_WORKERS), one authorization token and one pool of HTTP connections.
+    """
+
+    def __init__(self, auth_header: str, settings: AzureTenantScanSettings):
+        """
+        :param auth_header: The authorization header of all the subscriptions, as returned by AzureAuthorizer.get_authorization_token.
+        """
+        super().__init__(config.get('MAX_WORKERS'), settings.max_parallel_subscriptions, settings.output_path, settings.metrics_interval)
+        self.auth_header = auth_header
+        self.settings = settings
+
+    @elapsed_time('Scanning Azure subscriptions took {} seconds')
+    def scan(self) -> str:
+        output_path = self._scan_accounts(self.settings.subscription_ids or self._discover_subscriptions())
+        logger.info('HTTP connections: {requests} requests, {connections} connections opened, '
+                    '{reused_connections} requests reused an open connection'.format(**get_http_session().get_stats()))
+        return output_path
+
+    def _discover_subscriptions(self) -> List[str]:
+        logger.info('* Discovering the subscriptions of the tenant')
+        subscription_ids = []
+        url = f'{SUBSCRIPTIONS_URL}?api-version=2020-01-01'
+        while url:
+            response = invoke_get_request(url, {'Authorization': self.auth_header})
+            if response.status_code != 200:
+                raise DragoneyeException(f'Failed to list the subscriptions. status code: {response.status_code}\n'
+                                         f'Reason: {response.text}', response.text)
+            result = json.loads(response.text)
+            for subscription in result.get('value', []):
+                if subscription['state'] == 'Enabled':
+                    subscription_ids.append(subscription['subscriptionId'])
+                else:
+                    logger.info(f'Skipping subscription {subscription["subscriptionId"]}, as its state is {subscription["state"]}')
+            url = result.get('nextLink')
+        return subscription_ids
+
+    def _create_account_scanner(self, account: str) -> AzureScanner:
+        return AzureScanner(self.auth_header, self.settings.get_subscription_settings(account), self.concurrency_limiters, self.metrics)
+
+    @staticmethod
+    def _get_account_name(account: str) -> str:
+        return account
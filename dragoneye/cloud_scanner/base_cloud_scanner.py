@@ -1,10 +1,23 @@
+import fnmatch
+import glob
 import json
 import os
+import re
 from abc import abstractmethod
 from enum import Enum
-from queue import Queue
+from typing import Any, Callable, Iterable, List, Dict, Optional, Set
+from dragoneye.cloud_scanner.scan_plan import CommandPlan, FanOutFactor, ScanPlan, FAN_OUT_WARNING
 from dragoneye.utils.app_logger import logger
-from dragoneye.utils.misc_utils import load_yaml
+from dragoneye.utils.deadline import Deadline
+from dragoneye.utils.json_serializer import ResultsFormat
+from dragoneye.utils.misc_utils import load_yaml, init_directory, split_dynamic_value
+from dragoneye.utils.result_store import ResultStore
+from dragoneye.utils.result_writer import ResultWriter
+from dragoneye.utils.run_log import RunLog, RUN_REPORT_FILE_NAME
+from dragoneye.utils.scan_journal import ScanJournal
+from dragoneye.utils.scan_metrics import CallLabels, ScanMetrics
+
+CUT_OFFS_REPORT_FILE_NAME = 'cut-offs-report.json'
 
 
 class CloudProvider(str, Enum):
@@ -19,43 +32,227 @@ class CloudScanSettings:
                  account_name: str,
                  should_clean_before_scan: bool,
                  output_path: str,
-                 commands_path: str):
+                 commands_path: str,
+                 stream_results: bool = False,
+                 results_format: ResultsFormat = ResultsFormat.PRETTY,
+                 resume: bool = False,
+                 refresh: bool = False,
+                 writer_processes: int = 0,
+                 metrics_interval: float = 0,
+                 command_timeout: Optional[float] = None,
+                 scan_timeout: Optional[float] = None):
         self.cloud_provider: CloudProvider = cloud_provider
         self.account_name: str = account_name
         self.clean: bool = should_clean_before_scan
         self.output_path: str = output_path
         self.commands_path: str = commands_path
+        self.stream_results: bool = stream_results
+        self.results_format: ResultsFormat = ResultsFormat(results_format)
+        self.resume: bool = resume
+        self.refresh: bool = refresh
+        self.writer_processes: int = writer_processes
+        self.metrics_interval: float = metrics_interval
+        self.command_timeout: Optional[float] = command_timeout
+        self.scan_timeout: Optional[float] = scan_timeout
 
 
 class BaseCloudScanner:
-    def __init__(self, settings: CloudScanSettings):
+    def __init__(self, settings: CloudScanSettings, metrics: Optional[ScanMetrics] = None):
         self.account_data_dir: str = None
-        self.summary: Queue = Queue()
+        self.run_log: Optional[RunLog] = None
         self.settings: CloudScanSettings = settings
+        self.result_store: ResultStore = ResultStore()
+        self.journal: Optional[ScanJournal] = None
+        self.result_writer: ResultWriter = ResultWriter(settings.writer_processes)
+        self.metrics: ScanMetrics = metrics or ScanMetrics()
+        # The deadline of the scan, which starts when the scan does. Cancelling it stops the scan, which keeps the results it has
+        self.deadline: Deadline = Deadline()
 
     @abstractmethod
     def scan(self) -> str:
         pass
 
+    def plan(self, fan_out_warning: int = FAN_OUT_WARNING) -> ScanPlan:
+        """
+        Compiles the scan commands into the plan of the scan, without calling the cloud provider or changing the results of the account.
+        The calls of the commands are estimated from the results of the previous scan of the account, if there is one.
+        :param fan_out_warning: The estimated calls of a command in a single scope from which its cartesian fan-out is reported.
+        """
+        self.account_data_dir = os.path.abspath(os.path.join(self.settings.output_path, 'account-data', self.settings.account_name))
+        scan_commands = self._get_scan_commands()
+        dependencies = self._get_commands_dependencies(scan_commands)
+        scopes = self._get_plan_scopes()
+
+        commands = []
+        for index, scan_command in enumerate(scan_commands):
+            name = os.path.splitext(self._get_command_output_name(scan_command))[0]
+            command = CommandPlan(index, name, sorted(dependencies[index]))
+            for scope, directory in scopes.items():
+                fan_out = self._get_fan_out(scan_command, scope, directory)
+                if fan_out is not None:
+                    command.fan_out[scope] = fan_out
+            commands.append(command)
+        return ScanPlan(list(scopes), commands, fan_out_warning)
+
+    def _get_plan_scopes(self) -> Dict[str, str]:
+        """
+        Returns the directories that the dynamic parameters of the commands are read from, by the scope (e.g. the region) they belong to.
+        """
+        return {'global': self.account_data_dir}
+
+    @abstractmethod
+    def _get_fan_out(self, scan_command: dict, scope: str, directory: str) -> Optional[List[FanOutFactor]]:
+        """
+        Returns the factors that multiply the calls of the command in the scope, as the scan would expand its parameters,
+        or None if the command does not run in the scope.
+        :param directory: The directory that the dynamic parameters of the command are read from.
+        """
+
+    def _count_previous_values(self, value: str, directory: str) -> Optional[int]:
+        """
+        Returns the number of values of the dynamic value in the results of the previous scan, or None if there are no results to count.
+        A templated file name (e.g. `{{VpcId}}`) counts the values in the results of all the templated values together.
+        """
+        if '|' not in value:
+            return 1
+        file_pattern, query = split_dynamic_value(value)
+        file_pattern = re.sub(r'{{[^|]*?}}', '*', file_pattern)
+        if not glob.glob(os.path.join(directory, file_pattern)):
+            return None
+        try:
+            return len(self.result_store.get_dynamic_values(f'{file_pattern}|{query}', directory))
+        except Exception as ex:
+            logger.warning(f'Could not count the values of {value} in the results of the previous scan: {ex}')
+            return None
+
+    def _init_account_data_dir(self) -> None:
+        """
+        Creates the directory of the account, and the journal and the run log of the scan in it, and starts the deadline of the scan.
+        When resuming or refreshing, the results of the previous scans are kept, and the calls they completed are loaded from the journal.
+        """
+        keep_results = self.settings.resume or self.settings.refresh
+        self.account_data_dir = init_directory(self.settings.output_path, self.settings.account_name, self.settings.clean and not keep_results)
+        self.journal = ScanJournal(self.account_data_dir, keep_results)
+        self.run_log = RunLog(self.account_data_dir)
+        self.deadline = Deadline(self.settings.scan_timeout)
+
+    def _get_command_deadline(self) -> Deadline:
+        """
+        Starts the deadline of a scan command, which the deadline of the scan cuts off as well.
+        """
+        return self.deadline.child(self.settings.command_timeout, 'command')
+
+    def _cut_off_call(self, labels: CallLabels, call: str, reason: str) -> None:
+        """
+        Records a call (or a whole command) that is not called, since a deadline cut it off.
+        """
+        logger.warning(f'{call} was cut off by the {reason}')
+        self.run_log.record_cut_off(labels, call, reason)
+
+    def _get_call_labels(self, service: str, operation: str, region: str = 'global') -> CallLabels:
+        return CallLabels(self.settings.cloud_provider.value, self.settings.account_name, service, operation, region)
+
+    def _record_result_size(self, labels: CallLabels, output_file: str) -> None:
+        size = os.path.getsize(output_file)
+        self.metrics.add_bytes_written(labels, size)
+        self.run_log.record_result(output_file, size)
+
+    def _is_completed(self, output_file: str, ttl: Optional[float] = None) -> bool:
+        """
+        Returns whether the call whose result is `output_file` does not need to be done again:
+        when refreshing, if the journal has a result that is younger than `ttl` seconds;
+        when resuming, if the journal has a result;
+        otherwise, if the file exists.
+        """
+        if self.settings.refresh:
+            if self.journal.is_fresh(output_file, ttl):
+                logger.info('Response at {} is fresh'.format(output_file))
+                return True
+            return False
+        if self.settings.resume:
+            completed = self.journal.is_completed(output_file)
+        else:
+            completed = os.path.isfile(output_file)
+        if completed:
+            logger.warning('Response already present at {}'.format(output_file))
+        return completed
+
+    def _get_refresh_ttl(self, scan_command: dict, directory: str, additional_inputs: Iterable[str] = ()) -> Optional[float]:
+        """
+        Returns how long (in seconds) the results of the command stay fresh in this refresh: the `Ttl` of the command,
+        or None if the command has none, or if this scan changed a result that the command reads its parameters from.
+        :param directory: The directory that the dynamic parameters of the command are read from.
+        :param additional_inputs: Results that the command depends on, other than the ones its dynamic parameters reference.
+        """
+        if not self.settings.refresh:
+            return None
+        scope = os.path.relpath(directory, self.account_data_dir).replace(os.sep, '/')
+        inputs = set(additional_inputs) | self._get_referenced_files(scan_command)
+        if self.journal.has_changes(name if scope == '.' else f'{scope}/{name}' for name in inputs):
+            logger.info(f'The inputs of command {scan_command} have changed, so its results are fetched again')
+            return None
+        return scan_command.get('Ttl')
+
+    def _write_result(self, data: Any, output_file: str, labels: CallLabels, call: str, get_failure: Callable[[Exception], dict],
+                      on_written: Callable[[str], None], **kwargs) -> None:
+        """
+        Writes the result with the result writer of the scan. When refreshing, the result is recorded in the journal before this returns,
+        even if it is written by another process, since the commands that depend on it check the journal for changes once it returns.
+        A result that could not be written is recorded as a failure of the call in the run log, whichever process wrote it.
+        :param get_failure: Returns the summary of the call with the error of the write, as the failures report lists it.
+        :param kwargs: The arguments of ResultWriter.write.
+        """
+        def on_failed(ex: Exception) -> None:
+            self.run_log.record_write_failure(labels, call, output_file, get_failure(ex))
+
+        self.result_writer.write(data, output_file, self.settings.results_format, on_written=on_written, on_failed=on_failed,
+                                 wait=self.settings.refresh, **kwargs)
+
     @staticmethod
-    def _write_failures_report(directory, failures):
-        with open(os.path.join(directory, 'failures-report.json'), 'w+') as failures_report:
-            failures_report.write(json.dumps(failures, default=str))
+    def _write_failures_report(directory, failures: Iterable[dict]):
+        BaseCloudScanner._write_report(os.path.join(directory, 'failures-report.json'), failures)
 
-    def _print_summary(self):
-        logger.info("--------------------------------------------------------------------")
-        failures = []
-        for call_summary in self.summary.queue:
-            if 'error' in call_summary or 'exception' in call_summary:
-                failures.append(call_summary)
+    @staticmethod
+    def _write_report(file_path: str, items: Iterable[dict]) -> None:
+        # The items are streamed from the run log, so they are written one by one instead of as a single list
+        with open(file_path, 'w+') as report:
+            report.write('[')
+            for index, item in enumerate(items):
+                if index > 0:
+                    report.write(', ')
+                report.write(json.dumps(item, default=str))
+            report.write(']')
 
-        logger.info("Summary: {} APIs called. {} errors".format(len(self.summary.queue), len(failures)))
-        if len(failures) > 0:
+    def _print_summary(self, report_directory: Optional[str] = None):
+        """
+        Closes the run log, logs the summary of the scan, and writes the failures report, the cut offs report and the run report.
+        """
+        logger.info("--------------------------------------------------------------------")
+        report_directory = report_directory or os.path.join(self.account_data_dir, '..')
+        self.run_log.close()
+        logger.info("Summary: {} APIs called. {} errors".format(self.run_log.calls, self.run_log.failures))
+        if self.run_log.failures > 0:
             logger.warning("Failures:")
-            for call_summary in failures:
+            for call_summary in self.run_log.read_failures():
                 logger.warning(f"  {self._parse_error(call_summary)}")
+        if self.run_log.cut_offs > 0:
+            logger.warning(f"{self.run_log.cut_offs} calls were cut off by deadlines, so their results are partial or missing:")
+            for cut_off in self.run_log.read_cut_offs():
+                logger.warning(f"  {cut_off['call']}: cut off by the {cut_off['cut_off']} after {cut_off['pages']} pages")
+
+        self._write_failures_report(report_directory, self.run_log.read_failures())
+        self._write_report(os.path.join(report_directory, CUT_OFFS_REPORT_FILE_NAME), self.run_log.read_cut_offs())
+        self._write_run_report(report_directory)
 
-        self._write_failures_report(os.path.join(self.account_data_dir, '..'), failures)
+    def _write_run_report(self, directory: str) -> None:
+        report = self.run_log.get_report()
+        with open(os.path.join(directory, RUN_REPORT_FILE_NAME), 'w') as run_report:
+            run_report.write(json.dumps(report, indent=4))
+        for command in report['commands'][:self.run_log.top_count]:
+            logger.info(f"  {command['command']}: {command['calls']} calls, {command['seconds']} seconds in calls ({command['share']:.1%})")
+        for call in report['slowest_calls'][:3]:
+            logger.info(f"  Slowest: {call['call']} ({call['duration']:.2f} seconds)")
+        logger.info(f'The run log of the scan was saved to {self.run_log.path}, and its report to {os.path.join(directory, RUN_REPORT_FILE_NAME)}')
 
     @staticmethod
     def _is_dynamic_parameter(parameter: dict):
@@ -67,15 +264,50 @@ class BaseCloudScanner:
     def _parse_error(call_summary: dict) -> str:
         pass
 
-    def _get_scan_commands(self):
-        scan_commands = load_yaml(self.settings.commands_path)
-        dependent_commands = []
-        independent_commands = []
-        for command in scan_commands:
-            parameters = command.get('Parameters', [])
-            if any(self._is_dynamic_parameter(parameter) for parameter in parameters):
-                dependent_commands.append(command)
-            else:
-                independent_commands.append(command)
-
-        return dependent_commands, independent_commands
+    def _get_scan_commands(self) -> List[dict]:
+        return load_yaml(self.settings.commands_path)
+
+    @staticmethod
+    @abstractmethod
+    def _get_command_output_name(scan_command: dict) -> str:
+        """
+        Returns the name of the file (or directory) the command writes its results to, relative to the directory
+        that dynamic parameters are read from.
+        """
+
+    @staticmethod
+    def _get_referenced_files(scan_command: dict) -> Set[str]:
+        referenced_files = set()
+        for parameter in scan_command.get('Parameters', []):
+            if BaseCloudScanner._is_dynamic_parameter(parameter):
+                value = parameter.get('Value', parameter.get('Values'))
+                referenced_file = value.split('|')[0].strip()
+                # Templated values such as `{{VpcId}}` are resolved only at runtime, so they are treated as wildcards
+                referenced_file = re.sub(r'{{[^|]*?}}', '*', referenced_file)
+                referenced_files.add(referenced_file.split('/')[0])
+        return referenced_files
+
+    def _create_result_store(self, scan_commands: List[dict], additional_referenced_names: Iterable[str] = ()) -> ResultStore:
+        """
+        Creates the store of the results of the scan, which keeps in memory only the results that dynamic parameters reference.
+        """
+        referenced_names = set(additional_referenced_names)
+        for scan_command in scan_commands:
+            referenced_names.update(self._get_referenced_files(scan_command))
+        return ResultStore(referenced_names)
+
+    def _get_commands_dependencies(self, scan_commands: List[dict]) -> Dict[int, Set[int]]:
+        """
+        Builds the dependency graph of the scan commands.
+        A command depends on every other command whose output is referenced by one of its dynamic parameters.
+        The returned dictionary maps each command's index to the indexes of the commands it depends on.
+        """
+        output_names = [self._get_command_output_name(scan_command) for scan_command in scan_commands]
+        dependencies: Dict[int, Set[int]] = {}
+        for index, scan_command in enumerate(scan_commands):
+            dependencies[index] = set()
+            for referenced_file in self._get_referenced_files(scan_command):
+                for producer_index, output_name in enumerate(output_names):
+                    if producer_index != index and fnmatch.fnmatchcase(output_name, referenced_file):
+                        dependencies[index].add(producer_index)
+        return dependencies
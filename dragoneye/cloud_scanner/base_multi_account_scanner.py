@@ -0,0 +1,117 @@
+import os
+import threading
+from abc import abstractmethod
+from collections import deque
+from typing import Any, Deque, Dict, List
+
+from dragoneye.config import config
+from dragoneye.utils.app_logger import logger
+from dragoneye.utils.concurrency_limiter import AdaptiveConcurrencyLimiters
+from dragoneye.utils.json_serializer import dump_to_file
+from dragoneye.utils.misc_utils import make_directory
+from dragoneye.utils.scan_metrics import ScanMetrics
+from dragoneye.utils.threading_utils import TaskScheduler, ThreadedFunctionData
+
+
+class BaseMultiAccountScanner:
+    """
+    Scans many accounts of a cloud provider (AWS accounts, Azure subscriptions, GCP projects) through a single scheduler,
+    so all the accounts share one budget of threads, instead of running a scan per account.
+
+    At most `max_parallel_accounts` accounts are scanned at the same time: the scanner of an account is created only when its scan starts,
+    and the scan is finished (releasing its clients and its results kept in memory) once all of its tasks are done.
+    The results of every account are saved under account-data/<account name>, as a scan of the account alone would save them,
+    and the metrics of the calls of all the accounts are exported to account-data.
+    """
+
+    def __init__(self, max_workers: int, max_parallel_accounts: int, output_path: str, metrics_interval: float = 0):
+        self.max_workers: int = max_workers
+        self.max_parallel_accounts: int = max(max_parallel_accounts, 1)
+        self.output_path: str = output_path
+        self.metrics_interval: float = metrics_interval
+        self.concurrency_limiters = AdaptiveConcurrencyLimiters(config.get('INITIAL_CONCURRENCY_PER_ENDPOINT'), max_workers)
+        self.metrics = ScanMetrics()
+        self.failed_accounts: Dict[str, str] = {}
+        self._pending_accounts: Deque[Any] = deque()
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _create_account_scanner(self, account: Any):
+        """
+        Returns the scanner of the account, whose prepare_scan and finish_scan run it on the shared scheduler.
+        Its scan should use self.concurrency_limiters and self.metrics, and prefix the keys of its endpoints with the name of the account,
+        since the cloud providers throttle every account separately.
+        """
+
+    @staticmethod
+    @abstractmethod
+    def _get_account_name(account: Any) -> str:
+        pass
+
+    def _scan_accounts(self, accounts: List[Any]) -> str:
+        logger.info(f'Scanning {len(accounts)} accounts, {self.max_parallel_accounts} at a time')
+        self.failed_accounts = {}
+        self._pending_accounts = deque(accounts)
+
+        output_path = os.path.join(self.output_path, 'account-data')
+        make_directory(output_path)
+        scheduler = TaskScheduler(self.max_workers, self.concurrency_limiters)
+        with self.metrics.exporting(output_path, self.metrics_interval):
+            for _ in range(self.max_parallel_accounts):
+                self._start_next_account(scheduler)
+            scheduler.run()
+
+        self._print_summary(accounts, output_path)
+        self.concurrency_limiters.log_limits()
+        return os.path.abspath(output_path)
+
+    def _start_next_account(self, scheduler: TaskScheduler) -> None:
+        with self._lock:
+            if not self._pending_accounts:
+                return
+            account = self._pending_accounts.popleft()
+        account_name = self._get_account_name(account)
+        scheduler.add_task((account_name, 'start'),
+                           ThreadedFunctionData(self._start_account_scan, (scheduler, account),
+                                                f'exception while starting the scan of account {account_name}'),
+                           group=(account_name,))
+
+    def _start_account_scan(self, scheduler: TaskScheduler, account: Any) -> None:
+        """
+        Creates the scanner of the account, and adds the tasks of its scan to the scheduler,
+        followed by a task that finishes the scan and starts the next pending account.
+        """
+        account_name = self._get_account_name(account)
+        logger.info(f'* Starting the scan of account {account_name}')
+        try:
+            scanner = self._create_account_scanner(account)
+            task_keys = scanner.prepare_scan(scheduler, (account_name,))
+        except Exception as ex:
+            logger.exception(f'Could not start the scan of account {account_name}')
+            with self._lock:
+                self.failed_accounts[account_name] = str(ex)
+            self._start_next_account(scheduler)
+            return
+
+        scheduler.add_task((account_name, 'finish'),
+                           ThreadedFunctionData(self._finish_account_scan, (scheduler, account_name, scanner),
+                                                f'exception while finishing the scan of account {account_name}'),
+                           task_keys,
+                           group=(account_name,))
+
+    def _finish_account_scan(self, scheduler: TaskScheduler, account_name: str, scanner) -> None:
+        try:
+            # Every account has its own failures report, as the reports of the accounts would otherwise overwrite each other
+            scanner.finish_scan(scanner.account_data_dir)
+            logger.info(f'* The scan of account {account_name} is done')
+        finally:
+            self._start_next_account(scheduler)
+
+    def _print_summary(self, accounts: List[Any], output_path: str) -> None:
+        logger.info("--------------------------------------------------------------------")
+        logger.info(f'Accounts summary: {len(accounts) - len(self.failed_accounts)} accounts scanned. '
+                    f'{len(self.failed_accounts)} accounts could not be scanned')
+        for account_name, error in self.failed_accounts.items():
+            logger.warning(f'  {account_name}: {error}')
+        dump_to_file([{'account': account_name, 'exception': error} for account_name, error in self.failed_accounts.items()],
+                     os.path.join(output_path, 'failures-report.json'))
@@ -0,0 +1,68 @@
+from typing import Iterator, List
+
+from dragoneye.cloud_scanner.base_multi_account_scanner import BaseMultiAccountScanner
+from dragoneye.cloud_scanner.gcp.gcp_scan_settings import GcpOrganizationScanSettings
+from dragoneye.cloud_scanner.gcp.gcp_scanner import GcpScanner
+from dragoneye.cloud_scanner.gcp.gcp_service_pool import GcpServicePool
+from dragoneye.config import config
+from dragoneye.utils.app_logger import logger
+from dragoneye.utils.misc_utils import elapsed_time
+
+
+class GcpOrganizationScanner(BaseMultiAccountScanner):
+    """
+    Scans many GCP projects (e.g. all the projects of an organization or a folder) through a single scheduler,
+    so all the projects share one budget of threads (MAX_WORKERS), one set of credentials and one pool of services.
+    """
+
+    def __init__(self, credentials, settings: GcpOrganizationScanSettings):
+        super().__init__(config.get('MAX_WORKERS'), settings.max_parallel_projects, settings.output_path, settings.metrics_interval)
+        self.credentials = credentials
+        self.settings = settings
+        self.service_pool = GcpServicePool(credentials)
+
+    @elapsed_time('Scanning GCP projects took {} seconds')
+    def scan(self) -> str:
+        try:
+            return self._scan_accounts(self.settings.project_ids or self._discover_projects())
+        finally:
+            self.service_pool.close()
+
+    def _discover_projects(self) -> List[str]:
+        if self.settings.parent:
+            logger.info(f'* Discovering the projects of {self.settings.parent}')
+            return list(self._discover_parent_projects(self.settings.parent))
+        logger.info('* Discovering the projects that the credentials can access')
+        projects = self.service_pool.get_service('cloudresourcemanager', 'v1').projects()
+        return [project['projectId'] for project in self._list_all(projects, 'projects', filter='lifecycleState:ACTIVE')]
+
+    def _discover_parent_projects(self, parent: str) -> Iterator[str]:
+        """
+        Yields the active projects under the organization or folder, including the projects of its sub folders.
+        """
+        parent_type, parent_id = parent.split('/')
+        projects = self.service_pool.get_service('cloudresourcemanager', 'v1').projects()
+        # The parent type of a project is singular: organization or folder
+        projects_filter = f'parent.type:{parent_type.rstrip("s")} parent.id:{parent_id} lifecycleState:ACTIVE'
+        for project in self._list_all(projects, 'projects', filter=projects_filter):
+            yield project['projectId']
+
+        folders = self.service_pool.get_service('cloudresourcemanager', 'v2').folders()
+        for folder in self._list_all(folders, 'folders', parent=parent):
+            if folder.get('lifecycleState', 'ACTIVE') == 'ACTIVE':
+                yield from self._discover_parent_projects(folder['name'])
+
+    @staticmethod
+    def _list_all(resource, items_key: str, **parameters) -> Iterator[dict]:
+        request = resource.list(**parameters)
+        while request is not None:
+            response = request.execute()
+            yield from response.get(items_key, [])
+            request = resource.list_next(previous_request=request, previous_response=response)
+
+    def _create_account_scanner(self, account: str) -> GcpScanner:
+        return GcpScanner(self.credentials, self.settings.get_project_settings(account), self.concurrency_limiters, self.service_pool, self.metrics)
+
+    @staticmethod
+    def _get_account_name(account: str) -> str:
+        return account
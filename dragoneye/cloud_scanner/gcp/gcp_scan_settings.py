@@ -1,6 +1,9 @@
+import copy
 import os
+from typing import List, Optional
 
 from dragoneye.cloud_scanner.base_cloud_scanner import CloudScanSettings, CloudProvider
+from dragoneye.utils.json_serializer import ResultsFormat
 
 
 class GcpCloudScanSettings(CloudScanSettings):
@@ -9,7 +12,16 @@ class GcpCloudScanSettings(CloudScanSettings):
                  account_name: str,
                  project_id: str,
                  output_path: str = os.getcwd(),
-                 should_clean_before_scan: bool = True):
+                 should_clean_before_scan: bool = True,
+                 batch_size: int = 100,
+                 stream_results: bool = False,
+                 results_format: ResultsFormat = ResultsFormat.PRETTY,
+                 resume: bool = False,
+                 refresh: bool = False,
+                 writer_processes: int = 0,
+                 metrics_interval: float = 0,
+                 command_timeout: Optional[float] = None,
+                 scan_timeout: Optional[float] = None):
         """
         The settings that the AwsScanner uses for aws scanning.
 
@@ -19,6 +31,59 @@ class GcpCloudScanSettings(CloudScanSettings):
             :param output_path: The directory where results will be saved. Defaults to current working directory.
             :param should_clean_before_scan: A flag that determines if prior results of this specific account (identified by account_name)
                 should be deleted before scanning.
+            :param batch_size: The maximum number of calls of a non-list method that are sent together in a single batch request.
+                Set to 0 or 1 to disable batching.
+            :param stream_results: A flag that determines if paginated results are written to disk page by page as they arrive,
+                instead of being collected in memory first. The result files are the same either way.
+            :param results_format: The format of the result files. `ResultsFormat.COMPACT` writes smaller, unsorted JSON
+                with a native encoder when one is installed. Defaults to `ResultsFormat.PRETTY`, the indented format.
+            :param resume: A flag that determines if the scan continues a previous, interrupted scan of the account:
+                the previous results are kept, and the calls that the scan journal records as completed are skipped.
+            :param refresh: A flag that determines if the scan refreshes the results of previous scans of the account:
+                only the results that are older than the `Ttl` (in seconds) of their command in the commands YAML are fetched again,
+                as well as the results of commands whose inputs were changed by the refresh. Commands without a `Ttl` are always fetched again.
+            :param writer_processes: The number of processes that encode and write the results, so that the CPU work of saving
+                the results is spread over the cores, instead of running in the threads that fetch them. 0 (the default) writes the results
+                in the fetching threads. Results that are streamed to disk (stream_results) are always written by the fetching threads.
+            :param metrics_interval: How often (in seconds) the metrics of the calls are exported to metrics.json and metrics.prom
+                in the account-data directory during the scan, for long scans. 0 (the default) exports them only at the end of the scan.
+            :param command_timeout: How long (in seconds) a single scan command may run. Once it passes, the command stops issuing calls
+                and fetching pages, and saves the results it has, which the scan reports as cut off. None (the default) for no limit.
+            :param scan_timeout: How long (in seconds) the scan (of every account) may run. Once it passes, the scan stops issuing calls
+                and fetching pages, and saves the results it has, which it reports as cut off. None (the default) for no limit.
         """
-        super().__init__(CloudProvider.GCP, account_name, should_clean_before_scan, output_path, commands_path)
+        super().__init__(CloudProvider.GCP, account_name, should_clean_before_scan, output_path, commands_path,
+                         stream_results, results_format, resume, refresh, writer_processes, metrics_interval, command_timeout, scan_timeout)
         self.project_id: str = project_id
+        self.batch_size: int = batch_size
+
+
+class GcpOrganizationScanSettings(GcpCloudScanSettings):
+    def __init__(self,
+                 commands_path: str,
+                 project_ids: Optional[List[str]] = None,
+                 parent: Optional[str] = None,
+                 max_parallel_projects: int = 10,
+                 **kwargs):
+        """
+        The settings that the GcpOrganizationScanner uses for scanning many gcp projects together.
+
+            :param commands_path: The path of a YAML file that describes the scan commands to be used.
+            :param project_ids: The projects to scan.
+            :param parent: The organization (`organizations/<ID>`) or folder (`folders/<ID>`) whose projects are scanned,
+                including the projects of its sub folders. Used only if no project_ids are given.
+                If neither is given, all the active projects that the credentials can access are scanned.
+            :param max_parallel_projects: The maximum number of projects that are scanned at the same time.
+            :param kwargs: The settings of the scan of every project, as in GcpCloudScanSettings
+                (except project_id and account_name, which is the project ID).
+        """
+        super().__init__(commands_path=commands_path, account_name='', project_id='', **kwargs)
+        self.project_ids: List[str] = project_ids or []
+        self.parent: Optional[str] = parent
+        self.max_parallel_projects: int = max(max_parallel_projects, 1)
+
+    def get_project_settings(self, project_id: str) -> GcpCloudScanSettings:
+        project_settings = copy.copy(self)
+        project_settings.project_id = project_id
+        project_settings.account_name = project_id
+        return project_settings
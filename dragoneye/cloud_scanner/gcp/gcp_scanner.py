@@ -1,118 +1,270 @@
-import collections
 import itertools
 import json
 import os
-from functools import lru_cache
-from typing import List, Deque, Optional
-from googleapiclient.discovery import build
+from typing import Hashable, List, Optional, Union
 from googleapiclient.errors import HttpError
 
 from dragoneye.cloud_scanner.base_cloud_scanner import BaseCloudScanner
+from dragoneye.cloud_scanner.scan_plan import FanOutFactor
 from dragoneye.cloud_scanner.gcp.gcp_scan_settings import GcpCloudScanSettings
+from dragoneye.cloud_scanner.gcp.gcp_service_pool import GcpServicePool
 from dragoneye.config import config
-from dragoneye.utils.misc_utils import elapsed_time, init_directory, custom_serializer, get_dynamic_values_from_files
-from dragoneye.utils.threading_utils import ThreadedFunctionData, execute_parallel_functions_in_threads
+from dragoneye.utils.misc_utils import elapsed_time
+from dragoneye.utils.threading_utils import ThreadedFunctionData, TaskScheduler, TaskFanOut
 from dragoneye.utils.app_logger import logger
+from dragoneye.utils.concurrency_limiter import AdaptiveConcurrencyLimiters
+from dragoneye.utils.deadline import Deadline
+from dragoneye.utils.json_stream_writer import JsonStreamWriter, JsonItemsSpool, new_items_sink
+from dragoneye.utils.scan_metrics import CallLabels, CallMeasurement, ScanMetrics
+
+THROTTLING_REASONS = ['rateLimitExceeded', 'userRateLimitExceeded']
 
 
 class GcpScanner(BaseCloudScanner):
-    def __init__(self, credentials, settings: GcpCloudScanSettings):
-        super().__init__(settings)
+    def __init__(self, credentials, settings: GcpCloudScanSettings,
+                 concurrency_limiters: Optional[AdaptiveConcurrencyLimiters] = None, service_pool: Optional[GcpServicePool] = None,
+                 metrics: Optional[ScanMetrics] = None):
+        """
+        :param concurrency_limiters: The concurrency limiters of the scheduler that runs the scan, when it is shared with other scans.
+        :param service_pool: The pool of services of the scan, when it is shared with other scans. The scan closes only a pool of its own.
+        :param metrics: The metrics of the calls of the scan, when they are shared with other scans.
+        """
+        super().__init__(settings, metrics)
         self.credentials = credentials
-        self.services: list = []
         self.project_id = settings.project_id
+        self.service_pool = service_pool or GcpServicePool(credentials)
+        self._owns_service_pool = service_pool is None
+        self.concurrency_limiters = concurrency_limiters or \
+            AdaptiveConcurrencyLimiters(config.get('INITIAL_CONCURRENCY_PER_ENDPOINT'), config.get('MAX_WORKERS'))
 
     @elapsed_time('Scanning GCP live environment took {} seconds')
     def scan(self) -> str:
-        self.account_data_dir = init_directory(self.settings.output_path, self.settings.account_name, self.settings.clean)
-
-        dependent_commands, independent_commands = self._get_scan_commands()
-
-        non_dependable_tasks: List[ThreadedFunctionData] = []
-        dependable_tasks: List[ThreadedFunctionData] = []
-        deque_tasks: Deque[List[ThreadedFunctionData]] = collections.deque()
-
-        for independent_command in independent_commands:
-            non_dependable_tasks.append(ThreadedFunctionData(
-                self._execute_scan_commands,
-                (independent_command,),
-                'exception on command {}'.format(independent_command)))
-
-        deque_tasks.append(non_dependable_tasks)
-
-        for dependent_command in dependent_commands:
-            dependable_tasks.append(ThreadedFunctionData(
-                self._execute_scan_commands,
-                (dependent_command,),
-                'exception on command {}'.format(dependent_command)))
-
-        for dependable_task in dependable_tasks:
-            deque_tasks.append([dependable_task])
-        execute_parallel_functions_in_threads(deque_tasks, config.get('MAX_WORKERS'))
-
-        self._print_summary()
-
-        for service in self.services:
-            service.close()
+        scheduler = TaskScheduler(config.get('MAX_WORKERS'), self.concurrency_limiters)
+        self.prepare_scan(scheduler)
+        with self.metrics.exporting(os.path.join(self.account_data_dir, '..'), self.settings.metrics_interval):
+            scheduler.run()
+            self.finish_scan()
+        self.concurrency_limiters.log_limits()
 
         return os.path.abspath(os.path.join(self.account_data_dir, '..'))
 
-    def _execute_scan_commands(self, scan_command: dict) -> None:
+    def prepare_scan(self, scheduler: TaskScheduler, task_key_prefix: tuple = ()) -> List[Hashable]:
+        """
+        Creates the directory of the project, and adds the scan commands to the scheduler,
+        which may be shared with the scans of other projects.
+        The scan is complete once all the added tasks are done, and finish_scan was called.
+
+        :param task_key_prefix: A prefix to the keys of the added tasks, that distinguishes them from the tasks of other scans.
+        :return: The keys of the added tasks.
+        """
+        self._init_account_data_dir()
+
+        scan_commands = self._get_scan_commands()
+        dependencies = self._get_commands_dependencies(scan_commands)
+        self.result_store = self._create_result_store(scan_commands)
+
+        task_keys = []
+        for index, scan_command in enumerate(scan_commands):
+            task_key = (*task_key_prefix, index)
+            scheduler.add_task(task_key,
+                               ThreadedFunctionData(
+                                   self._execute_scan_commands,
+                                   (scan_command,),
+                                   'exception on command {}'.format(scan_command)),
+                               [(*task_key_prefix, dependency) for dependency in dependencies[index]],
+                               group=task_key_prefix)
+            task_keys.append(task_key)
+        return task_keys
+
+    def finish_scan(self, report_directory: Optional[str] = None) -> None:
+        """
+        Summarizes the scan, and closes its journal and its services.
+        :param report_directory: The directory to write the failures report to. Defaults to the parent directory of the project.
+        """
+        self.result_writer.wait()
+        self.journal.close()
+        self._print_summary(report_directory)
+        if self._owns_service_pool:
+            self.service_pool.close()
+
+    def _execute_scan_commands(self, scan_command: dict) -> Optional[TaskFanOut]:
         service_name = scan_command['ServiceName']
         api_version = scan_command['ApiVersion']
         resource_types = scan_command['ResourceType']
         resource_types: List[str] = [resource_types] if isinstance(resource_types, str) else resource_types
         method = scan_command['Method']
-        output_file = scan_command.get('OutputFile')
-        output_file = os.path.join(self.account_data_dir, f'{output_file}.json') if output_file else \
-                      os.path.join(self.account_data_dir, f'{service_name}-{api_version}-{"_".join(resource_types)}-{method}.json')
-        if os.path.isfile(output_file):
-            # Data already scanned, so skip
-            logger.warning('Response already present at {}'.format(output_file))
-            return
-
-        service = self._create_service(service_name, api_version)
-        resource_response = getattr(service, resource_types[0])()
-        for resource_type in resource_types[1:]:
-            resource_response = getattr(resource_response, resource_type)()
+        output_file = os.path.join(self.account_data_dir, self._get_command_output_name(scan_command))
+        if self._is_completed(output_file, self._get_refresh_ttl(scan_command, self.account_data_dir)):
+            return None
 
         all_parameters = self._get_parameters(scan_command, self.account_data_dir)
-        all_items = []
-        all_call_summary = []
         call_summary = {
             "service": service_name,
             "api_version": api_version,
             "resource_type": resource_types,
             'method': method
         }
-
-        if all_parameters is not None:
-            for parameters in all_parameters:
-                updated_call_summary = call_summary.copy()
-                updated_call_summary['parameters'] = parameters
-                all_items.extend(self._get_results(updated_call_summary, resource_response))
-                all_call_summary.append(updated_call_summary)
-        else:
+        all_call_summary = []
+        for parameters in all_parameters if all_parameters is not None else [{}]:
             updated_call_summary = call_summary.copy()
-            updated_call_summary['parameters'] = {}
-            all_items.extend(self._get_results(updated_call_summary, resource_response))
+            updated_call_summary['parameters'] = parameters
             all_call_summary.append(updated_call_summary)
 
-        with open(output_file, "w") as file:
-            json.dump({'value': all_items}, file, indent=4, default=custom_serializer)
+        deadline = self._get_command_deadline()
+        tasks: List[ThreadedFunctionData] = []
+        if self._is_batchable(method) and len(all_call_summary) > 1:
+            batch_size = self.settings.batch_size
+            for index in range(0, len(all_call_summary), batch_size):
+                tasks.append(ThreadedFunctionData(self._get_batch_results,
+                                                  (all_call_summary[index:index + batch_size], deadline),
+                                                  'exception on command {}'.format(scan_command),
+                                                  concurrency_key=self._get_endpoint_key(service_name)))
+        else:
+            for updated_call_summary in all_call_summary:
+                tasks.append(ThreadedFunctionData(self._get_call_results,
+                                                  (updated_call_summary, deadline),
+                                                  'exception on command {}'.format(scan_command),
+                                                  concurrency_key=self._get_endpoint_key(service_name)))
+
+        labels = self._get_labels(call_summary)
+        # The results of all the calls of the command are written together, so a failure to write them is of the command as a whole
+        command_summary = {**call_summary, 'parameters': {}}
+        return TaskFanOut(tasks, lambda tasks_items: self._save_command_results(tasks_items, all_call_summary, command_summary, output_file,
+                                                                                labels))
+
+    def _save_command_results(self, tasks_items: List[Union[List[dict], JsonItemsSpool, None]], all_call_summary: List[dict],
+                              command_summary: dict, output_file: str, labels: CallLabels) -> None:
+        # Partial results of calls that a deadline cut off are saved, but not recorded in the journal, so resuming the scan calls them again.
+        # So are the results of a command whose task has failed as a whole (its items are None), such as a batch whose request has failed
+        record = not any(x in call_summary for call_summary in all_call_summary for x in ('error', 'exception', 'cut_off')) \
+            and not any(task_items is None for task_items in tasks_items)
+        if any(task_items is None for task_items in tasks_items):
+            logger.error(f'Results of {self._get_call_representation(all_call_summary[0])} are missing the results of failed requests, '
+                         f'so they are saved to {output_file} but not recorded as completed')
+        if self.settings.stream_results:
+            writer = JsonStreamWriter(output_file, results_format=self.settings.results_format)
+            writer.extend('value', [])
+            for spool in tasks_items:
+                if spool is not None:
+                    writer.extend_from_spool('value', spool)
+                    spool.close()
+            writer.close()
+            if record:
+                self.journal.record(output_file)
+            self._record_result_size(labels, output_file)
+        else:
+            results = {'value': [item for task_items in tasks_items if task_items for item in task_items]}
+
+            def on_written(sha256: str) -> None:
+                if record:
+                    self.journal.record(output_file, sha256=sha256)
+                self._record_result_size(labels, output_file)
+
+            self._write_result(results, output_file, labels, self._get_call_representation(command_summary),
+                               lambda ex: {**command_summary, 'exception': ex}, on_written)
+            self.result_store.publish(output_file, results, self.account_data_dir)
 
         for call_summary in all_call_summary:
-            self.summary.put_nowait(call_summary)
             if any(x in call_summary for x in ('error', 'exception')):
                 logger.error(self._parse_error(call_summary))
+            elif 'cut_off' in call_summary:
+                logger.warning(f'{self._get_call_representation(call_summary)} was cut off by the {call_summary["cut_off"]}, '
+                               f'its partial results were saved to {output_file}')
             else:
                 logger.info(f'Results from {self._get_call_representation(call_summary)} were saved to {output_file}')
 
-    @lru_cache(maxsize=None)
+    def _is_batchable(self, method_name: str) -> bool:
+        # List methods are paginated, which cannot be done within a batch request
+        return self.settings.batch_size > 1 and 'list' not in method_name.lower()
+
+    def _get_resource(self, call_summary: dict):
+        service = self._create_service(call_summary['service'], call_summary['api_version'])
+        resource_response = getattr(service, call_summary['resource_type'][0])()
+        for resource_type in call_summary['resource_type'][1:]:
+            resource_response = getattr(resource_response, resource_type)()
+        return resource_response
+
+    def _get_call_results(self, call_summary: dict, deadline: Optional[Deadline] = None) -> Union[List[dict], JsonItemsSpool]:
+        all_items = new_items_sink(self.settings.stream_results, results_format=self.settings.results_format)
+        if self._is_call_cut_off(call_summary, deadline):
+            return all_items
+        return self._get_results(call_summary, self._get_resource(call_summary), all_items, deadline)
+
+    def _get_batch_results(self, call_summaries: List[dict], deadline: Optional[Deadline] = None) -> Union[List[dict], JsonItemsSpool]:
+        """
+        Executes the calls of several parameter sets of a non-list method in a single batch request.
+        """
+        cut_off = deadline.get_cut_off_reason() if deadline is not None else None
+        if cut_off is not None:
+            # None of the calls of the batch is sent, so each of them is recorded as cut off
+            for call_summary in call_summaries:
+                self._record_cut_off_call(call_summary, cut_off)
+            return new_items_sink(self.settings.stream_results, results_format=self.settings.results_format)
+        results: List[List[dict]] = [[] for _ in call_summaries]
+        paginated_indexes: List[int] = []
+        resource_response = self._get_resource(call_summaries[0])
+        method_name = call_summaries[0]['method']
+
+        def on_response(request_id: str, response, exception) -> None:
+            index = int(request_id)
+            if exception is not None:
+                measurement.failed = True
+                measurement.throttled |= self._set_call_error(call_summaries[index], exception)
+            elif 'nextPageToken' in response:
+                paginated_indexes.append(index)
+            elif response:
+                results[index].append(response)
+
+        batch = self._create_service(call_summaries[0]['service'], call_summaries[0]['api_version']) \
+            .new_batch_http_request(callback=on_response)
+        for index, call_summary in enumerate(call_summaries):
+            logger.info(f'Invoking {self._get_call_representation(call_summary)} (batched)')
+            try:
+                request = getattr(resource_response, method_name)(**call_summary['parameters'])
+                if request is not None:
+                    batch.add(request, request_id=str(index))
+            except Exception as ex:
+                self._set_call_error(call_summary, ex)
+        # The batch is a single request, so it is measured as a single call
+        labels = self._get_labels(call_summaries[0])
+        with self.metrics.measure_call(labels) as measurement:
+            try:
+                batch.execute()
+            except Exception as ex:
+                # The whole batch request has failed, so every call in it that has no result of its own has failed with it
+                measurement.failed = True
+                for call_summary in call_summaries:
+                    if not any(x in call_summary for x in ('error', 'exception')):
+                        measurement.throttled |= self._set_call_error(call_summary, ex)
+            measurement.pages = 1
+
+        # Every call of the batch is logged with an even share of its duration. Paginated calls are logged once their pages are fetched
+        for index, call_summary in enumerate(call_summaries):
+            if index not in paginated_indexes:
+                self._record_call(labels, call_summary, CallMeasurement(pages=1, duration=measurement.duration / len(call_summaries)))
+        for index in paginated_indexes:
+            results[index] = self._get_results(call_summaries[index], resource_response, deadline=deadline)
+
+        all_items = new_items_sink(self.settings.stream_results, results_format=self.settings.results_format)
+        for call_results in results:
+            all_items.extend(call_results)
+        return all_items
+
+    @staticmethod
+    def _get_command_output_name(scan_command: dict) -> str:
+        output_file = scan_command.get('OutputFile')
+        if output_file:
+            return f'{output_file}.json'
+        resource_types = scan_command['ResourceType']
+        resource_types: List[str] = [resource_types] if isinstance(resource_types, str) else resource_types
+        return f'{scan_command["ServiceName"]}-{scan_command["ApiVersion"]}-{"_".join(resource_types)}-{scan_command["Method"]}.json'
+
     def _create_service(self, service_name: str, version: str):
-        service = build(service_name, version, credentials=self.credentials)
-        self.services.append(service)
-        return service
+        return self.service_pool.get_service(service_name, version)
+
+    def _get_endpoint_key(self, service_name: str) -> str:
+        # The concurrency limiters may be shared by the scans of several projects, whose quotas are separate
+        return f'{self.project_id}/{service_name}'
 
     def _get_parameters(self, scan_command: dict, account_data_dir: str) -> Optional[List[dict]]:
         if not scan_command.get('Parameters'):
@@ -126,7 +278,7 @@ class GcpScanner(BaseCloudScanner):
         for parameter in scan_command.get('Parameters', []):
             param_names = parameter['Name']
             param_dynamic_value = parameter['Value']
-            param_real_values = get_dynamic_values_from_files(param_dynamic_value, account_data_dir)
+            param_real_values = self.result_store.get_dynamic_values(param_dynamic_value, account_data_dir)
             # Multiple parameters from same object
             if ' ' in param_names:
                 for param_real_value in param_real_values:
@@ -166,8 +318,56 @@ class GcpScanner(BaseCloudScanner):
         else:
             return multi_params or single_param_product
 
-    def _get_results(self, call_summary: dict, resource_response):
-        all_items = []
+    def _get_fan_out(self, scan_command: dict, scope: str, directory: str) -> Optional[List[FanOutFactor]]:
+        # Follows _get_parameters: the values of the parameters that are read together (with several names) are zipped with each other,
+        # and the product of the values of the single parameters (itertools.product) is made for each of them
+        factors = []
+        multi_param_factor = None
+        for parameter in scan_command.get('Parameters', []):
+            param_names = parameter['Name']
+            param_dynamic_value = parameter['Value']
+            if ' ' in param_names:
+                if multi_param_factor is None:
+                    multi_param_factor = FanOutFactor(tuple(param_names.split(' ')), self._count_previous_values(param_dynamic_value, directory))
+                    factors.append(multi_param_factor)
+                else:
+                    multi_param_factor.parameters += tuple(param_names.split(' '))
+            elif '$project' not in param_dynamic_value:
+                factors.append(FanOutFactor((param_names,), self._count_previous_values(param_dynamic_value, directory)))
+        return factors
+
+    def _get_results(self, call_summary: dict, resource_response, all_items: Union[list, JsonItemsSpool, None] = None,
+                     deadline: Optional[Deadline] = None):
+        all_items = [] if all_items is None else all_items
+        labels = self._get_labels(call_summary)
+        with self.metrics.measure_call(labels) as measurement:
+            self._fetch_results(call_summary, resource_response, all_items, measurement, deadline)
+        self._record_call(labels, call_summary, measurement)
+        return all_items
+
+    def _is_call_cut_off(self, call_summary: dict, deadline: Optional[Deadline]) -> bool:
+        """
+        Checks whether the deadline cuts off the call before it starts, and records the call as cut off if it does.
+        """
+        cut_off = deadline.get_cut_off_reason() if deadline is not None else None
+        if cut_off is None:
+            return False
+        self._record_cut_off_call(call_summary, cut_off)
+        return True
+
+    def _record_cut_off_call(self, call_summary: dict, cut_off: str) -> None:
+        call_summary['cut_off'] = cut_off
+        self._cut_off_call(self._get_labels(call_summary), self._get_call_representation(call_summary), cut_off)
+
+    def _record_call(self, labels: CallLabels, call_summary: dict, measurement: CallMeasurement) -> None:
+        failed = any(x in call_summary for x in ('error', 'exception'))
+        self.run_log.record_call(labels, self._get_call_representation(call_summary), measurement, failure=call_summary if failed else None)
+
+    def _fetch_results(self, call_summary: dict, resource_response, all_items: Union[list, JsonItemsSpool], measurement: CallMeasurement,
+                       deadline: Optional[Deadline] = None) -> None:
+        """
+        Fetches all the pages of the call. Once the deadline has passed, no more pages are fetched, and the call is marked as cut off.
+        """
         try:
             logger.info(f'Invoking {self._get_call_representation(call_summary)}')
             method_name = call_summary['method']
@@ -177,6 +377,7 @@ class GcpScanner(BaseCloudScanner):
 
             while request is not None:
                 response = request.execute()
+                measurement.pages += 1
                 if 'list' in method_name or 'nextPageToken' in response:
                     for values in response.values():
                         if isinstance(values, list):
@@ -188,16 +389,40 @@ class GcpScanner(BaseCloudScanner):
                         request = next_method(previous_request=request, previous_response=response)
                     else:
                         request = None
+                    if request is not None and deadline is not None:
+                        measurement.cut_off = deadline.get_cut_off_reason()
+                        if measurement.cut_off is not None:
+                            call_summary['cut_off'] = measurement.cut_off
+                            break
                 else:
                     if response:
                         all_items.append(response)
                     break
-        except HttpError as ex:
-            call_summary['error'] = json.loads(ex.content.decode('utf-8'))['error']
         except Exception as ex:
+            measurement.failed = True
+            measurement.throttled = self._set_call_error(call_summary, ex)
+
+    def _set_call_error(self, call_summary: dict, ex: Exception) -> bool:
+        """
+        Sets the error of the call in its summary. Returns whether the call was throttled.
+        """
+        if isinstance(ex, HttpError):
+            call_summary['error'] = json.loads(ex.content.decode('utf-8'))['error']
+            if self._is_throttling_error(ex, call_summary['error']):
+                self.concurrency_limiters.on_throttled(self._get_endpoint_key(call_summary['service']))
+                return True
+        else:
             call_summary['exception'] = str(ex)
+        return False
 
-        return all_items
+    def _get_labels(self, call_summary: dict) -> CallLabels:
+        return self._get_call_labels(call_summary['service'], '.'.join([*call_summary['resource_type'], call_summary['method']]))
+
+    @staticmethod
+    def _is_throttling_error(ex: HttpError, error: dict) -> bool:
+        if getattr(ex.resp, 'status', None) == 429:
+            return True
+        return any(details.get('reason') in THROTTLING_REASONS for details in error.get('errors', []) if isinstance(details, dict))
 
     @staticmethod
     def _get_call_representation(call_summary: dict) -> str:
@@ -0,0 +1,36 @@
+import threading
+from typing import Dict, List, Tuple
+
+from googleapiclient.discovery import build
+
+
+class GcpServicePool:
+    """
+    Builds each googleapiclient service once per (service, version) and thread, and shares it between the scans that use the pool.
+
+    Service objects (and their HTTP connections) are not thread safe, so every worker thread gets its own.
+    They are not bound to a project, so the scans of many projects with the same credentials can share them.
+    """
+
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self._thread_local = threading.local()
+        self._services: List[object] = []
+        self._lock = threading.Lock()
+
+    def get_service(self, service_name: str, version: str):
+        services: Dict[Tuple[str, str], object] = self._thread_local.__dict__.setdefault('services', {})
+        if (service_name, version) not in services:
+            service = build(service_name, version, credentials=self.credentials)
+            services[(service_name, version)] = service
+            with self._lock:
+                self._services.append(service)
+        return services[(service_name, version)]
+
+    def close(self) -> None:
+        with self._lock:
+            services = self._services
+            self._services = []
+        self._thread_local = threading.local()
+        for service in services:
+            service.close()
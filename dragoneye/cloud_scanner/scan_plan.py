@@ -0,0 +1,170 @@
+import functools
+import operator
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+# The estimated calls of a single command in a single region (or scope) from which its cartesian fan-out is reported
+FAN_OUT_WARNING = 1000
+
+
+@dataclass
+class FanOutFactor:
+    """
+    Parameters of a command whose values multiply the calls of the command.
+    """
+    parameters: Tuple[str, ...]
+    # The number of values of the parameters in the results of the previous scan, or None if the previous scan has no results to count
+    values: Optional[int]
+
+
+@dataclass
+class CommandPlan:
+    index: int
+    name: str
+    dependencies: List[int]
+    # The factors of the calls of the command in every scope (a region, or 'global') that the command runs in
+    fan_out: Dict[str, List[FanOutFactor]] = field(default_factory=dict)
+
+    def get_calls(self, scope: str) -> Optional[int]:
+        """
+        Returns the estimated calls of the command in the scope: the product of its factors, or None if one of them is unknown.
+        """
+        values = [factor.values for factor in self.fan_out[scope]]
+        if any(value is None for value in values):
+            return None
+        return functools.reduce(operator.mul, values, 1)
+
+    @property
+    def calls(self) -> Optional[int]:
+        calls = [self.get_calls(scope) for scope in self.fan_out]
+        if any(scope_calls is None for scope_calls in calls):
+            return None
+        return sum(calls)
+
+    @property
+    def max_scope_calls(self) -> Optional[int]:
+        """
+        The most estimated calls of the command in a single scope, of the scopes whose calls are known.
+        """
+        calls = [self.get_calls(scope) for scope in self.fan_out]
+        return max((scope_calls for scope_calls in calls if scope_calls is not None), default=None)
+
+
+class ScanPlan:
+    """
+    The plan of a scan, compiled from its scan commands without calling the cloud provider: the dependency graph of the commands,
+    the tasks of every scope (a region for AWS, or 'global'), and the calls every command is estimated to make.
+    The calls are estimated from the results of the previous scan of the account, so the estimates of a first scan are unknown.
+    """
+
+    def __init__(self, scopes: List[str], commands: List[CommandPlan], fan_out_warning: int = FAN_OUT_WARNING):
+        self.scopes: List[str] = scopes
+        self.commands: List[CommandPlan] = commands
+        self.fan_out_warning: int = fan_out_warning
+
+    def get_scope_tasks(self) -> Dict[str, dict]:
+        """
+        Returns the number of tasks (commands) that run in every scope, and the calls they are estimated to make.
+        """
+        scope_tasks = {}
+        for scope in self.scopes:
+            commands = [command for command in self.commands if scope in command.fan_out]
+            calls = [command.get_calls(scope) for command in commands]
+            scope_tasks[scope] = {'tasks': len(commands), 'calls': None if None in calls else sum(calls)}
+        return scope_tasks
+
+    def get_critical_path(self) -> List[int]:
+        """
+        Returns the chain of dependent commands with the most estimated calls in a single scope, which bounds the duration of the scan
+        no matter how many workers it has. A command whose calls are unknown in all its scopes counts as a single call.
+        """
+        commands = {command.index: command for command in self.commands}
+        # The scheduler runs a cycle of dependencies without waiting for all of it, so the dependencies that close a cycle are dropped
+        acyclic_dependencies: Dict[int, List[int]] = {}
+
+        def drop_cycles(index: int, visiting: Set[int]) -> None:
+            if index in acyclic_dependencies:
+                return
+            acyclic_dependencies[index] = []
+            visiting.add(index)
+            for dependency in commands[index].dependencies:
+                if dependency in commands and dependency not in visiting:
+                    drop_cycles(dependency, visiting)
+                    acyclic_dependencies[index].append(dependency)
+            visiting.discard(index)
+
+        longest_paths: Dict[int, Tuple[int, List[int]]] = {}
+
+        def get_longest_path(index: int) -> Tuple[int, List[int]]:
+            if index not in longest_paths:
+                weight = commands[index].max_scope_calls
+                dependency_weight, dependency_path = max((get_longest_path(dependency) for dependency in acyclic_dependencies[index]),
+                                                         key=lambda path: path[0], default=(0, []))
+                longest_paths[index] = ((1 if weight is None else weight) + dependency_weight, dependency_path + [index])
+            return longest_paths[index]
+
+        for index in commands:
+            drop_cycles(index, set())
+        paths = [get_longest_path(command.index) for command in self.commands if command.fan_out]
+        return max(paths, key=lambda path: path[0], default=(0, []))[1]
+
+    def get_warnings(self) -> List[str]:
+        """
+        Returns warnings of the commands whose calls are the cartesian product of the values of several parameters,
+        when their estimated calls in a scope reach the fan out warning, or when they are unknown.
+        """
+        warnings = []
+        for command in self.commands:
+            # The parameters of a command are the same in all its scopes, only the number of their values differs
+            if len(next(iter(command.fan_out.values()), [])) < 2:
+                continue
+            scope_calls = [(command.get_calls(scope), scope) for scope in command.fan_out if command.get_calls(scope) is not None]
+            if not scope_calls:
+                product = _format_product(next(iter(command.fan_out.values())))
+                warnings.append(f'{command.name} makes a call for every combination of {product}, '
+                                f'which cannot be estimated without the results of a previous scan')
+                continue
+            calls, scope = max(scope_calls)
+            if calls >= self.fan_out_warning:
+                warnings.append(f'{command.name} makes {calls} calls in {scope}, '
+                                f'one for every combination of {_format_product(command.fan_out[scope])}')
+        return warnings
+
+    def to_dict(self) -> dict:
+        return {
+            'commands': [{**asdict(command), 'calls': command.calls} for command in self.commands],
+            'scopes': self.get_scope_tasks(),
+            'critical_path': [self.commands[index].name for index in self.get_critical_path()],
+            'warnings': self.get_warnings(),
+        }
+
+    def format(self) -> str:
+        """
+        Returns a readable description of the plan.
+        """
+        lines = ['Commands (and the commands they depend on):']
+        for command in self.commands:
+            dependencies = ', '.join(self.commands[dependency].name for dependency in command.dependencies)
+            lines.append(f'  [{command.index}] {command.name}: {_format_calls(command.calls)} calls in {len(command.fan_out)} scopes'
+                         + (f' <- {dependencies}' if dependencies else ''))
+
+        lines.append('Tasks per scope:')
+        for scope, scope_tasks in self.get_scope_tasks().items():
+            lines.append(f'  {scope}: {scope_tasks["tasks"]} tasks, {_format_calls(scope_tasks["calls"])} calls')
+
+        lines.append('Critical path:')
+        lines.append('  ' + ' -> '.join(self.commands[index].name for index in self.get_critical_path()))
+
+        warnings = self.get_warnings()
+        if warnings:
+            lines.append('Warnings:')
+            lines.extend(f'  {warning}' for warning in warnings)
+        return '\n'.join(lines)
+
+
+def _format_product(factors: List[FanOutFactor]) -> str:
+    return ' x '.join(f'{"/".join(factor.parameters)} ({_format_calls(factor.values)})' for factor in factors)
+
+
+def _format_calls(calls: Optional[int]) -> str:
+    return '?' if calls is None else str(calls)
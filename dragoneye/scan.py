@@ -1,19 +1,27 @@
+import json
 import os
 from typing import Optional
 
+import boto3
 import click
 from click_aliases import ClickAliasedGroup
 
+from dragoneye.cloud_scanner.base_cloud_scanner import CloudProvider
 from dragoneye.cloud_scanner.gcp.gcp_credentials_factory import GcpCredentialsFactory
-from dragoneye.cloud_scanner.gcp.gcp_scan_settings import GcpCloudScanSettings
+from dragoneye.cloud_scanner.gcp.gcp_organization_scanner import GcpOrganizationScanner
+from dragoneye.cloud_scanner.gcp.gcp_scan_settings import GcpCloudScanSettings, GcpOrganizationScanSettings
 from dragoneye.cloud_scanner.gcp.gcp_scanner import GcpScanner
 from dragoneye.version import __version__
 from dragoneye.cloud_scanner.aws.aws_scanner import AwsScanner
+from dragoneye.cloud_scanner.aws.aws_organization_scanner import AwsOrganizationScanner
 from dragoneye.cloud_scanner.aws.aws_session_factory import AwsSessionFactory
 from dragoneye.cloud_scanner.azure.azure_scanner import AzureScanner
+from dragoneye.cloud_scanner.azure.azure_tenant_scanner import AzureTenantScanner
 from dragoneye.cloud_scanner.azure.azure_authorizer import AzureAuthorizer
-from dragoneye.cloud_scanner.aws.aws_scan_settings import AwsCloudScanSettings
-from dragoneye.cloud_scanner.azure.azure_scan_settings import AzureCloudScanSettings
+from dragoneye.cloud_scanner.aws.aws_scan_settings import AwsCloudScanSettings, AwsOrganizationScanSettings
+from dragoneye.cloud_scanner.azure.azure_scan_settings import AzureCloudScanSettings, AzureTenantScanSettings
+from dragoneye.cloud_scanner.scan_plan import FAN_OUT_WARNING
+from dragoneye.utils.json_serializer import ResultsFormat
 from dragoneye.utils.value_validator import validate_uuid, validate_path
 
 
@@ -32,6 +40,70 @@ def safe_cli_entry_point():
         click.echo(ex)
 
 
+def scan_options(scanned_accounts: Optional[str] = None, command_timeout: Optional[float] = None, per_region: bool = False):
+    """
+    Adds the options of the scan settings that all the scan commands share.
+    :param scanned_accounts: What the command scans many of (e.g. 'projects'), or None if it scans a single account.
+    :param command_timeout: The default of --command-timeout.
+    :param per_region: Whether the command timeout applies to every region of a command separately.
+    """
+    if scanned_accounts:
+        resume_scope = f'the {scanned_accounts}: keep their results, and skip the calls their scan journals record as completed'
+        refresh_scope = f'the {scanned_accounts}'
+    else:
+        resume_scope = 'the account: keep its results, and skip the calls its scan journal records as completed'
+        refresh_scope = 'the account'
+    command_timeout_default = f'Defaults to {command_timeout:g} seconds' if command_timeout is not None else 'Not limited by default'
+    options = [
+        click.option('--stream-results',
+                     help='Write paginated results to disk page by page, instead of keeping whole responses in memory',
+                     is_flag=True,
+                     default=False),
+        click.option('--results-format',
+                     help='The format of the result files: indented JSON (pretty), or smaller JSON with unsorted keys (compact)',
+                     type=click.Choice([results_format.value for results_format in ResultsFormat]),
+                     default=ResultsFormat.PRETTY.value),
+        click.option('--resume',
+                     help=f'Continue an interrupted scan of {resume_scope}',
+                     is_flag=True,
+                     default=False),
+        click.option('--refresh',
+                     help=f'Refresh the results of previous scans of {refresh_scope}: fetch again only the results that are older than '
+                          'the Ttl of their command, and the results of commands whose inputs have changed',
+                     is_flag=True,
+                     default=False),
+        click.option('--writer-processes',
+                     help='The number of processes that encode and write the results, to spread the encoding over the cores of the machine. '
+                          '0 encodes and writes the results in the threads that fetch them',
+                     type=click.INT,
+                     default=0),
+        click.option('--metrics-interval',
+                     help='How often (in seconds) the metrics of the calls are exported to metrics.json and metrics.prom during the scan. '
+                          '0 exports them only at the end of the scan',
+                     type=click.FLOAT,
+                     default=0),
+        click.option('--command-timeout',
+                     help=f'How long (in seconds) a single scan command may run{" in a single region" if per_region else ""}. '
+                          'Once it passes, the command stops issuing calls '
+                          f'and saves the results it has, which are reported in cut-offs-report.json. {command_timeout_default}',
+                     type=click.FLOAT,
+                     default=command_timeout),
+        click.option('--scan-timeout',
+                     help='How long (in seconds) the scan of every account may run. Once it passes, the scan stops issuing calls '
+                          'and saves the results it has, which are reported in cut-offs-report.json. Not limited by default',
+                     type=click.FLOAT,
+                     default=None),
+    ]
+
+    def decorator(command):
+        # Applied bottom up, like stacked decorators, so the options are listed in this order
+        for option in reversed(options):
+            command = option(command)
+        return command
+
+    return decorator
+
+
 @scan_cli.command(name='gcp',
                   short_help='Scan a Google cloud provider account',
                   help='Scan a Google cloud provider account. '
@@ -59,14 +131,25 @@ def safe_cli_entry_point():
               help='The path to the `Google Application Credentials` json file. If left empty, will attempt to get the default credentials',
               type=click.STRING,
               default=None)
-def gcp(scan_commands_path: str, project_id: str, clean: bool, output_path: str, cloud_account_name: str, credentials_path: Optional[str]):
+@scan_options()
+def gcp(scan_commands_path: str, project_id: str, clean: bool, output_path: str, cloud_account_name: str, credentials_path: Optional[str],
+        stream_results: bool, results_format: str, resume: bool, refresh: bool, writer_processes: int, metrics_interval: float,
+        command_timeout: Optional[float], scan_timeout: Optional[float]):
     validate_path(scan_commands_path, f'Could not find file: {scan_commands_path}')
 
     gcp_scan_settings = GcpCloudScanSettings(commands_path=scan_commands_path,
                                              account_name=cloud_account_name,
                                              output_path=output_path,
                                              should_clean_before_scan=clean,
-                                             project_id=project_id)
+                                             project_id=project_id,
+                                             stream_results=stream_results,
+                                             results_format=results_format,
+                                             resume=resume,
+                                             refresh=refresh,
+                                             writer_processes=writer_processes,
+                                             metrics_interval=metrics_interval,
+                                             command_timeout=command_timeout,
+                                             scan_timeout=scan_timeout)
     if credentials_path:
         validate_path(credentials_path, f'Could not find file: {credentials_path}')
         credentials = GcpCredentialsFactory.from_service_account_file(credentials_path)
@@ -77,6 +160,68 @@ def gcp(scan_commands_path: str, project_id: str, clean: bool, output_path: str,
     click.echo(f'Results saved to {output_path}')
 
 
+@scan_cli.command(name='gcp-org',
+                  short_help='Scan many Google cloud provider projects, such as all the projects of an organization',
+                  help='Scan many Google cloud provider projects together with the same credentials, such as all the projects of an organization '
+                       'or a folder. The results of each project are saved under account-data/<project ID>. '
+                       '\n\nSCAN_COMMANDS_PATH: The file path to the yaml file that contains all the scan commands to run')
+@click.argument('scan-commands-path',
+                type=click.STRING)
+@click.option('--project-ids',
+              help='The IDs of the projects to scan (comma separated)',
+              type=click.STRING,
+              default='')
+@click.option('--parent',
+              help='The organization (organizations/<ID>) or folder (folders/<ID>) whose projects to scan, including the projects of its sub folders. '
+                   'If neither project IDs nor a parent are specified, all the projects that the credentials can access are scanned',
+              type=click.STRING)
+@click.option('--max-parallel-projects',
+              help='The maximum number of projects to scan at the same time',
+              type=click.INT,
+              default=10)
+@click.option('--clean',
+              help='Remove any existing data for the projects before gathering',
+              is_flag=True,
+              default=True)
+@click.option('--output-path',
+              help='The path in which the scan results will be saved on. Defaults to current working directory.',
+              type=click.STRING,
+              default=os.getcwd())
+@click.option('--credentials-path',
+              help='The path to the `Google Application Credentials` json file. If left empty, will attempt to get the default credentials',
+              type=click.STRING,
+              default=None)
+@scan_options(scanned_accounts='projects')
+def gcp_org(scan_commands_path: str, project_ids: str, parent: Optional[str], max_parallel_projects: int, clean: bool, output_path: str,
+            credentials_path: Optional[str], stream_results: bool, results_format: str, resume: bool, refresh: bool, writer_processes: int, metrics_interval: float,
+            command_timeout: Optional[float], scan_timeout: Optional[float]):
+    validate_path(scan_commands_path, f'Could not find file: {scan_commands_path}')
+
+    gcp_organization_scan_settings = GcpOrganizationScanSettings(commands_path=scan_commands_path,
+                                                                 project_ids=[project_id.strip() for project_id in project_ids.split(',')
+                                                                              if project_id.strip()],
+                                                                 parent=parent,
+                                                                 max_parallel_projects=max_parallel_projects,
+                                                                 output_path=output_path,
+                                                                 should_clean_before_scan=clean,
+                                                                 stream_results=stream_results,
+                                                                 results_format=results_format,
+                                                                 resume=resume,
+                                                                 refresh=refresh,
+                                                                 writer_processes=writer_processes,
+                                                                 metrics_interval=metrics_interval,
+                                                                 command_timeout=command_timeout,
+                                                                 scan_timeout=scan_timeout)
+    if credentials_path:
+        validate_path(credentials_path, f'Could not find file: {credentials_path}')
+        credentials = GcpCredentialsFactory.from_service_account_file(credentials_path)
+    else:
+        credentials = GcpCredentialsFactory.get_default_credentials()
+
+    output_path = GcpOrganizationScanner(credentials, gcp_organization_scan_settings).scan()
+    click.echo(f'Results saved to {output_path}')
+
+
 @scan_cli.command(name='azure',
                   short_help='Scan an Azure cloud account',
                   help='Scan an Azure cloud account. '
@@ -108,9 +253,11 @@ def gcp(scan_commands_path: str, project_id: str, clean: bool, output_path: str,
               help='The path in which the scan results will be saved on. Defaults to current working directory.',
               type=click.STRING,
               default=os.getcwd())
+@scan_options()
 def azure(cloud_account_name: str,
           subscription_id: str, client_id: str, client_secret: str, tenant_id: str,
-          scan_commands_path, clean, output_path):
+          scan_commands_path, clean, output_path, stream_results, results_format, resume, refresh, writer_processes, metrics_interval,
+          command_timeout, scan_timeout):
     validate_uuid(subscription_id, 'Invalid subscription id')
     validate_path(scan_commands_path, f'Could not find file: {scan_commands_path}')
 
@@ -119,13 +266,84 @@ def azure(cloud_account_name: str,
         account_name=cloud_account_name,
         subscription_id=subscription_id,
         should_clean_before_scan=clean,
-        output_path=output_path)
+        output_path=output_path,
+        stream_results=stream_results,
+        results_format=results_format,
+        resume=resume,
+        refresh=refresh,
+        writer_processes=writer_processes,
+        metrics_interval=metrics_interval,
+        command_timeout=command_timeout,
+        scan_timeout=scan_timeout)
 
     auth_header = AzureAuthorizer.get_authorization_token(subscription_id, tenant_id, client_id, client_secret)
     output_path = AzureScanner(auth_header, azure_scan_settings).scan()
     click.echo(f'Results saved to {output_path}')
 
 
+@scan_cli.command(name='azure-tenant',
+                  short_help='Scan many Azure subscriptions, such as all the subscriptions of a tenant',
+                  help='Scan many Azure subscriptions together with the same credentials, such as all the subscriptions of a tenant. '
+                       'The results of each subscription are saved under account-data/<subscription ID>. '
+                       '\n\nSCAN_COMMANDS_PATH: The file path to the yaml file that contains all the scan commands to run')
+@click.argument('scan-commands-path',
+                type=click.STRING)
+@click.option('--subscription-ids',
+              help='The IDs of the subscriptions to scan (comma separated). '
+                   'If not specified, all the enabled subscriptions that the credentials can access are scanned',
+              type=click.STRING,
+              default='')
+@click.option('--max-parallel-subscriptions',
+              help='The maximum number of subscriptions to scan at the same time',
+              type=click.INT,
+              default=10)
+@click.option('--tenant-id', '-t',
+              help='ID of the Azure tenant. Specify it only if you authenticate with client id/secret',
+              type=click.STRING)
+@click.option('--client-id', '-c',
+              help='The client id of an application created in Azure. If not specified, will use credentials from `az login`',
+              type=click.STRING)
+@click.option('--client-secret', '-s',
+              help='The client secret of an application created in Azure. If not specified, will use credentials from `az login`',
+              type=click.STRING)
+@click.option('--clean',
+              help='Remove any existing data for the subscriptions before gathering',
+              is_flag=True,
+              default=True)
+@click.option('--output-path',
+              help='The path in which the scan results will be saved on. Defaults to current working directory.',
+              type=click.STRING,
+              default=os.getcwd())
+@scan_options(scanned_accounts='subscriptions')
+def azure_tenant(subscription_ids: str, max_parallel_subscriptions: int, client_id: str, client_secret: str, tenant_id: str,
+                 scan_commands_path, clean, output_path, stream_results, results_format, resume, refresh, writer_processes, metrics_interval,
+                 command_timeout, scan_timeout):
+    subscription_ids = [subscription_id.strip() for subscription_id in subscription_ids.split(',') if subscription_id.strip()]
+    for subscription_id in subscription_ids:
+        validate_uuid(subscription_id, 'Invalid subscription id')
+    validate_path(scan_commands_path, f'Could not find file: {scan_commands_path}')
+
+    azure_tenant_scan_settings = AzureTenantScanSettings(
+        commands_path=scan_commands_path,
+        subscription_ids=subscription_ids,
+        max_parallel_subscriptions=max_parallel_subscriptions,
+        should_clean_before_scan=clean,
+        output_path=output_path,
+        stream_results=stream_results,
+        results_format=results_format,
+        resume=resume,
+        refresh=refresh,
+        writer_processes=writer_processes,
+        metrics_interval=metrics_interval,
+        command_timeout=command_timeout,
+        scan_timeout=scan_timeout)
+
+    # A single token is used for all the subscriptions, so the az cli is invoked (or the credentials are exchanged) only once
+    auth_header = AzureAuthorizer.get_authorization_token(subscription_ids[0] if subscription_ids else None, tenant_id, client_id, client_secret)
+    output_path = AzureTenantScanner(auth_header, azure_tenant_scan_settings).scan()
+    click.echo(f'Results saved to {output_path}')
+
+
 @scan_cli.command(name='aws',
                   short_help='Scan an AWS cloud account',
                   help='Scan an AWS cloud account. \n\nSCAN_COMMANDS_PATH: The file path to the yaml file that contains all the scan commands to run')
@@ -153,20 +371,42 @@ def azure(cloud_account_name: str,
 @click.option('--default-region',
               help='The default region for scanning universal services. Defaults to the value of the AWS_DEFAULT_REGION environment variable.',
               type=click.STRING)
+@click.option('--max-workers',
+              help='The maximum number of API calls to run in parallel, across all regions. Defaults to MAX_WORKERS from the configuration file.',
+              type=click.INT)
+@scan_options(command_timeout=600, per_region=True)
 def aws(cloud_account_name,
         profile,
         regions,
         scan_commands_path,
         clean,
         output_path,
-        default_region):
+        default_region,
+        max_workers,
+        stream_results,
+        results_format,
+        resume,
+        refresh,
+        writer_processes,
+        metrics_interval,
+        command_timeout,
+        scan_timeout):
     aws_scan_settings = AwsCloudScanSettings(
         commands_path=scan_commands_path,
         account_name=cloud_account_name,
         regions_filter=regions.split(','),
         should_clean_before_scan=clean,
         output_path=output_path,
-        default_region=default_region)
+        default_region=default_region,
+        max_workers=max_workers,
+        stream_results=stream_results,
+        results_format=results_format,
+        resume=resume,
+        refresh=refresh,
+        writer_processes=writer_processes,
+        metrics_interval=metrics_interval,
+        command_timeout=command_timeout,
+        scan_timeout=scan_timeout)
 
     validate_path(scan_commands_path, f'Could not find file: {scan_commands_path}')
     session = AwsSessionFactory.get_session(profile, default_region)
@@ -174,5 +414,159 @@ def aws(cloud_account_name,
     click.echo(f'Results saved to {output_path}')
 
 
+@scan_cli.command(name='aws-org',
+                  short_help='Scan many AWS accounts, such as all the accounts of an organization',
+                  help='Scan many AWS accounts together, such as all the accounts of an organization, '
+                       'by assuming a role in each of them. The results of each account are saved under account-data/<account ID>. '
+                       '\n\nSCAN_COMMANDS_PATH: The file path to the yaml file that contains all the scan commands to run')
+@click.argument('scan-commands-path',
+                type=click.STRING)
+@click.option('--accounts',
+              help='The accounts to scan, as account IDs or role ARNs (comma separated). '
+                   'If not specified, the accounts of the organization are discovered with organizations list-accounts',
+              type=click.STRING,
+              default='')
+@click.option('--role-name',
+              help='The name of the role to assume in accounts that are given by their account ID',
+              type=click.STRING,
+              default='OrganizationAccountAccessRole')
+@click.option('--external-id',
+              help='The external ID to assume the roles with, if they require one',
+              type=click.STRING)
+@click.option('--profile',
+              help='aws profile',
+              type=click.STRING)
+@click.option('--regions',
+              help='Filter and query AWS only for the given regions (comma separated)',
+              type=click.STRING,
+              default='')
+@click.option('--clean',
+              help='Remove any existing data for the accounts before gathering',
+              is_flag=True,
+              default=True)
+@click.option('--output-path',
+              help='The path in which the scan results will be saved on. Defaults to current working directory.',
+              type=click.STRING,
+              default=os.getcwd())
+@click.option('--default-region',
+              help='The default region for scanning universal services. Defaults to the value of the AWS_DEFAULT_REGION environment variable.',
+              type=click.STRING)
+@click.option('--max-workers',
+              help='The maximum number of API calls to run in parallel, across all accounts. Defaults to MAX_WORKERS from the configuration file.',
+              type=click.INT)
+@click.option('--max-parallel-accounts',
+              help='The maximum number of accounts to scan at the same time',
+              type=click.INT,
+              default=10)
+@scan_options(scanned_accounts='accounts', command_timeout=600, per_region=True)
+def aws_org(accounts,
+            role_name,
+            external_id,
+            profile,
+            regions,
+            scan_commands_path,
+            clean,
+            output_path,
+            default_region,
+            max_workers,
+            max_parallel_accounts,
+            stream_results,
+            results_format,
+            resume,
+            refresh,
+            writer_processes,
+            metrics_interval,
+            command_timeout,
+            scan_timeout):
+    aws_organization_scan_settings = AwsOrganizationScanSettings(
+        commands_path=scan_commands_path,
+        accounts=[account.strip() for account in accounts.split(',') if account.strip()],
+        role_name=role_name,
+        external_id=external_id,
+        max_parallel_accounts=max_parallel_accounts,
+        regions_filter=regions.split(','),
+        should_clean_before_scan=clean,
+        output_path=output_path,
+        default_region=default_region,
+        max_workers=max_workers,
+        stream_results=stream_results,
+        results_format=results_format,
+        resume=resume,
+        refresh=refresh,
+        writer_processes=writer_processes,
+        metrics_interval=metrics_interval,
+        command_timeout=command_timeout,
+        scan_timeout=scan_timeout)
+
+    validate_path(scan_commands_path, f'Could not find file: {scan_commands_path}')
+    session = AwsSessionFactory.get_session(profile, default_region)
+    output_path = AwsOrganizationScanner(session, aws_organization_scan_settings).scan()
+    click.echo(f'Results saved to {output_path}')
+
+
+@scan_cli.command(name='plan',
+                  short_help='Show what a scan would do, without scanning',
+                  help='Compile the scan commands into the plan of a scan, without calling the cloud provider: the dependencies of the commands, '
+                       'the tasks of every region (for AWS), the calls that every command is estimated to make from the results of the previous scan '
+                       'of the account, the critical path of dependent commands, and the commands whose parameters multiply into many calls. '
+                       '\n\nCLOUD_PROVIDER: The cloud provider of the scan commands'
+                       '\n\nSCAN_COMMANDS_PATH: The file path to the yaml file that contains all the scan commands to run')
+@click.argument('cloud-provider',
+                type=click.Choice([cloud_provider.value for cloud_provider in CloudProvider]))
+@click.argument('scan-commands-path',
+                type=click.STRING)
+@click.option('--cloud-account-name', '-n',
+              help='The name of the cloud account whose previous scan results the calls are estimated from, the default value is \'default\'',
+              type=click.STRING,
+              default='default')
+@click.option('--output-path',
+              help='The path in which the scan results are saved on. Defaults to current working directory.',
+              type=click.STRING,
+              default=os.getcwd())
+@click.option('--profile',
+              help='aws profile',
+              type=click.STRING)
+@click.option('--regions',
+              help='Plan AWS only for the given regions (comma separated)',
+              type=click.STRING,
+              default='')
+@click.option('--default-region',
+              help='The default region for scanning AWS universal services. Defaults to the value of the AWS_DEFAULT_REGION environment variable.',
+              type=click.STRING)
+@click.option('--fan-out-warning',
+              help='The estimated calls of a command in a single region from which a cartesian product of its parameters is reported',
+              type=click.INT,
+              default=FAN_OUT_WARNING)
+@click.option('--json', 'as_json',
+              help='Print the plan as JSON',
+              is_flag=True,
+              default=False)
+def plan(cloud_provider: str, scan_commands_path: str, cloud_account_name: str, output_path: str, profile: Optional[str], regions: str,
+         default_region: Optional[str], fan_out_warning: int, as_json: bool):
+    validate_path(scan_commands_path, f'Could not find file: {scan_commands_path}')
+
+    if cloud_provider == CloudProvider.AWS:
+        aws_scan_settings = AwsCloudScanSettings(commands_path=scan_commands_path,
+                                                 account_name=cloud_account_name,
+                                                 regions_filter=regions.split(','),
+                                                 output_path=output_path,
+                                                 default_region=default_region)
+        # The session is only used for the regions of the services, which boto knows without calling AWS
+        scanner = AwsScanner(boto3.Session(profile_name=profile, region_name=default_region), aws_scan_settings)
+    elif cloud_provider == CloudProvider.AZURE:
+        scanner = AzureScanner('', AzureCloudScanSettings(commands_path=scan_commands_path,
+                                                          subscription_id='',
+                                                          account_name=cloud_account_name,
+                                                          output_path=output_path))
+    else:
+        scanner = GcpScanner(None, GcpCloudScanSettings(commands_path=scan_commands_path,
+                                                        account_name=cloud_account_name,
+                                                        project_id='',
+                                                        output_path=output_path))
+
+    scan_plan = scanner.plan(fan_out_warning)
+    click.echo(json.dumps(scan_plan.to_dict(), indent=4) if as_json else scan_plan.format())
+
+
 if __name__ == '__main__':
     safe_cli_entry_point()
@@ -1,30 +1,110 @@
-import functools
+import threading
 import time
+from typing import Callable, Dict, Hashable
 
 from botocore.exceptions import ClientError
+from botocore.retries import standard
 
-from dragoneye.utils.app_logger import logger
-
-RATE_ERRORS = ['Throttling', 'TooManyRequestsException']
-
-
-def rate_limiter(max_attempts=3):
-    def decorator(func):
-        @functools.wraps(func)
-        def decorated(*args, **kwargs):
-            attempt = 0
-            while True:
-                try:
-                    return func(*args, **kwargs)
-                except ClientError as ex:
-                    if ex.response['Error']['Code'] not in RATE_ERRORS and ex.response['Error']['Message'] != 'Rate exceeded':
-                        raise ex  # Raise non-throttling errors
-                    attempt += 1
-                    logger.warning(f'Throttling error on operation: {ex.operation_name} on attempt #{attempt}/{max_attempts}')
-                    if attempt >= max_attempts:
-                        raise ex
-                    sleep_period = 2 ** (attempt + 2)
-                    time.sleep(sleep_period)
-
-        return decorated
-    return decorator
+# botocore's own list of the error codes that AWS services use for throttling
+_THROTTLED_CHECKER = standard.ThrottledRetryableChecker()
+
+
+def is_throttling_error(ex: Exception) -> bool:
+    if not isinstance(ex, ClientError):
+        return False
+    context = standard.RetryContext(attempt_number=1, parsed_response=ex.response)
+    return _THROTTLED_CHECKER.is_retryable(context) or ex.response.get('Error', {}).get('Message') == 'Rate exceeded'
+
+
+class TokenBucket:
+    """
+    A token bucket whose rate adapts to throttling: the rate is cut multiplicatively on every throttling response, and it recovers
+    additively while calls succeed, so it settles close to the sustained limit of the API instead of alternating between bursts and stalls.
+
+    Tokens are reserved rather than waited for: `reserve` always takes a token, and returns how long the caller should wait
+    before using it. This way callers can be queued for later instead of blocking a thread.
+    """
+
+    def __init__(self,
+                 max_rate: float,
+                 min_rate: float = 0.5,
+                 decrease_factor: float = 0.7,
+                 increase_per_second: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        :param max_rate: The initial, and the highest, rate of the bucket (tokens per second). It is also the burst size.
+        :param min_rate: The lowest rate the bucket is cut down to.
+        :param decrease_factor: The factor the rate is multiplied by on each throttling response.
+        :param increase_per_second: How much the rate grows for each second's worth of successful calls.
+        """
+        self.max_rate: float = max_rate
+        self.min_rate: float = min(min_rate, max_rate)
+        self.decrease_factor: float = decrease_factor
+        self.increase_per_second: float = increase_per_second
+        self.rate: float = max_rate
+        self.throttles: int = 0
+        self._clock = clock
+        self._tokens: float = max_rate
+        self._last_refill: float = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return 0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._refill()
+            # A successful call is 1/rate seconds worth of calls
+            self.rate = min(self.max_rate, self.rate + self.increase_per_second / self.rate)
+
+    def on_throttled(self) -> None:
+        with self._lock:
+            self._refill()
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            # The burst is what caused the throttling, so no tokens are left for another one
+            self._tokens = min(self._tokens, 0)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self._tokens + (now - self._last_refill) * self.rate, max(self.rate, 1))
+        self._last_refill = now
+
+
+class AdaptiveRateLimiters:
+    """
+    Keeps a TokenBucket per key (e.g. (service, region, operation)), which is created on first use.
+    """
+
+    def __init__(self, max_rate: float, min_rate: float = 0.5):
+        self.max_rate: float = max_rate
+        self.min_rate: float = min_rate
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def get_bucket(self, key: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.setdefault(key, TokenBucket(self.max_rate, self.min_rate))
+        return bucket
+
+    def reserve(self, key: Hashable) -> float:
+        return self.get_bucket(key).reserve()
+
+    def on_success(self, key: Hashable) -> None:
+        self.get_bucket(key).on_success()
+
+    def on_throttled(self, key: Hashable) -> None:
+        self.get_bucket(key).on_throttled()
+
+    def get_throttled_rates(self) -> Dict[Hashable, float]:
+        """
+        Returns the current rate of every key that was throttled at least once.
+        """
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {key: bucket.rate for key, bucket in buckets.items() if bucket.throttles}
@@ -0,0 +1,118 @@
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+from dragoneye.utils.app_logger import logger
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    The limit of concurrent calls to a single endpoint, adapted with AIMD (additive increase, multiplicative decrease):
+    the limit grows by one for every limit's worth of healthy calls, and is cut when the endpoint throttles.
+
+    A call is healthy if it succeeded, and its latency is not far above the usual latency of the endpoint.
+    """
+
+    def __init__(self,
+                 initial_limit: float,
+                 max_limit: float,
+                 min_limit: float = 1,
+                 decrease_factor: float = 0.5,
+                 latency_tolerance: float = 2.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        :param initial_limit: The limit the endpoint starts with.
+        :param max_limit: The highest limit the endpoint can grow to.
+        :param min_limit: The lowest limit the endpoint can be cut down to.
+        :param decrease_factor: The factor the limit is multiplied by when the endpoint throttles.
+        :param latency_tolerance: How many times longer than the average latency a call can take and still be considered healthy.
+        """
+        self.max_limit: float = max(max_limit, min_limit)
+        self.min_limit: float = min_limit
+        self.limit: float = min(max(initial_limit, min_limit), self.max_limit)
+        self.peak_limit: float = self.limit
+        self.decrease_factor: float = decrease_factor
+        self.latency_tolerance: float = latency_tolerance
+        self.in_flight: int = 0
+        self.throttles: int = 0
+        self.average_latency: Optional[float] = None
+        self._clock = clock
+        self._last_decrease: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get_available(self) -> int:
+        with self._lock:
+            return max(int(self.limit) - self.in_flight, 0)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency: Optional[float], succeeded: bool = True) -> None:
+        """
+        Releases the slot of a call. If the latency is None, the call is not taken into account (e.g. it did not reach the endpoint).
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if latency is None:
+                return
+            is_healthy = succeeded and (self.average_latency is None or latency <= self.average_latency * self.latency_tolerance)
+            self.average_latency = latency if self.average_latency is None else 0.9 * self.average_latency + 0.1 * latency
+            if is_healthy:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self.peak_limit = max(self.peak_limit, self.limit)
+
+    def on_throttled(self) -> None:
+        with self._lock:
+            self.throttles += 1
+            now = self._clock()
+            # The calls that were in flight together are throttled together, so the limit is cut once for all of them
+            if self._last_decrease is not None and now - self._last_decrease < (self.average_latency or 0):
+                return
+            self._last_decrease = now
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+
+
+class AdaptiveConcurrencyLimiters:
+    """
+    Keeps an AdaptiveConcurrencyLimit per endpoint, which is created on first use.
+    """
+
+    def __init__(self, initial_limit: float, max_limit: float):
+        self.initial_limit: float = initial_limit
+        self.max_limit: float = max_limit
+        self._limits: Dict[Hashable, AdaptiveConcurrencyLimit] = {}
+        self._lock = threading.Lock()
+
+    def get_limit(self, key: Hashable) -> AdaptiveConcurrencyLimit:
+        limit = self._limits.get(key)
+        if limit is None:
+            with self._lock:
+                limit = self._limits.setdefault(key, AdaptiveConcurrencyLimit(self.initial_limit, self.max_limit))
+        return limit
+
+    def get_available(self, key: Hashable) -> int:
+        return self.get_limit(key).get_available()
+
+    def try_acquire(self, key: Hashable) -> bool:
+        return self.get_limit(key).try_acquire()
+
+    def release(self, key: Hashable, latency: Optional[float], succeeded: bool = True) -> None:
+        self.get_limit(key).release(latency, succeeded)
+
+    def on_throttled(self, key: Hashable) -> None:
+        self.get_limit(key).on_throttled()
+
+    def get_limits(self) -> Dict[Hashable, AdaptiveConcurrencyLimit]:
+        with self._lock:
+            return dict(self._limits)
+
+    def log_limits(self) -> None:
+        """
+        Logs the limit every endpoint converged to.
+        """
+        for key, limit in sorted(self.get_limits().items(), key=lambda item: str(item[0])):
+            logger.info(f'Concurrency limit of {key}: {int(limit.limit)} (peak {int(limit.peak_limit)}, {limit.throttles} throttles)')
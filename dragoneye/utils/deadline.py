@@ -0,0 +1,50 @@
+import threading
+import time
+from typing import Callable, Optional
+
+
+class Deadline:
+    """
+    The deadline of a scan, or of a scan command, that the work under it checks cooperatively: before every call,
+    and before fetching every page of a call. Once the deadline has passed (or it was cancelled), the work stops issuing calls,
+    and keeps the results it already has.
+
+    A deadline may have a parent, such as the deadline of the scan for the deadline of a command, which cuts it off as well.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, name: str = 'scan', parent: Optional['Deadline'] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        :param timeout: How long (in seconds) from now the deadline is. None for no limit, so only cancelling the deadline cuts the work off.
+        :param name: What the deadline is of, which the reasons of its cut offs are named by.
+        """
+        self.name: str = name
+        self._parent: Optional[Deadline] = parent
+        self._clock = clock
+        self._expires_at: Optional[float] = None if timeout is None else clock() + timeout
+        self._cancelled = threading.Event()
+
+    def child(self, timeout: Optional[float], name: str) -> 'Deadline':
+        """
+        Returns a deadline in `timeout` seconds from now, which is cut off by this deadline as well.
+        """
+        return Deadline(timeout, name, self, self._clock)
+
+    def cancel(self) -> None:
+        """
+        Cuts off the work under the deadline (and under its children) before it has passed.
+        """
+        self._cancelled.set()
+
+    def get_cut_off_reason(self) -> Optional[str]:
+        """
+        Returns why the work under the deadline is cut off (e.g. 'scan deadline', or 'command deadline'), or None if it may go on.
+        """
+        reason = self._parent.get_cut_off_reason() if self._parent is not None else None
+        if reason is not None:
+            return reason
+        if self._cancelled.is_set():
+            return f'{self.name} cancellation'
+        if self._expires_at is not None and self._clock() >= self._expires_at:
+            return f'{self.name} deadline'
+        return None
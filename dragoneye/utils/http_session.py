@@ -0,0 +1,62 @@
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from dragoneye.config import config
+
+
+class HttpSession:
+    """
+    A long-lived requests session whose connections are kept alive and reused between calls.
+
+    The session is shared by all the worker threads of a scan, so its connection pool is sized to MAX_WORKERS.
+    Only the connection pool is shared between threads; no cookies or other per-call state are kept on the session.
+    """
+
+    def __init__(self, pool_size: Optional[int] = None, verify=True):
+        self.pool_size: int = pool_size or config.get('MAX_WORKERS')
+        self._session = requests.Session()
+        self._session.verify = verify
+        self._adapter = HTTPAdapter(pool_maxsize=self.pool_size)
+        self._session.mount('https://', self._adapter)
+        self._session.mount('http://', self._adapter)
+
+    def get(self, url: str, headers: dict) -> requests.Response:
+        return self._session.get(url=url, headers=headers)
+
+    def get_stats(self) -> dict:
+        """
+        Returns the amount of requests that were sent, connections that were opened, and requests that reused an open connection,
+        over the hosts that are currently held in the pool.
+        """
+        pools = self._adapter.poolmanager.pools
+        requests_count = 0
+        connections_count = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                requests_count += pool.num_requests
+                connections_count += pool.num_connections
+        return {'requests': requests_count,
+                'connections': connections_count,
+                'reused_connections': requests_count - connections_count}
+
+    def close(self) -> None:
+        self._session.close()
+
+
+_DEFAULT_SESSION: Optional[HttpSession] = None
+_DEFAULT_SESSION_LOCK = threading.Lock()
+
+
+def get_http_session() -> HttpSession:
+    """
+    Returns the HttpSession that is shared by everything that calls the cloud providers' REST APIs in this process.
+    """
+    global _DEFAULT_SESSION  # pylint: disable=global-statement
+    with _DEFAULT_SESSION_LOCK:
+        if _DEFAULT_SESSION is None:
+            _DEFAULT_SESSION = HttpSession()
+        return _DEFAULT_SESSION
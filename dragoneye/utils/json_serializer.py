@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+from enum import Enum
+from typing import Any, Union
+
+from dragoneye.utils.misc_utils import custom_serializer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ResultsFormat(str, Enum):
+    """
+    The format in which scan results are written to disk.
+
+    PRETTY: Indented JSON, identical to the files dragoneye has always written.
+    COMPACT: JSON without whitespace and with unsorted keys. It is encoded with `orjson` when it is installed.
+    """
+    PRETTY = 'pretty'
+    COMPACT = 'compact'
+
+
+PRETTY_INDENT = 4
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def _orjson_default(obj):
+        # datetime objects are serialized natively by orjson, with the same format as `datetime.isoformat`
+        if isinstance(obj, (bytes, bytearray)):
+            return obj.decode()
+        raise TypeError("Unknown type")
+
+
+def is_native_encoder_available() -> bool:
+    return orjson is not None
+
+
+def dumps(data: Any, results_format: ResultsFormat = ResultsFormat.PRETTY, sort_keys: bool = False) -> str:
+    return _dumps(data, results_format, sort_keys, as_bytes=False)
+
+
+def dump_to_file(data: Any, output_file: str, results_format: ResultsFormat = ResultsFormat.PRETTY, sort_keys: bool = False) -> str:
+    """
+    Writes the data atomically, so a partially written file is never left at `output_file`.
+    Returns the SHA-256 of the written content, so it does not have to be read again to be hashed.
+    """
+    encoded = _dumps(data, results_format, sort_keys, as_bytes=True)
+    temp_file = output_file + '.tmp'
+    with open(temp_file, "wb") as file:
+        file.write(encoded)
+    os.replace(temp_file, output_file)
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _dumps(data: Any, results_format: ResultsFormat, sort_keys: bool, as_bytes: bool) -> Union[str, bytes]:
+    if results_format == ResultsFormat.COMPACT:
+        if orjson is not None:
+            try:
+                encoded = orjson.dumps(data, default=_orjson_default, option=_ORJSON_OPTIONS)
+                return encoded if as_bytes else encoded.decode('utf-8')
+            except orjson.JSONEncodeError:
+                # orjson is stricter than the stdlib encoder (e.g. integers larger than 64 bits), so fall back to it
+                pass
+        encoded = json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=custom_serializer)
+    else:
+        encoded = json.dumps(data, indent=PRETTY_INDENT, sort_keys=sort_keys, default=custom_serializer)
+    return encoded.encode('utf-8') if as_bytes else encoded
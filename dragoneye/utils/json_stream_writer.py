@@ -0,0 +1,172 @@
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, Iterable, Union
+
+from dragoneye.utils.json_serializer import ResultsFormat, PRETTY_INDENT, dumps
+
+
+def _encode(value: Any, sort_keys: bool, results_format: ResultsFormat, level: int, indent_first_line: bool = False) -> str:
+    encoded = dumps(value, results_format, sort_keys)
+    if results_format == ResultsFormat.COMPACT:
+        return encoded
+    padding = ' ' * (PRETTY_INDENT * level)
+    encoded = encoded.replace('\n', '\n' + padding)
+    return padding + encoded if indent_first_line else encoded
+
+
+def _get_separator(results_format: ResultsFormat) -> str:
+    return ',' if results_format == ResultsFormat.COMPACT else ',\n'
+
+
+class JsonItemsSpool:
+    """
+    Keeps the items of a JSON list in a temporary file instead of in memory.
+    The items are encoded as they would appear in a list that is a value of a top level key of a JSON object of the given format.
+    """
+
+    def __init__(self, sort_keys: bool = False, results_format: ResultsFormat = ResultsFormat.PRETTY):
+        self.sort_keys: bool = sort_keys
+        self.results_format: ResultsFormat = results_format
+        self.count: int = 0
+        self._file = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+
+    def append(self, item: Any) -> None:
+        if self.count:
+            self._file.write(_get_separator(self.results_format))
+        self._file.write(_encode(item, self.sort_keys, self.results_format, 2, indent_first_line=True))
+        self.count += 1
+
+    def extend(self, items: Iterable[Any]) -> None:
+        for item in items:
+            self.append(item)
+
+    def extend_from_spool(self, spool: 'JsonItemsSpool') -> None:
+        if not spool.count:
+            return
+        if self.count:
+            self._file.write(_get_separator(self.results_format))
+        spool.copy_to(self._file)
+        self.count += spool.count
+
+    def copy_to(self, file) -> None:
+        self._file.flush()
+        self._file.seek(0)
+        shutil.copyfileobj(self._file, file)
+        self._file.seek(0, os.SEEK_END)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class JsonStreamWriter:
+    """
+    Writes a JSON object whose lists are received in parts (pages), without keeping the lists in memory.
+
+    The file is identical to `json_serializer.dumps(obj, results_format, sort_keys)` of the whole object,
+    and it is written atomically when the writer is closed, so a partially written file is never left at `output_file`.
+    Spools that are merged into the writer must have been created with the same format.
+    """
+
+    def __init__(self, output_file: str, sort_keys: bool = False, results_format: ResultsFormat = ResultsFormat.PRETTY):
+        self.output_file: str = output_file
+        self.sort_keys: bool = sort_keys
+        self.results_format: ResultsFormat = results_format
+        self.pages: int = 0
+        self._entries: Dict[str, Any] = {}
+
+    def add_page(self, page: dict) -> None:
+        """
+        Adds a page of a paginated response.
+        The first page determines the keys of the object; the lists of the following pages are appended to the lists of the first page.
+        """
+        if self.pages == 0:
+            for key, value in page.items():
+                if isinstance(value, list):
+                    self.extend(key, value)
+                else:
+                    self.set(key, value)
+        else:
+            for key, entry in self._entries.items():
+                if isinstance(entry, JsonItemsSpool):
+                    entry.extend(page.get(key, []))
+        self.pages += 1
+
+    def set(self, key: str, value: Any) -> None:
+        self.pop(key)
+        self._entries[key] = value
+
+    def __getitem__(self, key: str) -> Any:
+        """
+        Returns the value of a non-list key.
+        """
+        entry = self._entries[key]
+        if isinstance(entry, JsonItemsSpool):
+            raise KeyError(f'{key} is a list, which is not kept in memory')
+        return entry
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        entry = self._entries.pop(key, default)
+        if isinstance(entry, JsonItemsSpool):
+            entry.close()
+            return default
+        return entry
+
+    def extend(self, key: str, items: Iterable[Any]) -> None:
+        self._get_spool(key).extend(items)
+
+    def extend_from_spool(self, key: str, spool: JsonItemsSpool) -> None:
+        self._get_spool(key).extend_from_spool(spool)
+
+    def _get_spool(self, key: str) -> JsonItemsSpool:
+        entry = self._entries.get(key)
+        if not isinstance(entry, JsonItemsSpool):
+            entry = JsonItemsSpool(self.sort_keys, self.results_format)
+            self._entries[key] = entry
+        return entry
+
+    def close(self) -> None:
+        temp_file = self.output_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            self._write(file)
+        os.replace(temp_file, self.output_file)
+        self.discard()
+
+    def discard(self) -> None:
+        for key in list(self._entries):
+            self.pop(key)
+        self.pages = 0
+
+    def _write(self, file) -> None:
+        if not self._entries:
+            file.write('{}')
+            return
+
+        compact = self.results_format == ResultsFormat.COMPACT
+        newline = '' if compact else '\n'
+        padding = '' if compact else ' ' * PRETTY_INDENT
+        keys = list(self._entries) if compact or not self.sort_keys else sorted(self._entries)
+        file.write('{' + newline)
+        for index, key in enumerate(keys):
+            if index:
+                file.write(_get_separator(self.results_format))
+            file.write(f'{padding}{json.dumps(key, ensure_ascii=not compact)}:{newline and " "}')
+            entry = self._entries[key]
+            if isinstance(entry, JsonItemsSpool):
+                if entry.count:
+                    file.write('[' + newline)
+                    entry.copy_to(file)
+                    file.write(f'{newline}{padding}]')
+                else:
+                    file.write('[]')
+            else:
+                file.write(_encode(entry, self.sort_keys, self.results_format, 1))
+        file.write(newline + '}')
+
+
+def new_items_sink(stream: bool, sort_keys: bool = False, results_format: ResultsFormat = ResultsFormat.PRETTY) -> Union[list, JsonItemsSpool]:
+    """
+    Returns where the items of a response should be collected: a spool when streaming, or a plain list otherwise.
+    """
+    return JsonItemsSpool(sort_keys, results_format) if stream else []
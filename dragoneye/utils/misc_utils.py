@@ -3,10 +3,11 @@ import glob
 import json
 import logging
 import os
+import threading
 from datetime import datetime
 from functools import lru_cache
 from shutil import rmtree
-from typing import List
+from typing import List, Tuple
 
 import backoff
 import pyjq
@@ -14,6 +15,7 @@ import requests
 import yaml
 
 from dragoneye.utils.app_logger import logger
+from dragoneye.utils.http_session import get_http_session
 
 
 def elapsed_time(message=None):
@@ -55,27 +57,67 @@ def load_yaml(file_path: str) -> List[dict]:
 
 
 @backoff.on_exception(backoff.expo, requests.RequestException, 3, 600)
-def invoke_get_request(url: str, headers: dict, on_success=None, on_backoff=None, on_giveup=None):
+def invoke_get_request(url: str, headers: dict, on_success=None, on_backoff=None, on_giveup=None, http_session=None):
     logging.getLogger('backoff').disabled = True
+    http_session = http_session or get_http_session()
     on_predicate = backoff.on_predicate(backoff.expo, lambda response: response.status_code != 200,
                                         max_tries=3,
                                         max_time=600,
                                         on_success=on_success,
                                         on_backoff=on_backoff,
                                         on_giveup=on_giveup)
-    func = on_predicate(lambda _url, _headers: requests.get(url=_url, headers=_headers))
+    func = on_predicate(http_session.get)
     return func(url, headers)
 
 
+def split_dynamic_value(value: str) -> Tuple[str, str]:
+    """
+    Splits a dynamic value (`<file pattern>|<jq query>`) into its file pattern and jq query.
+    """
+    parts = value.split("|")
+    return parts[0].strip(), "|".join(parts[1:])
+
+
+class JqProgram:
+    """
+    A compiled jq program. A compiled program keeps its evaluation state, so evaluations of the same program are serialized.
+    pyjq holds the GIL while evaluating anyway, so this does not reduce parallelism.
+    """
+
+    def __init__(self, query: str):
+        self.query: str = query
+        self._script = pyjq.compile(query)
+        self._lock = threading.Lock()
+
+    def all(self, value) -> list:
+        with self._lock:
+            return self._script.all(value)
+
+
 @lru_cache(maxsize=None)
+def compile_jq(query: str) -> JqProgram:
+    """
+    Returns the compiled jq program of the query. Each unique query is compiled once, and the program is shared by all threads.
+    """
+    return JqProgram(query)
+
+
+def query_dynamic_values(query: str, result) -> list:
+    parameters = []
+    for parameter in compile_jq(query).all(result):
+        if isinstance(parameter, list):
+            parameters.extend(parameter)
+        else:
+            parameters.append(parameter)
+    return parameters
+
+
 def get_dynamic_values_from_files(value: str, directory: str) -> list:
     if '|' not in value:
         return [value]
 
-    parameter_file = value.split("|")[0]
-    parameter_file = "{}/{}".format(
-        directory, parameter_file
-    ).strip()
+    parameter_file, query = split_dynamic_value(value)
+    parameter_file = "{}/{}".format(directory, parameter_file)
 
     # Get array if a globbing pattern is used (ex. "*.json")
     parameter_files = glob.glob(parameter_file)
@@ -85,13 +127,7 @@ def get_dynamic_values_from_files(value: str, directory: str) -> list:
             continue
 
         with open(parameter_file, "r") as file:
-            parameter_values = json.load(file)
-            pyjq_parse_string = "|".join(value.split("|")[1:])
-            for parameter in pyjq.all(pyjq_parse_string, parameter_values):
-                if isinstance(parameter, list):
-                    parameters.extend(parameter)
-                else:
-                    parameters.append(parameter)
+            parameters.extend(query_dynamic_values(query, json.load(file)))
     return parameters
 
 
@@ -0,0 +1,107 @@
+import fnmatch
+import glob
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from dragoneye.utils.json_serializer import ResultsFormat, dumps
+from dragoneye.utils.misc_utils import query_dynamic_values, split_dynamic_value
+
+
+class ResultStore:
+    """
+    Keeps the parsed results of the scan commands in memory, so that the dynamic parameters of dependent commands are resolved
+    without reading and parsing the result files again. The result files remain the persistence layer: results that were not
+    published to the store (e.g. results of a previous scan, or results that were streamed to disk) are read from their files.
+
+    Query results are cached per file, but only for files that exist, so querying a file before its producer has written it
+    does not hide the values it will have later.
+    """
+
+    def __init__(self, referenced_names: Optional[Iterable[str]] = None):
+        """
+        :param referenced_names: Patterns of the names (relative to the directory dynamic values are read from) of the results
+            that dependent commands reference. Only matching results are kept in memory. If not specified, all results are kept.
+        """
+        self.referenced_names: Optional[List[str]] = None if referenced_names is None else list(referenced_names)
+        self._results: Dict[str, Any] = {}
+        self._values: Dict[Tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, file_path: str, result: Any, directory: str) -> None:
+        """
+        Publishes the result that was saved to `file_path`. `directory` is the directory that dynamic values of the result are read from.
+        """
+        if not self.is_referenced(file_path, directory):
+            return
+        file_path = os.path.abspath(file_path)
+        with self._lock:
+            self._results[file_path] = result
+            for key in [key for key in self._values if key[0] == file_path]:
+                del self._values[key]
+
+    def get_dynamic_values(self, value: str, directory: str) -> list:
+        """
+        The in-memory equivalent of `get_dynamic_values_from_files`.
+        """
+        if '|' not in value:
+            return [value]
+
+        file_pattern, query = split_dynamic_value(value)
+        parameters = []
+        for file_path in self._get_file_paths(os.path.abspath(os.path.join(directory, file_pattern))):
+            parameters.extend(self._get_values(file_path, query))
+        return parameters
+
+    def is_referenced(self, file_path: str, directory: str) -> bool:
+        """
+        Returns whether dependent commands reference the result that is saved to `file_path`, so publishing it keeps it in memory.
+        """
+        if self.referenced_names is None:
+            return True
+        name = os.path.relpath(file_path, directory).split(os.sep)[0]
+        return any(fnmatch.fnmatchcase(name, referenced_name) for referenced_name in self.referenced_names)
+
+    def _get_file_paths(self, pattern: str) -> List[str]:
+        with self._lock:
+            published_paths = list(self._results)
+
+        if not glob.has_magic(pattern):
+            return [pattern] if pattern in published_paths or os.path.isfile(pattern) else []
+
+        pattern_parts = pattern.split(os.sep)
+        file_paths = {file_path for file_path in published_paths if self._match_parts(file_path.split(os.sep), pattern_parts)}
+        file_paths.update(os.path.abspath(file_path) for file_path in glob.glob(pattern) if os.path.isfile(file_path))
+        return sorted(file_paths)
+
+    @staticmethod
+    def _match_parts(parts: List[str], pattern_parts: List[str]) -> bool:
+        # Unlike fnmatch, glob wildcards do not match path separators
+        return len(parts) == len(pattern_parts) and all(fnmatch.fnmatchcase(part, pattern_part)
+                                                        for part, pattern_part in zip(parts, pattern_parts))
+
+    def _get_values(self, file_path: str, query: str) -> list:
+        key = (file_path, query)
+        with self._lock:
+            if key in self._values:
+                return list(self._values[key])
+            result = self._results.get(file_path)
+            is_published = file_path in self._results
+
+        if is_published:
+            try:
+                values = query_dynamic_values(query, result)
+            except TypeError:
+                # The result holds values that are serialized by the scanner (e.g. datetime), so query it as it was saved
+                result = json.loads(dumps(result, ResultsFormat.COMPACT))
+                with self._lock:
+                    self._results[file_path] = result
+                values = query_dynamic_values(query, result)
+        else:
+            with open(file_path, "r") as file:
+                values = query_dynamic_values(query, json.load(file))
+
+        with self._lock:
+            self._values[key] = values
+        return list(values)
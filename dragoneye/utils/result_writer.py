@@ -0,0 +1,127 @@
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional, Set
+
+from dragoneye.utils.app_logger import logger
+from dragoneye.utils.json_serializer import ResultsFormat, dump_to_file
+
+_PROCESS_POOLS: Dict[int, ProcessPoolExecutor] = {}
+_PROCESS_POOLS_LOCK = threading.Lock()
+
+
+def _get_process_pool(processes: int) -> ProcessPoolExecutor:
+    """
+    Returns the pool of `processes` processes that is shared by all the scans in this process, so the scans of many accounts
+    do not start processes of their own.
+    """
+    with _PROCESS_POOLS_LOCK:
+        if processes not in _PROCESS_POOLS:
+            # The pool is started while worker threads run, and forking a multi-threaded process may copy locks that other threads hold
+            _PROCESS_POOLS[processes] = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn'))
+        return _PROCESS_POOLS[processes]
+
+
+@atexit.register
+def shutdown_process_pools() -> None:
+    """
+    Shuts down the shared pools once their queued results are written. A later write starts a new pool.
+    """
+    with _PROCESS_POOLS_LOCK:
+        pools = list(_PROCESS_POOLS.values())
+        _PROCESS_POOLS.clear()
+    for pool in pools:
+        pool.shutdown(wait=True)
+
+
+def _write_result(data: Any, output_file: str, results_format: ResultsFormat, sort_keys: bool,
+                  transform: Optional[Callable[[Any], None]]) -> str:
+    if transform is not None:
+        transform(data)
+    return dump_to_file(data, output_file, results_format, sort_keys)
+
+
+class ResultWriter:
+    """
+    Writes results to their files: transforms them, encodes them (the CPU-heavy part of saving a result), writes them atomically,
+    and hashes them.
+
+    By default, results are written by the thread that fetched them. With `processes`, they are written by a pool of processes,
+    so the encoding is spread over the cores instead of running under the GIL of the threads that do the network I/O,
+    and `write` returns as soon as the result was queued. The data is pickled to the pool, so it must not be changed after it was queued.
+    At most `processes * 2` results are queued at a time, so the queue does not hold more results in memory than the pool keeps up with.
+    """
+
+    def __init__(self, processes: int = 0):
+        """
+        :param processes: The number of processes that write results. 0 writes the results in the calling threads.
+        """
+        self.processes: int = processes
+        self._pending: Set[Future] = set()
+        self._queue_slots = threading.BoundedSemaphore(max(processes, 1) * 2)
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+
+    def write(self, data: Any, output_file: str, results_format: ResultsFormat = ResultsFormat.PRETTY, sort_keys: bool = False,
+              transform: Optional[Callable[[Any], None]] = None, on_written: Optional[Callable[[str], None]] = None,
+              on_failed: Optional[Callable[[Exception], None]] = None, wait: bool = False) -> None:
+        """
+        :param transform: A function that changes the data in place before it is written. It must be picklable (e.g. a module level function).
+        :param on_written: Called with the SHA-256 of the written content once the file is completely written.
+            With processes, it is called from another thread, and not at all if the result could not be written.
+        :param on_failed: Called with the error if the result could not be written, instead of raising it (which only happens without processes).
+        :param wait: Whether to return only once the result was written and on_written has returned, even with processes.
+        """
+        if self.processes <= 0:
+            try:
+                sha256 = _write_result(data, output_file, results_format, sort_keys, transform)
+            except Exception as ex:
+                if on_failed is None:
+                    raise
+                logger.error(f'Failed to write results to {output_file}', exc_info=ex)
+                on_failed(ex)
+                return
+            if on_written is not None:
+                on_written(sha256)
+            return
+
+        self._queue_slots.acquire()
+        try:
+            future = _get_process_pool(self.processes).submit(_write_result, data, output_file, results_format, sort_keys, transform)
+        except Exception:
+            self._queue_slots.release()
+            raise
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(lambda done_future: self._on_written(done_future, output_file, on_written, on_failed))
+        if wait:
+            with self._lock:
+                while future in self._pending:
+                    self._done.wait()
+
+    def _on_written(self, future: Future, output_file: str, on_written: Optional[Callable[[str], None]],
+                    on_failed: Optional[Callable[[Exception], None]]) -> None:
+        try:
+            exception = future.exception()
+            if exception is not None:
+                logger.error(f'Failed to write results to {output_file}', exc_info=exception)
+                if on_failed is not None:
+                    on_failed(exception)
+            elif on_written is not None:
+                on_written(future.result())
+        except Exception:
+            logger.exception(f'Failed to complete the write of results to {output_file}')
+        finally:
+            self._queue_slots.release()
+            with self._lock:
+                self._pending.discard(future)
+                self._done.notify_all()
+
+    def wait(self) -> None:
+        """
+        Waits until all the queued results are written.
+        """
+        with self._lock:
+            while self._pending:
+                self._done.wait()
@@ -0,0 +1,104 @@
+import random
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from botocore.retries import standard
+
+from dragoneye.utils.app_logger import logger
+
+
+@dataclass
+class CallRetries:
+    """
+    The retries a single call used so far, over all the layers that retry it.
+    """
+    retries: int = 0
+
+
+class RetryPolicy:
+    """
+    A single retry policy for all the layers that retry a call (transient errors and throttling),
+    so a call is attempted at most `max_attempts` times in total, and the whole scan retries failing calls at most `scan_budget` times.
+    Once the scan budget is spent, failing calls fail on their first attempt, so a broken endpoint fails fast instead of holding threads.
+    Throttled calls are retried out of the scan budget, since throttling is slowed down by the rate limiters instead,
+    and a large account would otherwise spend the budget on throttling alone.
+
+    Retries are delayed with exponential backoff and full jitter, so calls that failed together do not retry together.
+    """
+
+    def __init__(self,
+                 max_attempts: int = 5,
+                 scan_budget: int = 500,
+                 base_delay: float = 0.5,
+                 max_delay: float = 20.0,
+                 rand: Optional[random.Random] = None):
+        """
+        :param max_attempts: The amount of times a single call is attempted before giving up.
+        :param scan_budget: The amount of retries the whole scan may use.
+        :param base_delay: The highest delay before the first retry of a call. It is doubled for every retry.
+        :param max_delay: The highest delay before any retry.
+        """
+        self.max_attempts: int = max(max_attempts, 1)
+        self.scan_budget: int = scan_budget
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self.retries_used: int = 0
+        self._random = rand or random.Random()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def get_retry_delay(self, call: CallRetries, throttled: bool = False) -> Optional[float]:
+        """
+        Takes a retry for the call, and returns how long to wait before it.
+        Returns None if the call should not be retried, because it used all of its attempts, or the scan used all of its budget.
+        :param throttled: Whether the call is retried since it was throttled, which does not take from the budget of the scan.
+        """
+        with self._lock:
+            if call.retries + 1 >= self.max_attempts:
+                return None
+            if not throttled:
+                if self.retries_used >= self.scan_budget:
+                    return None
+                self.retries_used += 1
+                if self.retries_used == self.scan_budget:
+                    logger.warning(f'The retry budget of the scan ({self.scan_budget} retries) was used up, failing calls will not be retried')
+            call.retries += 1
+            retries = call.retries
+        return self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retries))
+
+    @contextmanager
+    def bind(self, call: CallRetries) -> Iterator[CallRetries]:
+        """
+        Binds the call to the current thread, so retries made deep inside the call (e.g. by botocore) are counted for it.
+        """
+        previous = getattr(self._local, 'call', None)
+        self._local.call = call
+        try:
+            yield call
+        finally:
+            self._local.call = previous
+
+    def get_bound_call(self) -> Optional[CallRetries]:
+        return getattr(self._local, 'call', None)
+
+    def register_botocore_handler(self, client) -> None:
+        """
+        Makes the client retry transient errors (timeouts, connection errors and 5xx responses) under this policy.
+        The client's own retries should be disabled (total_max_attempts=1), and throttling errors are left to the caller.
+        """
+        retry_event_adapter = standard.RetryEventAdapter()
+        transient_checker = standard.TransientRetryableChecker()
+        throttled_checker = standard.ThrottledRetryableChecker()
+
+        def needs_retry(**kwargs) -> Optional[float]:
+            context = retry_event_adapter.create_retry_context(**kwargs)
+            # Some throttling errors (e.g. S3's SlowDown) come with a 5xx status, so they have to be excluded explicitly
+            if throttled_checker.is_retryable(context) or not transient_checker.is_retryable(context):
+                return None
+            call = self.get_bound_call() or CallRetries(context.attempt_number - 1)
+            return self.get_retry_delay(call)
+
+        # The client's own handler is registered on the more specific needs-retry.<service> event, so it runs first and declines
+        client.meta.events.register('needs-retry', needs_retry, unique_id='dragoneye-retry-policy')
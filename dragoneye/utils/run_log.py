@@ -0,0 +1,173 @@
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from dragoneye.utils.scan_metrics import CallLabels, CallMeasurement
+
+RUN_LOG_FILE_NAME = 'run-log.jsonl'
+RUN_REPORT_FILE_NAME = 'run-report.json'
+# The number of slowest calls and largest results in the report
+TOP_COUNT = 10
+
+
+class RunLog:
+    """
+    A log of the calls of a scan, in the account directory. Each line records a call as it completes:
+    its command, duration, status, pages, and output file (relative to the account directory), and for a failed call its summary.
+    Each saved result is recorded with its size as well, and so is every call that a deadline cut off, whether it was stopped
+    before fetching all of its pages, or it was not called at all.
+
+    The records are streamed to the file rather than kept, and only aggregates are kept in memory: the counts of the calls,
+    the slowest calls, the largest results and the time of every command. So memory stays flat no matter how many calls the scan makes,
+    and the failures are read back from the file once the scan is done.
+    """
+
+    def __init__(self, account_data_dir: str, top_count: int = TOP_COUNT, clock: Callable[[], float] = time.time):
+        self.account_data_dir: str = account_data_dir
+        self.path: str = os.path.join(account_data_dir, RUN_LOG_FILE_NAME)
+        self.top_count: int = top_count
+        self.calls: int = 0
+        self.failures: int = 0
+        self.cut_offs: int = 0
+        self.wall_seconds: Optional[float] = None
+        self._clock = clock
+        self._start = time.monotonic()
+        # Min-heaps of the top records, whose smallest record is dropped when a larger one arrives.
+        # The sequence number breaks ties, so records are never compared.
+        self._slowest_calls: List[Tuple[float, int, dict]] = []
+        self._largest_results: List[Tuple[int, int, dict]] = []
+        self._sequence = itertools.count()
+        # The calls and the time in calls of every command
+        self._commands: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        # The log is of a single run, so the log of a previous run is replaced
+        self._file = open(self.path, 'w', encoding='utf-8')
+
+    def record_call(self, labels: CallLabels, call: str, measurement: CallMeasurement,
+                    output_file: Optional[str] = None, failure: Optional[dict] = None) -> None:
+        """
+        :param call: A readable representation of the call, such as its function and parameters.
+        :param failure: The summary of the call, if it failed, as the failures report lists it.
+        """
+        command = f'{labels.service}.{labels.operation}'
+        record = {
+            'time': round(self._clock(), 3),
+            'command': command,
+            'region': labels.region,
+            'call': call,
+            'status': 'failed' if failure is not None else 'cut-off' if measurement.cut_off is not None else 'ok',
+            'duration': round(measurement.duration, 6),
+            'pages': measurement.pages,
+            'retries': measurement.retries,
+            'throttled': measurement.throttled,
+            'output': self._get_relative_path(output_file),
+        }
+        if measurement.cut_off is not None:
+            record['cut_off'] = measurement.cut_off
+        line = json.dumps({**record, 'failure': failure} if failure is not None else record, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+            self.calls += 1
+            self.failures += failure is not None
+            self.cut_offs += measurement.cut_off is not None
+            command_stats = self._commands.setdefault(command, [0, 0.0])
+            command_stats[0] += 1
+            command_stats[1] += measurement.duration
+            self._push_top(self._slowest_calls, measurement.duration, record)
+
+    def record_cut_off(self, labels: CallLabels, call: str, reason: str) -> None:
+        """
+        Records a call (or a whole command) that was not called, since a deadline cut it off before it started.
+        """
+        record = {'time': round(self._clock(), 3), 'command': f'{labels.service}.{labels.operation}', 'region': labels.region, 'call': call,
+                  'status': 'cut-off', 'pages': 0, 'output': None, 'cut_off': reason}
+        with self._lock:
+            self._file.write(json.dumps(record) + '\n')
+            self.cut_offs += 1
+
+    def record_write_failure(self, labels: CallLabels, call: str, output_file: str, failure: dict) -> None:
+        """
+        Records the results of a call that could not be written to their file, which may happen after the call itself was recorded,
+        when the results are written by another process.
+        :param failure: The summary of the call with the error of the write, as the failures report lists it.
+        """
+        record = {'time': round(self._clock(), 3), 'command': f'{labels.service}.{labels.operation}', 'region': labels.region, 'call': call,
+                  'status': 'failed', 'output': self._get_relative_path(output_file), 'failure': failure}
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+            self.failures += 1
+
+    def record_result(self, output_file: str, size: int) -> None:
+        record = {'time': round(self._clock(), 3), 'output': self._get_relative_path(output_file), 'bytes': size}
+        with self._lock:
+            self._file.write(json.dumps(record) + '\n')
+            self._push_top(self._largest_results, size, record)
+
+    def _push_top(self, heap: list, key, record: dict) -> None:
+        item = (key, next(self._sequence), record)
+        if len(heap) < self.top_count:
+            heapq.heappush(heap, item)
+        elif key > heap[0][0]:
+            heapq.heapreplace(heap, item)
+
+    def _get_relative_path(self, output_file: Optional[str]) -> Optional[str]:
+        if output_file is None:
+            return None
+        return os.path.relpath(output_file, self.account_data_dir).replace(os.sep, '/')
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.close()
+            self.wall_seconds = time.monotonic() - self._start
+
+    def read_failures(self) -> Iterator[dict]:
+        """
+        Yields the summaries of the failed calls, in the order they were recorded. The log must be closed.
+        """
+        with open(self.path, 'r', encoding='utf-8') as log_file:
+            for line in log_file:
+                record = json.loads(line)
+                if record.get('status') == 'failed':
+                    yield record['failure']
+
+    def read_cut_offs(self) -> Iterator[dict]:
+        """
+        Yields what the deadlines cut off: the calls that were not called, and the calls whose results are partial,
+        in the order they were recorded. The log must be closed.
+        """
+        with open(self.path, 'r', encoding='utf-8') as log_file:
+            for line in log_file:
+                record = json.loads(line)
+                if record.get('status') == 'cut-off':
+                    yield {key: record[key] for key in ('command', 'region', 'call', 'pages', 'output', 'cut_off')}
+
+    def get_report(self) -> dict:
+        """
+        Returns a compact report of the run: the slowest calls, the largest results, and the time every command spent in calls,
+        with its share of the time of all the calls (calls run in parallel, so the time in calls is usually longer than the wall time).
+        """
+        with self._lock:
+            call_seconds = sum(seconds for _, seconds in self._commands.values())
+            commands = [{'command': command, 'calls': calls, 'seconds': round(seconds, 3),
+                         'share': round(seconds / call_seconds, 4) if call_seconds else 0.0}
+                        for command, (calls, seconds) in self._commands.items()]
+            slowest_calls = [record for _, _, record in sorted(self._slowest_calls, reverse=True)]
+            largest_results = [record for _, _, record in sorted(self._largest_results, reverse=True)]
+        commands.sort(key=lambda command: command['seconds'], reverse=True)
+        return {
+            'calls': self.calls,
+            'failures': self.failures,
+            'cut_offs': self.cut_offs,
+            'wall_seconds': round(self.wall_seconds, 3) if self.wall_seconds is not None else None,
+            'call_seconds': round(call_seconds, 3),
+            'commands': commands,
+            'slowest_calls': slowest_calls,
+            'largest_results': largest_results,
+        }
@@ -0,0 +1,144 @@
+import fnmatch
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Set
+
+from dragoneye.utils.app_logger import logger
+
+JOURNAL_FILE_NAME = 'scan-journal.jsonl'
+
+
+class ScanJournal:
+    """
+    An append-only journal of the calls a scan completed, kept in the account directory.
+    Each line records a result file (relative to the account directory), the SHA-256 of its content
+    (or no hash for a call that completed without a result), and when it was fetched.
+
+    A result is recorded only after its file was completely written, so when resuming or refreshing a scan,
+    the journal alone tells which calls are done and how old their results are, without checking the result files on disk.
+    """
+
+    def __init__(self, account_data_dir: str, load: bool = False, clock: Callable[[], float] = time.time):
+        """
+        :param account_data_dir: The directory of the scanned account.
+        :param load: Whether to load the calls completed by previous scans of the account.
+        """
+        self.account_data_dir: str = account_data_dir
+        self.path: str = os.path.join(account_data_dir, JOURNAL_FILE_NAME)
+        self._clock = clock
+        self._entries: Dict[str, dict] = self._load() if load else {}
+        self._changed: Set[str] = set()
+        self._lock = threading.Lock()
+        # The journal is appended to even when not loaded, since the results of previous scans that were kept are still valid
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if not self._ends_with_newline():
+            # Terminates a torn line, so it does not swallow the next entry
+            self._file.write('\n')
+
+    def _load(self) -> Dict[str, dict]:
+        entries: Dict[str, dict] = {}
+        if not os.path.isfile(self.path):
+            return entries
+        lines = 0
+        with open(self.path, 'r', encoding='utf-8') as journal_file:
+            for line in journal_file:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line is torn if the previous scan was killed while writing it
+                    continue
+                # A result that was written again is recorded again, so the last entry of a file is the one that counts
+                entries[entry['file']] = entry
+        if lines > len(entries):
+            self._compact(entries)
+        logger.info(f'{len(entries)} completed calls were found in {self.path}')
+        return entries
+
+    def _compact(self, entries: Dict[str, dict]) -> None:
+        """
+        Rewrites the journal with only the last entry of every file, so it does not grow with every refresh.
+        """
+        temp_file = self.path + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as journal_file:
+            for entry in entries.values():
+                journal_file.write(json.dumps(entry) + '\n')
+        os.replace(temp_file, self.path)
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, 'rb') as journal_file:
+            journal_file.seek(0, os.SEEK_END)
+            if journal_file.tell() == 0:
+                return True
+            journal_file.seek(-1, os.SEEK_END)
+            return journal_file.read(1) == b'\n'
+
+    def is_completed(self, output_file: str) -> bool:
+        return self._get_key(output_file) in self._entries
+
+    def is_fresh(self, output_file: str, ttl: Optional[float]) -> bool:
+        """
+        Returns whether the call whose result is `output_file` completed less than `ttl` seconds ago.
+        """
+        entry = self._entries.get(self._get_key(output_file))
+        if entry is None or ttl is None:
+            return False
+        return self._clock() - entry.get('fetched_at', 0) < ttl
+
+    def get_hash(self, output_file: str) -> Optional[str]:
+        entry = self._entries.get(self._get_key(output_file))
+        return entry and entry['sha256']
+
+    def has_changes(self, patterns: Iterable[str]) -> bool:
+        """
+        Returns whether this scan changed a result that matches one of the patterns (relative to the account directory).
+        A pattern matches a result by its leading path components, so a pattern of a directory matches the results in it.
+        """
+        with self._lock:
+            changed = list(self._changed)
+        for pattern in patterns:
+            depth = len(pattern.split('/'))
+            if any(fnmatch.fnmatchcase('/'.join(key.split('/')[:depth]), pattern) for key in changed):
+                return True
+        return False
+
+    def record(self, output_file: str, has_result: bool = True, sha256: Optional[str] = None) -> bool:
+        """
+        Records that the call whose result is `output_file` completed. The file must already be completely written.
+        Returns whether the result differs from the one previously recorded for the file.
+        :param sha256: The SHA-256 of the result, if it is already known. Otherwise the file is read to hash it.
+        """
+        key = self._get_key(output_file)
+        if has_result and sha256 is None:
+            sha256 = self._hash_file(output_file)
+        entry = {'file': key, 'sha256': sha256 if has_result else None, 'fetched_at': round(self._clock(), 3)}
+        with self._lock:
+            previous_entry = self._entries.get(key)
+            changed = previous_entry is None or previous_entry['sha256'] != entry['sha256']
+            if changed:
+                self._changed.add(key)
+            self._entries[key] = entry
+            self._write(entry)
+        return changed
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def _write(self, entry: dict) -> None:
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+
+    def _get_key(self, output_file: str) -> str:
+        return os.path.relpath(output_file, self.account_data_dir).replace(os.sep, '/')
+
+    @staticmethod
+    def _hash_file(file_path: str) -> str:
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        return sha256.hexdigest()
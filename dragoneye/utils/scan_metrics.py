@@ -0,0 +1,217 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, fields
+from typing import Dict, Iterator, List, Optional
+
+from dragoneye.utils.app_logger import logger
+
+METRICS_JSON_FILE_NAME = 'metrics.json'
+METRICS_PROMETHEUS_FILE_NAME = 'metrics.prom'
+# The upper bounds (in seconds) of the buckets of the latency histograms
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+@dataclass(frozen=True)
+class CallLabels:
+    """
+    The labels that the metrics of a call are aggregated by.
+    """
+    provider: str
+    account: str
+    service: str
+    operation: str
+    region: str
+
+
+@dataclass
+class CallMeasurement:
+    """
+    What a measured call reports about itself, by the end of the call, and its duration (in seconds) once it is measured.
+    A call that a deadline stopped before it fetched all of its pages reports the reason in `cut_off`.
+    """
+    pages: int = 0
+    failed: bool = False
+    throttled: bool = False
+    retries: int = 0
+    duration: float = 0.0
+    cut_off: Optional[str] = None
+
+
+class _CallStats:
+    def __init__(self):
+        self.calls: int = 0
+        self.errors: int = 0
+        self.pages: int = 0
+        self.throttles: int = 0
+        self.retries: int = 0
+        self.bytes_written: int = 0
+        self.in_flight: int = 0
+        self.latency_sum: float = 0.0
+        self.latency_max: float = 0.0
+        # The count of calls of every bucket of LATENCY_BUCKETS (not cumulative), and of the calls above all of them
+        self.latency_buckets: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, latency: float, measurement: CallMeasurement) -> None:
+        self.calls += 1
+        self.errors += int(measurement.failed)
+        self.pages += measurement.pages
+        self.throttles += int(measurement.throttled)
+        self.retries += measurement.retries
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.latency_buckets[next((index for index, bound in enumerate(LATENCY_BUCKETS) if latency <= bound), len(LATENCY_BUCKETS))] += 1
+
+
+class ScanMetrics:
+    """
+    The metrics of the calls of a scan, per CallLabels: a histogram of their latency, and counters of the calls, errors, pages,
+    throttles, retries and bytes written, and a gauge of the calls in flight.
+
+    The metrics are exported as a JSON report and as a Prometheus text file (for the node exporter's textfile collector),
+    at the end of the scan, and periodically during long scans.
+    The same metrics can be shared by the scans of many accounts, as the labels tell them apart.
+    """
+
+    def __init__(self):
+        self._stats: Dict[CallLabels, _CallStats] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure_call(self, labels: CallLabels) -> Iterator[CallMeasurement]:
+        """
+        Measures the call that runs in the context: it is in flight until the context exits, which observes its latency.
+        The call reports its pages, retries and whether it failed or was throttled on the yielded measurement.
+        A call that raises is counted as failed.
+        """
+        measurement = CallMeasurement()
+        with self._lock:
+            stats = self._get_stats(labels)
+            stats.in_flight += 1
+        start = time.monotonic()
+        try:
+            yield measurement
+        except Exception:
+            measurement.failed = True
+            raise
+        finally:
+            measurement.duration = time.monotonic() - start
+            with self._lock:
+                stats.in_flight -= 1
+                stats.observe(measurement.duration, measurement)
+
+    def add_bytes_written(self, labels: CallLabels, count: int) -> None:
+        with self._lock:
+            self._get_stats(labels).bytes_written += count
+
+    def _get_stats(self, labels: CallLabels) -> _CallStats:
+        stats = self._stats.get(labels)
+        if stats is None:
+            stats = self._stats[labels] = _CallStats()
+        return stats
+
+    def to_dict(self) -> dict:
+        calls = []
+        totals = {'calls': 0, 'errors': 0, 'pages': 0, 'throttles': 0, 'retries': 0, 'bytes_written': 0, 'latency_sum': 0.0}
+        with self._lock:
+            for labels, stats in self._stats.items():
+                call = {**asdict(labels),
+                        'calls': stats.calls,
+                        'errors': stats.errors,
+                        'pages': stats.pages,
+                        'throttles': stats.throttles,
+                        'retries': stats.retries,
+                        'bytes_written': stats.bytes_written,
+                        'in_flight': stats.in_flight,
+                        'latency_sum': round(stats.latency_sum, 6),
+                        'latency_max': round(stats.latency_max, 6),
+                        'latency_average': round(stats.latency_sum / stats.calls, 6) if stats.calls else None,
+                        'latency_buckets': {str(bound): count for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), stats.latency_buckets)}}
+                calls.append(call)
+                for key in totals:
+                    totals[key] += call[key]
+        totals['latency_sum'] = round(totals['latency_sum'], 6)
+        # The operations that took the most time come first, since they are where the time of the scan goes
+        calls.sort(key=lambda call: call['latency_sum'], reverse=True)
+        return {'totals': totals, 'calls': calls}
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            stats_by_labels = list(self._stats.items())
+
+            def add_metric(name: str, metric_type: str, description: str, get_value) -> None:
+                lines.append(f'# HELP dragoneye_{name} {description}')
+                lines.append(f'# TYPE dragoneye_{name} {metric_type}')
+                for labels, stats in stats_by_labels:
+                    lines.append(f'dragoneye_{name}{{{_format_labels(labels)}}} {get_value(stats)}')
+
+            lines.append('# HELP dragoneye_call_duration_seconds The latency of the calls to the API of the cloud provider')
+            lines.append('# TYPE dragoneye_call_duration_seconds histogram')
+            for labels, stats in stats_by_labels:
+                formatted_labels = _format_labels(labels)
+                cumulative_count = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), stats.latency_buckets):
+                    cumulative_count += count
+                    lines.append(f'dragoneye_call_duration_seconds_bucket{{{formatted_labels},le="{bound}"}} {cumulative_count}')
+                lines.append(f'dragoneye_call_duration_seconds_sum{{{formatted_labels}}} {stats.latency_sum}')
+                lines.append(f'dragoneye_call_duration_seconds_count{{{formatted_labels}}} {stats.calls}')
+            add_metric('call_errors_total', 'counter', 'The calls that failed', lambda stats: stats.errors)
+            add_metric('pages_total', 'counter', 'The pages that the calls fetched', lambda stats: stats.pages)
+            add_metric('throttles_total', 'counter', 'The calls that were throttled', lambda stats: stats.throttles)
+            add_metric('retries_total', 'counter', 'The retries of the calls', lambda stats: stats.retries)
+            add_metric('bytes_written_total', 'counter', 'The bytes of the result files that were written', lambda stats: stats.bytes_written)
+            add_metric('calls_in_flight', 'gauge', 'The calls that are running', lambda stats: stats.in_flight)
+        return '\n'.join(lines) + '\n'
+
+    def export(self, directory: str) -> None:
+        """
+        Writes the metrics to metrics.json and metrics.prom in the directory. The files are replaced atomically,
+        so readers (e.g. a Prometheus collector) never see a partially written file.
+        """
+        _write_atomically(os.path.join(directory, METRICS_JSON_FILE_NAME), json.dumps(self.to_dict(), indent=4))
+        _write_atomically(os.path.join(directory, METRICS_PROMETHEUS_FILE_NAME), self.to_prometheus())
+
+    @contextmanager
+    def exporting(self, directory: str, interval: Optional[float] = None) -> Iterator[None]:
+        """
+        Exports the metrics to the directory every `interval` seconds while the context runs (if an interval is given),
+        and once more when it exits.
+        """
+        stopped = threading.Event()
+
+        def export_periodically() -> None:
+            while not stopped.wait(interval):
+                try:
+                    self.export(directory)
+                except Exception:
+                    logger.exception(f'Failed to export the metrics to {directory}')
+
+        exporter = threading.Thread(target=export_periodically, name='metrics-exporter', daemon=True) if interval else None
+        if exporter is not None:
+            exporter.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            if exporter is not None:
+                exporter.join()
+            self.export(directory)
+            logger.info(f'Metrics were saved to {os.path.join(directory, METRICS_JSON_FILE_NAME)} and {METRICS_PROMETHEUS_FILE_NAME}')
+
+
+def _format_labels(labels: CallLabels) -> str:
+    return ','.join(f'{field.name}="{_escape_label_value(getattr(labels, field.name))}"' for field in fields(labels))
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _write_atomically(path: str, content: str) -> None:
+    temp_file = path + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as file:
+        file.write(content)
+    os.replace(temp_file, path)
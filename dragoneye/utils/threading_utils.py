@@ -1,9 +1,14 @@
-import concurrent
-from concurrent.futures import Future, ThreadPoolExecutor, ALL_COMPLETED
-from dataclasses import dataclass
-from typing import Callable, List, Tuple, Deque
+import collections
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Callable, List, Tuple, Deque, Dict, Hashable, Iterable, Set, Optional, Any
 
 from dragoneye.utils.app_logger import logger
+from dragoneye.utils.concurrency_limiter import AdaptiveConcurrencyLimiters
 
 
 @dataclass
@@ -12,30 +17,279 @@ class ThreadedFunctionData:
     args: Tuple
     error_msg: str
     timeout_msg: str = None
+    concurrency_key: Hashable = None
 
 
-def execute_parallel_functions_in_threads(tasks_groups: Deque[List[ThreadedFunctionData]], max_workers, timeout=None)\
-        -> List[Tuple[Future, str, str]]:
+@dataclass
+class TaskFanOut:
+    """
+    Returned by a task of a TaskScheduler in order to split its work into sub tasks that run on the same pool.
+    The task is considered done only once all of its sub tasks are done, and `on_complete` (if given) was called
+    with the results of the sub tasks, in the order they were given.
+    At most `max_parallel` of the sub tasks run at the same time, if given.
+    """
+    tasks: List[ThreadedFunctionData]
+    on_complete: Optional[Callable[[List[Any]], Any]] = None
+    max_parallel: Optional[int] = None
+
+
+@dataclass
+class TaskRetry:
+    """
+    Returned by a task (or a sub task) of a TaskScheduler in order to run it again once `delay` seconds have passed,
+    without holding a worker thread in the meantime. If `args` are given, the task runs again with them instead of its original arguments.
+    """
+    delay: float = 0
+    args: Optional[Tuple] = None
+
+
+@dataclass
+class _ScheduledItem:
+    key: Hashable
+    kind: str
+    task: ThreadedFunctionData
+    index: Optional[int] = None
+    submitted_at: float = 0
+    added_tasks: Optional[List[Tuple[Hashable, ThreadedFunctionData, Iterable[Hashable], Hashable]]] = None
+
+
+class TaskScheduler:
     """
-    This function takes a Queue (tasks_groups: Deque[List[ThreadedFunctionData]])
-    of lists, when each queued item represents a list of functions that should be run in parallel.
+    Runs a dependency graph of tasks on a single bounded thread pool.
+    A task is submitted as soon as all of the tasks it depends on are done, regardless of any other task in the graph.
+    Ready tasks are taken from their groups in a round-robin manner, so a group with many queued tasks cannot starve the others.
+    A task that returns a TaskRetry is put aside, and queued again once its delay has passed.
+    If concurrency limiters are given, tasks that have a `concurrency_key` are also bounded by the limit of their key,
+    which adapts to the latency and errors of the tasks; tasks over the limit wait (without a thread) until a task of their key is done.
+    Running tasks may add tasks to the graph too: the tasks a task adds join the graph together once it is done,
+    so they may depend on each other, and on any task that was added before them.
     """
-    tasks_responses: List[Tuple[Future, str, str]] = []
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
 
-        for tasks_group in tasks_groups:
-            for task in tasks_group:
-                tasks_responses.append((
-                    executor.submit(task.callable, *task.args),
-                    task.error_msg, task.timeout_msg))
+    _TASK = 'task'
+    _SUB_TASK = 'sub-task'
+    _ON_COMPLETE = 'on-complete'
+
+    def __init__(self, max_workers: int, concurrency_limiters: Optional[AdaptiveConcurrencyLimiters] = None):
+        self._max_workers: int = max_workers
+        self._concurrency_limiters: Optional[AdaptiveConcurrencyLimiters] = concurrency_limiters
+        self._blocked: Dict[Hashable, Deque[_ScheduledItem]] = {}
+        self._tasks: Dict[Hashable, ThreadedFunctionData] = {}
+        self._groups: Dict[Hashable, Hashable] = {}
+        self._dependencies: Dict[Hashable, Set[Hashable]] = {}
+        self._dependents: Dict[Hashable, List[Hashable]] = {}
+        self._futures: Dict[Hashable, Future] = {}
+        self._fan_outs: Dict[Hashable, TaskFanOut] = {}
+        self._sub_tasks_results: Dict[Hashable, List[Any]] = {}
+        self._remaining_sub_tasks: Dict[Hashable, int] = {}
+        self._waiting_sub_tasks: Dict[Hashable, Deque[_ScheduledItem]] = {}
+        self._ready: 'OrderedDict[Hashable, Deque[_ScheduledItem]]' = collections.OrderedDict()
+        self._delayed: List[Tuple[float, int, _ScheduledItem]] = []
+        self._delayed_counter = itertools.count()
+        self._condition = threading.Condition()
+        self._in_flight: int = 0
+        self._pending: int = 0
+        self._finished: Set[Hashable] = set()
+        self._local = threading.local()
+
+    def add_task(self, key: Hashable, task: ThreadedFunctionData, depends_on: Iterable[Hashable] = (), group: Hashable = None) -> None:
+        added_tasks = getattr(self._local, 'added_tasks', None)
+        if added_tasks is not None:
+            # Called by a running task, so the task is added once the running task is done
+            added_tasks.append((key, task, depends_on, group))
+            return
+        self._register_task(key, task, depends_on, group)
+
+    def _register_task(self, key: Hashable, task: ThreadedFunctionData, depends_on: Iterable[Hashable], group: Hashable) -> None:
+        if key in self._tasks:
+            raise ValueError(f'Task {key} was already added')
+        self._tasks[key] = task
+        self._groups[key] = group
+        self._dependencies[key] = set(depends_on)
+
+    def run(self) -> Dict[Hashable, Future]:
+        self._build_graph(list(self._tasks))
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            with self._condition:
+                while self._pending > 0:
+                    self._release_delayed()
+                    while self._ready and self._in_flight < self._max_workers:
+                        item = self._pop_ready()
+                        if self._try_acquire(item):
+                            self._submit(executor, item)
+                    if self._in_flight == 0 and not self._ready and not self._delayed:
+                        if self._blocked:
+                            # Nothing is running, so nothing would release the blocked tasks
+                            self._unblock_all()
+                        else:
+                            self._break_cycle()
+                        continue
+                    self._condition.wait(self._get_wait_timeout())
+
+        return self._futures
+
+    def _build_graph(self, keys: List[Hashable]) -> None:
+        for key in keys:
+            dependencies = self._dependencies[key]
+            unknown_dependencies = {dependency for dependency in dependencies
+                                    if dependency not in self._tasks or dependency == key or dependency in self._finished}
+            dependencies.difference_update(unknown_dependencies)
+            for dependency in dependencies:
+                self._dependents.setdefault(dependency, []).append(key)
+            if not dependencies:
+                self._push_ready(_ScheduledItem(key, self._TASK, self._tasks[key]))
+        self._pending += len(keys)
+
+    def _add_tasks(self, added_tasks: List[Tuple[Hashable, ThreadedFunctionData, Iterable[Hashable], Hashable]]) -> None:
+        keys = []
+        for key, task, depends_on, group in added_tasks:
+            try:
+                self._register_task(key, task, depends_on, group)
+                keys.append(key)
+            except ValueError as ex:
+                logger.error(str(ex))
+        self._build_graph(keys)
+
+    def _break_cycle(self) -> None:
+        key = next(key for key, dependencies in self._dependencies.items() if dependencies and key not in self._futures)
+        logger.warning(f'Cyclic dependency detected, running task {key} without waiting for {self._dependencies[key]}')
+        self._dependencies[key].clear()
+        self._push_ready(_ScheduledItem(key, self._TASK, self._tasks[key]))
+
+    def _push_delayed(self, item: _ScheduledItem, retry: TaskRetry) -> None:
+        if retry.args is not None:
+            item = _ScheduledItem(item.key, item.kind, replace(item.task, args=retry.args), item.index)
+        heapq.heappush(self._delayed, (time.monotonic() + max(retry.delay, 0), next(self._delayed_counter), item))
+
+    def _release_delayed(self) -> None:
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            item = heapq.heappop(self._delayed)[2]
+            self._push_ready(item, first=item.kind == self._SUB_TASK)
+
+    def _get_wait_timeout(self) -> Optional[float]:
+        if not self._delayed:
+            return None
+        return max(self._delayed[0][0] - time.monotonic(), 0)
+
+    def _push_ready(self, item: _ScheduledItem, first: bool = False) -> None:
+        group_items = self._ready.setdefault(self._groups[item.key], collections.deque())
+        if first:
+            group_items.appendleft(item)
+        else:
+            group_items.append(item)
+
+    def _pop_ready(self) -> _ScheduledItem:
+        group, group_items = next(iter(self._ready.items()))
+        item = group_items.popleft()
+        if group_items:
+            self._ready.move_to_end(group)
+        else:
+            del self._ready[group]
+        return item
+
+    def _try_acquire(self, item: _ScheduledItem) -> bool:
+        key = item.task.concurrency_key
+        if key is None or self._concurrency_limiters is None or self._concurrency_limiters.try_acquire(key):
+            return True
+        self._blocked.setdefault(key, collections.deque()).append(item)
+        return False
+
+    def _release(self, item: _ScheduledItem, future: Future) -> None:
+        key = item.task.concurrency_key
+        if key is None or self._concurrency_limiters is None:
+            return
+        exception = future.exception()
+        latency = None if not exception and isinstance(future.result(), TaskRetry) else time.monotonic() - item.submitted_at
+        self._concurrency_limiters.release(key, latency, succeeded=not exception)
+        blocked = self._blocked.get(key)
+        for _ in range(min(self._concurrency_limiters.get_available(key), len(blocked or ()))):
+            self._push_ready(blocked.popleft(), first=True)
+        if not blocked:
+            self._blocked.pop(key, None)
+
+    def _unblock_all(self) -> None:
+        for blocked in self._blocked.values():
+            for item in blocked:
+                item.task = replace(item.task, concurrency_key=None)
+                self._push_ready(item, first=True)
+        self._blocked.clear()
+
+    def _submit(self, executor: ThreadPoolExecutor, item: _ScheduledItem) -> None:
+        self._in_flight += 1
+        item.submitted_at = time.monotonic()
+        future = executor.submit(self._execute, item)
+        if item.kind == self._TASK:
+            self._futures[item.key] = future
+        future.add_done_callback(lambda _future: self._on_done(item, _future))
+
+    def _execute(self, item: _ScheduledItem) -> Any:
+        self._local.added_tasks = []
+        try:
+            return item.task.callable(*item.task.args)
+        finally:
+            item.added_tasks = self._local.added_tasks
+            self._local.added_tasks = None
+
+    def _on_done(self, item: _ScheduledItem, future: Future) -> None:
+        key = item.key
+        exception = future.exception()
+        if exception:
+            logger.exception(item.task.error_msg, exc_info=exception)
+        with self._condition:
+            self._in_flight -= 1
+            if item.added_tasks:
+                self._add_tasks(item.added_tasks)
+            self._release(item, future)
+            if item.kind in (self._TASK, self._SUB_TASK) and not exception and isinstance(future.result(), TaskRetry):
+                self._push_delayed(item, future.result())
+            elif item.kind == self._TASK:
+                result = None if exception else future.result()
+                if isinstance(result, TaskFanOut):
+                    self._fan_out(key, result)
+                else:
+                    self._finish(key)
+            elif item.kind == self._SUB_TASK:
+                self._sub_tasks_results[key][item.index] = None if exception else future.result()
+                self._remaining_sub_tasks[key] -= 1
+                if self._waiting_sub_tasks[key]:
+                    self._push_ready(self._waiting_sub_tasks[key].popleft(), first=True)
+                if self._remaining_sub_tasks[key] == 0:
+                    self._complete_fan_out(key)
+            else:
+                self._finish(key)
+            self._condition.notify()
 
-            concurrent.futures.wait([response[0] for response in tasks_responses], timeout=timeout, return_when=ALL_COMPLETED)
+    def _fan_out(self, key: Hashable, fan_out: TaskFanOut) -> None:
+        self._fan_outs[key] = fan_out
+        self._sub_tasks_results[key] = [None] * len(fan_out.tasks)
+        self._remaining_sub_tasks[key] = len(fan_out.tasks)
+        sub_tasks = collections.deque(_ScheduledItem(key, self._SUB_TASK, task, index) for index, task in enumerate(fan_out.tasks))
+        self._waiting_sub_tasks[key] = sub_tasks
+        if not sub_tasks:
+            self._complete_fan_out(key)
+            return
+        parallel = min(fan_out.max_parallel or len(sub_tasks), len(sub_tasks))
+        # Sub tasks go to the front of their group, so started tasks finish (and release their dependents) as early as possible
+        for item in reversed([sub_tasks.popleft() for _ in range(parallel)]):
+            self._push_ready(item, first=True)
 
-        timeout_tasks = [response for response in tasks_responses if response[0].running()]
-        for timeout_task in timeout_tasks:
-            logger.exception(timeout_task[2])
-        failed_tasks = [response for response in tasks_responses if response[0].exception()]
-        for failed_task in failed_tasks:
-            logger.exception(failed_task[1], exc_info=failed_task[0].exception())
+    def _complete_fan_out(self, key: Hashable) -> None:
+        fan_out = self._fan_outs.pop(key)
+        results = self._sub_tasks_results.pop(key)
+        del self._remaining_sub_tasks[key]
+        del self._waiting_sub_tasks[key]
+        if fan_out.on_complete:
+            on_complete = ThreadedFunctionData(fan_out.on_complete, (results,), self._tasks[key].error_msg)
+            self._push_ready(_ScheduledItem(key, self._ON_COMPLETE, on_complete), first=True)
+        else:
+            self._finish(key)
 
-    return tasks_responses
+    def _finish(self, key: Hashable) -> None:
+        self._pending -= 1
+        self._finished.add(key)
+        for dependent in self._dependents.get(key, []):
+            dependencies = self._dependencies[dependent]
+            if key in dependencies:
+                dependencies.discard(key)
+                if not dependencies:
+                    self._push_ready(_ScheduledItem(dependent, self._TASK, self._tasks[dependent]))
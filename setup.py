@@ -31,6 +31,9 @@ setup(
     include_package_data=True,
     keywords=['cloud', 'aws', 'azure', 'scan'],
     install_requires=requirements,
+    extras_require={
+        'fast-json': ['orjson>=3.4.0']
+    },
     entry_points={
         'console_scripts': [f'{project_name}=dragoneye.scan:safe_cli_entry_point']
     },
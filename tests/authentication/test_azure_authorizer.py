@@ -28,6 +28,18 @@ class TestAzureAuthorizer(unittest.TestCase):
         # Assert
         self.assertEqual(token, 'Bearer the_token')
 
+    def test_get_authorization_token_without_subscription_ok(self):
+        # Arrange
+        response_text = '{ "access_token": "the_token" }'
+        when(requests).post(url=ANY, data=ANY).thenReturn(mock({'status_code': 200, 'text': response_text}))
+        when(dragoneye.cloud_scanner.azure.azure_authorizer).invoke_get_request('https://management.azure.com/subscriptions?api-version=2020-01-01',
+                                                                                 {'Authorization': 'Bearer the_token'}). \
+            thenReturn(mock({'status_code': 200, 'text': '{}'}))
+        # Act
+        token = AzureAuthorizer.get_authorization_token(None, str(uuid.uuid4()), str(uuid.uuid4()), 'client_secret')
+        # Assert
+        self.assertEqual(token, 'Bearer the_token')
+
     def test_get_authorization_token_from_credentials_error(self):
         # Arrange
         response_text = '{ "error": "the error message" }'
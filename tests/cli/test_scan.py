@@ -1,3 +1,4 @@
+import json
 import os
 import shutil
 import unittest
@@ -57,6 +58,20 @@ class TestScan(unittest.TestCase):
         self.assertEqual(result.exit_code, 0)
         self.assertTrue('/path/to/results' in result.output)
 
+    @patch.object(AzureAuthorizer, 'get_authorization_token')
+    def test_azure_tenant_ok(self, mock_azure_authorizer):
+        # Arrange
+        mock_azure_authorizer.return_value = 'token'
+        when(dragoneye.cloud_scanner.azure.azure_tenant_scanner.AzureTenantScanner).scan().thenReturn('/path/to/results')
+        # Act
+        result = self.runner.invoke(scan_cli, ['azure-tenant',
+                                               os.path.join(self._current_dir(), 'resources', 'azure_commands_example.yaml'),
+                                               '--subscription-ids', f'{uuid.uuid4()},{uuid.uuid4()}',
+                                               '--max-parallel-subscriptions', '2'])
+        # Assert
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue('/path/to/results' in result.output)
+
     def test_azure_invalid_subscription_id(self):
         # Act
         result = self.runner.invoke(scan_cli, ['azure',
@@ -128,6 +143,19 @@ class TestScan(unittest.TestCase):
         self.assertEqual(result.exit_code, 0)
         self.assertTrue('/path/to/results' in result.output)
 
+    @patch.object(AwsSessionFactory, 'get_session')
+    def test_aws_org_ok(self, mock_aws_session_factory):
+        # Arrange
+        mock_aws_session_factory.return_value = mock({'region_name': 'us-east-1'})
+        when(dragoneye.cloud_scanner.aws.aws_organization_scanner.AwsOrganizationScanner).scan().thenReturn('/path/to/results')
+        # Act
+        result = self.runner.invoke(scan_cli, ['aws-org', os.path.join(self._current_dir(), 'resources', 'aws_commands_example.yaml'),
+                                               '--accounts', '111111111111,arn:aws:iam::222222222222:role/ScanRole',
+                                               '--max-parallel-accounts', '5'])
+        # Assert
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue('/path/to/results' in result.output)
+
     def test_aws_invalid_scan_commands_path(self):
         # Act
         result = self.runner.invoke(scan_cli, ['aws', os.path.join(self._current_dir(), 'non-existing-file.yaml')])
@@ -135,6 +163,19 @@ class TestScan(unittest.TestCase):
         self.assertEqual(result.exit_code, 1)
         self._assert_invalid_scan_commands_path_exception(result.exception, ['Could not find file: ', 'non-existing-file.yaml'])
 
+    @patch.object(GcpCredentialsFactory, 'get_default_credentials')
+    def test_gcp_org_ok(self, mock_gcp_credentials_factory):
+        # Arrange
+        mock_gcp_credentials_factory.return_value = mock()
+        when(dragoneye.cloud_scanner.gcp.gcp_organization_scanner.GcpOrganizationScanner).scan().thenReturn('/path/to/results')
+        # Act
+        result = self.runner.invoke(scan_cli, ['gcp-org',
+                                               os.path.join(self._current_dir(), 'resources', 'gcp_commands_example.yaml'),
+                                               '--parent', 'organizations/123'])
+        # Assert
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue('/path/to/results' in result.output)
+
     @patch.object(GcpCredentialsFactory, 'from_service_account_file')
     def test_gcp_ok_with_credentials(self, mock_azure_authorizer):
         # Arrange
@@ -163,6 +204,15 @@ class TestScan(unittest.TestCase):
         self.assertEqual(result.exit_code, 0)
         self.assertTrue('/path/to/results' in result.output)
 
+    def test_plan_ok(self):
+        # Act
+        result = self.runner.invoke(scan_cli, ['plan', 'gcp',
+                                               os.path.join(self._current_dir(), 'resources', 'gcp_commands_example.yaml'),
+                                               '--json'])
+        # Assert
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(json.loads(result.output)['critical_path'], ['compute-v1-zones-list'])
+
     @patch.object(GcpCredentialsFactory, 'get_default_credentials')
     def test_gcp_invalid_scan_commands_path(self, mock_azure_authorizer):
         # Arrange
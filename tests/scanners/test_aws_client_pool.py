@@ -0,0 +1,48 @@
+import threading
+import unittest
+
+from botocore.config import Config
+from mockito import when, unstub, mock, verify
+
+from dragoneye.cloud_scanner.aws.aws_client_pool import AwsClientPool
+
+
+class TestAwsClientPool(unittest.TestCase):
+    def setUp(self) -> None:
+        self.session = mock()
+        self.config = Config()
+        self.ec2_client = mock()
+        self.s3_client = mock()
+        when(self.session).client('ec2', region_name='us-east-1', config=self.config).thenReturn(self.ec2_client)
+        when(self.session).client('s3', region_name='us-east-1', config=self.config).thenReturn(self.s3_client)
+        self.client_pool = AwsClientPool(self.session, self.config)
+
+    def tearDown(self) -> None:
+        unstub()
+
+    def test_get_client_creates_client_once(self):
+        # Act
+        first_client = self.client_pool.get_client('ec2', 'us-east-1')
+        second_client = self.client_pool.get_client('ec2', 'us-east-1')
+        other_client = self.client_pool.get_client('s3', 'us-east-1')
+
+        # Assert
+        self.assertIs(first_client, self.ec2_client)
+        self.assertIs(second_client, self.ec2_client)
+        self.assertIs(other_client, self.s3_client)
+        verify(self.session, times=1).client('ec2', region_name='us-east-1', config=self.config)
+        self.assertDictEqual(self.client_pool.get_stats(), {'clients': 2, 'hits': 1, 'misses': 2})
+
+    def test_get_client_from_multiple_threads(self):
+        # Arrange
+        threads = [threading.Thread(target=self.client_pool.get_client, args=('ec2', 'us-east-1')) for _ in range(20)]
+
+        # Act
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Assert
+        verify(self.session, times=1).client('ec2', region_name='us-east-1', config=self.config)
+        self.assertDictEqual(self.client_pool.get_stats(), {'clients': 1, 'hits': 19, 'misses': 1})
@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import ANY
+
+from mockito import when, unstub, mock, verify
+
+from dragoneye.cloud_scanner.aws.aws_organization_scanner import AwsOrganizationScanner
+from dragoneye.cloud_scanner.aws.aws_scan_settings import AwsOrganizationScanSettings
+from dragoneye.cloud_scanner.aws.aws_session_factory import AwsSessionFactory
+from dragoneye.dragoneye_exception import DragoneyeException
+
+
+class TestAwsOrganizationScanner(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.settings = AwsOrganizationScanSettings(
+            commands_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', 'aws_scan_commands.yaml'),
+            should_clean_before_scan=False,
+            output_path=self.temp_dir.name,
+            default_region='us-east-1',
+            max_parallel_accounts=1
+        )
+        self.session = self._mock_account_session()
+        sts_client = mock()
+        when(sts_client).get_caller_identity().thenReturn({'Account': '111111111111'})
+        when(self.session).client('sts').thenReturn(sts_client)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+        unstub()
+
+    @staticmethod
+    def _mock_account_session():
+        session = mock({'region_name': 'us-east-1'})
+        ec2_client = mock()
+        when(ec2_client).describe_regions().thenReturn({'Regions': [{'RegionName': 'us-east-1'}]})
+        handler = mock({'meta': mock({'service_model': mock({'service_name': 'serviceName'}), 'events': mock()})})
+        when(handler).can_paginate(ANY).thenReturn(False)
+        when(handler).request1().thenReturn({'Items': [{'Key1': 'Value1', 'Key2': 'Value2'}]})
+        when(handler).request2(Key1='Value1').thenReturn({'Items': []})
+        when(handler).request3(Key1='Value1', Key2='Value2').thenReturn({'Items': []})
+        when(session).get_available_regions(ANY).thenReturn(['us-east-1'])
+        when(session).client('ec2', region_name='us-east-1').thenReturn(ec2_client)
+        when(session).client(ANY, region_name='us-east-1', config=ANY).thenReturn(handler)
+        return session
+
+    def _assert_account_scanned(self, output_path: str, account_id: str):
+        account_data_dir = os.path.join(output_path, account_id)
+        self.assertTrue(os.path.isfile(os.path.join(account_data_dir, 'describe-regions.json')))
+        self.assertTrue(os.path.isfile(os.path.join(account_data_dir, 'us-east-1', 'service1-request1.json')))
+        self.assertTrue(os.path.isfile(os.path.join(account_data_dir, 'us-east-1', 'service1-request2', 'Key1-Value1.json')))
+        self.assertTrue(os.path.isfile(os.path.join(account_data_dir, 'us-east-1', 'service2-request3', 'Key1-Value1_Key2-Value2.json')))
+        self.assertTrue(os.path.isfile(os.path.join(account_data_dir, 'failures-report.json')))
+
+    def test_scan_accounts(self):
+        # Arrange
+        self.settings.accounts = ['111111111111', 'arn:aws:iam::222222222222:role/ScanRole', '333333333333']
+        when(AwsSessionFactory).get_session_using_assume_role('arn:aws:iam::222222222222:role/ScanRole', None, 'us-east-1',
+                                                              source_session=self.session).thenReturn(self._mock_account_session())
+        when(AwsSessionFactory).get_session_using_assume_role('arn:aws:iam::333333333333:role/OrganizationAccountAccessRole', None, 'us-east-1',
+                                                              source_session=self.session).thenRaise(DragoneyeException('Access denied'))
+
+        # Act
+        output_path = AwsOrganizationScanner(self.session, self.settings).scan()
+
+        # Assert
+        self.assertEqual(output_path, os.path.abspath(os.path.join(self.temp_dir.name, 'account-data')))
+        self._assert_account_scanned(output_path, '111111111111')
+        self._assert_account_scanned(output_path, '222222222222')
+        self.assertFalse(os.path.isdir(os.path.join(output_path, '333333333333')))
+        with open(os.path.join(output_path, 'failures-report.json')) as failures_file:
+            self.assertEqual(json.load(failures_file), [{'account': '333333333333', 'exception': 'Access denied'}])
+
+    def test_scan_discovers_active_accounts(self):
+        # Arrange
+        self.settings.max_parallel_accounts = 2
+        organizations_client = mock()
+        paginator = mock()
+        when(self.session).client('organizations').thenReturn(organizations_client)
+        when(organizations_client).get_paginator('list_accounts').thenReturn(paginator)
+        when(paginator).paginate().thenReturn([
+            {'Accounts': [{'Id': '111111111111', 'Status': 'ACTIVE'}, {'Id': '222222222222', 'Status': 'ACTIVE'}]},
+            {'Accounts': [{'Id': '333333333333', 'Status': 'SUSPENDED'}, {'Id': '444444444444', 'Status': 'ACTIVE'}]}
+        ])
+        for account_id in ('222222222222', '444444444444'):
+            when(AwsSessionFactory).get_session_using_assume_role(f'arn:aws:iam::{account_id}:role/OrganizationAccountAccessRole', None, 'us-east-1',
+                                                                  source_session=self.session).thenReturn(self._mock_account_session())
+
+        # Act
+        output_path = AwsOrganizationScanner(self.session, self.settings).scan()
+
+        # Assert
+        for account_id in ('111111111111', '222222222222', '444444444444'):
+            self._assert_account_scanned(output_path, account_id)
+        self.assertFalse(os.path.isdir(os.path.join(output_path, '333333333333')))
+        verify(AwsSessionFactory, times=2).get_session_using_assume_role(...)
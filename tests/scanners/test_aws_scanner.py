@@ -10,6 +10,7 @@ from mockito import when, unstub, mock
 import dragoneye
 from dragoneye.cloud_scanner.aws.aws_scanner import AwsScanner, AwsCloudScanSettings
 from dragoneye.utils.misc_utils import init_directory, make_directory
+from dragoneye.utils.result_writer import ResultWriter
 
 
 class TestAwsScanner(unittest.TestCase):
@@ -45,7 +46,7 @@ class TestAwsScanner(unittest.TestCase):
         self.regions = ['us-east-1', 'eu-west-1']
         self.scanner = AwsScanner(self.session, self.aws_settings)
         self.handler_config = self.scanner.handler_config
-        self.mock_handler = mock({'meta': mock({'service_model': mock({'service_name': 'serviceName'})})})
+        self.mock_handler = mock({'meta': mock({'service_model': mock({'service_name': 'serviceName'}), 'events': mock()})})
 
         when(self.mock_handler).can_paginate(ANY).thenReturn(False)
 
@@ -96,6 +97,50 @@ class TestAwsScanner(unittest.TestCase):
                 results = json.load(result_file)
                 self.assertEqual(request3_response, results)
 
+    def test_scan_exports_metrics(self):
+        # Arrange
+        when(self.mock_handler).request1().thenReturn({'Items': [{'Key1': 'Value1', 'Key2': 'Value2'}]})
+        when(self.mock_handler).request2(Key1='Value1').thenReturn({'Items': []})
+        when(self.mock_handler).request3(Key1='Value1', Key2='Value2').thenReturn({'Items': []})
+
+        # Act
+        output_path = self.scanner.scan()
+
+        # Assert
+        with open(os.path.join(output_path, 'metrics.json'), 'r') as metrics_file:
+            metrics = json.load(metrics_file)
+        self.assertEqual(metrics['totals']['calls'], 6)
+        self.assertEqual(metrics['totals']['pages'], 6)
+        self.assertEqual(metrics['totals']['errors'], 0)
+        self.assertGreater(metrics['totals']['bytes_written'], 0)
+        self.assertEqual({(call['provider'], call['account'], call['service'], call['region']) for call in metrics['calls']},
+                         {('aws', self.account_name, 'serviceName', region) for region in self.regions})
+        self.assertTrue(os.path.isfile(os.path.join(output_path, 'metrics.prom')))
+
+    def test_scan_writes_run_log_and_report(self):
+        # Arrange
+        when(self.mock_handler).request1().thenReturn({'Items': [{'Key1': 'Value1', 'Key2': 'Value2'}]})
+        when(self.mock_handler).request2(Key1='Value1').thenReturn({'Items': []})
+        when(self.mock_handler).request3(Key1='Value1', Key2='Value2').thenReturn({'Items': []})
+
+        # Act
+        output_path = self.scanner.scan()
+
+        # Assert
+        with open(os.path.join(output_path, self.account_name, 'run-log.jsonl'), 'r') as run_log_file:
+            records = [json.loads(line) for line in run_log_file]
+        calls = [record for record in records if 'call' in record]
+        self.assertEqual(len(calls), 6)
+        self.assertIn({'command': 'serviceName.request1', 'region': 'eu-west-1', 'status': 'ok', 'pages': 1, 'output': 'eu-west-1/service1-request1.json'},
+                      [{key: call[key] for key in ('command', 'region', 'status', 'pages', 'output')} for call in calls])
+        self.assertEqual(len([record for record in records if 'bytes' in record]), 6)
+        with open(os.path.join(output_path, 'run-report.json'), 'r') as run_report_file:
+            run_report = json.load(run_report_file)
+        self.assertEqual(run_report['calls'], 6)
+        self.assertEqual({command['command'] for command in run_report['commands']},
+                         {'serviceName.request1', 'serviceName.request2', 'serviceName.request3'})
+        self.assertEqual(len(run_report['slowest_calls']), 6)
+
     def test_scan_file_created_on_available_regions(self):
         # Arrange
         request1_response = {'Items': []}
@@ -158,9 +203,8 @@ class TestAwsScanner(unittest.TestCase):
         self.assertTrue(os.path.isfile(os.path.join(account_data_dir, self.regions[0], 'service1-request1.json')))
         self.assertFalse(os.path.isfile(os.path.join(account_data_dir, self.regions[1], 'service1-request1.json')))
 
-    @patch('dragoneye.cloud_scanner.aws.aws_scanner.time.sleep')
     @patch('logging.Logger.warning')
-    def test_scan_command_check_fails(self, patched_logger, unused_patch_sleep):
+    def test_scan_command_check_fails(self, patched_logger):
         # Arrange
         self.aws_settings.regions_filter = self.regions[0]
         scan_command = [{
@@ -169,7 +213,9 @@ class TestAwsScanner(unittest.TestCase):
             'Check': [{
                 'Name': 'FieldName',
                 'Value': 'FieldValue'
-            }]}]
+            }],
+            'CheckInterval': 0.01,
+            'CheckTimeout': 0.05}]
         when(dragoneye.cloud_scanner.base_cloud_scanner).load_yaml(self.aws_settings.commands_path).thenReturn(scan_command)
         when(self.mock_handler).request1().thenReturn({'FieldName': 'UnmatchedFieldValue'})
 
@@ -182,6 +228,28 @@ class TestAwsScanner(unittest.TestCase):
         self.assertIn('serviceName.request1({}): One of the following checks has repeatedly failed: FieldName=FieldValue', call_args)
         self._assert_failures_report_file(result_path, {'service': 'serviceName', 'action': 'request1', 'region': 'us-east-1', 'parameters': {},
                                                         'exception': 'One of the following checks has repeatedly failed: FieldName=FieldValue'})
+        # The polls that did not pass the check are not failures, but the last one is, in the metrics as in the failures report
+        with open(os.path.join(result_path, 'metrics.json'), 'r') as metrics_file:
+            metrics = json.load(metrics_file)
+        self.assertEqual(metrics['totals']['errors'], 1)
+        self.assertGreater(metrics['totals']['calls'], 1)
+
+    def test_scan_failed_write_is_in_report_file(self):
+        # Arrange
+        self.aws_settings.regions_filter = self.regions[0]
+        scan_command = [{'Service': 'service1', 'Request': 'request1'}]
+        when(dragoneye.cloud_scanner.base_cloud_scanner).load_yaml(self.aws_settings.commands_path).thenReturn(scan_command)
+        when(self.mock_handler).request1().thenReturn({'Items': []})
+        when(dragoneye.utils.result_writer).dump_to_file(ANY, ANY, ANY, ANY).thenRaise(OSError('No space left on device'))
+
+        # Act
+        result_path = self.scanner.scan()
+
+        # Assert
+        self._assert_failures_report_file(result_path, {'service': 'serviceName', 'action': 'request1', 'region': 'us-east-1', 'parameters': {},
+                                                        'exception': 'No space left on device'})
+        output_file = os.path.join(result_path, self.account_name, self.regions[0], 'service1-request1.json')
+        self.assertFalse(self.scanner.journal.is_completed(output_file))
 
     def _assert_failures_report_file(self, result_path, failure):
         with open(os.path.join(result_path, 'failures-report.json')) as failures_file:
@@ -210,3 +278,302 @@ class TestAwsScanner(unittest.TestCase):
         if patched_logger.called:
             call_args = '\n'.join(str(arg) for arg in patched_logger.call_args)
             self.assertNotIn('serviceName.request1({}): One of the following checks has repeatedly failed: FieldName=FieldValue', call_args)
+
+    @patch('dragoneye.cloud_scanner.aws.aws_scanner.time.sleep')
+    def test_scan_command_check_is_polled_without_sleeping(self, patched_sleep):
+        # Arrange
+        self.aws_settings.regions_filter = self.regions[0]
+        scan_command = [{
+            'Service': 'service1',
+            'Request': 'request1',
+            'Check': [{
+                'Name': 'State',
+                'Value': 'COMPLETE'
+            }],
+            'CheckInterval': 0.01}]
+        when(dragoneye.cloud_scanner.base_cloud_scanner).load_yaml(self.aws_settings.commands_path).thenReturn(scan_command)
+        when(self.mock_handler).request1().thenReturn({'State': 'STARTED'}).thenReturn({'State': 'STARTED'}).thenReturn({'State': 'COMPLETE'})
+
+        # Act
+        output_path = self.scanner.scan()
+
+        # Assert
+        with open(os.path.join(output_path, self.account_name, self.regions[0], 'service1-request1.json')) as result_file:
+            self.assertEqual(json.load(result_file), {'State': 'COMPLETE'})
+        self.assertFalse(patched_sleep.called)
+
+    @patch('dragoneye.utils.boto_backoff.time.sleep')
+    def test_scan_throttled_request_is_queued_again(self, patched_sleep):
+        # Arrange
+        self.aws_settings.regions_filter = self.regions[0]
+        scan_command = [{'Service': 'service1', 'Request': 'request1'}]
+        throttling_error = ClientError({'Error': {'Code': 'Throttling', 'Message': 'Rate exceeded'}}, 'operation_name')
+        when(dragoneye.cloud_scanner.base_cloud_scanner).load_yaml(self.aws_settings.commands_path).thenReturn(scan_command)
+        when(self.mock_handler).request1().thenRaise(throttling_error).thenRaise(throttling_error).thenReturn({'Items': []})
+
+        # Act
+        output_path = self.scanner.scan()
+
+        # Assert
+        self.assertTrue(os.path.isfile(os.path.join(output_path, self.account_name, self.regions[0], 'service1-request1.json')))
+        self.assertFalse(patched_sleep.called)
+        self.assertLess(self.scanner.rate_limiters.get_bucket(('serviceName', self.regions[0], 'request1')).rate,
+                        self.aws_settings.max_requests_per_second)
+
+    @patch('dragoneye.utils.boto_backoff.time.sleep')
+    def test_scan_request_limit_exceeded_is_queued_again(self, patched_sleep):
+        self._assert_throttled_request_is_queued_again('RequestLimitExceeded', patched_sleep)
+
+    @patch('dragoneye.utils.boto_backoff.time.sleep')
+    def test_scan_provisioned_throughput_exceeded_is_queued_again(self, patched_sleep):
+        self._assert_throttled_request_is_queued_again('ProvisionedThroughputExceededException', patched_sleep)
+
+    def _assert_throttled_request_is_queued_again(self, error_code, patched_sleep):
+        # Arrange
+        self.aws_settings.regions_filter = self.regions[0]
+        scan_command = [{'Service': 'service1', 'Request': 'request1'}]
+        throttling_error = ClientError({'Error': {'Code': error_code, 'Message': 'Msg'}}, 'operation_name')
+        when(dragoneye.cloud_scanner.base_cloud_scanner).load_yaml(self.aws_settings.commands_path).thenReturn(scan_command)
+        when(self.mock_handler).request1().thenRaise(throttling_error).thenReturn({'Items': []})
+
+        # Act
+        output_path = self.scanner.scan()
+
+        # Assert
+        self.assertTrue(os.path.isfile(os.path.join(output_path, self.account_name, self.regions[0], 'service1-request1.json')))
+        self.assertFalse(patched_sleep.called)
+        self.assertLess(self.scanner.rate_limiters.get_bucket(('serviceName', self.regions[0], 'request1')).rate,
+                        self.aws_settings.max_requests_per_second)
+
+    @patch('logging.Logger.warning')
+    def test_scan_throttled_request_gives_up(self, patched_logger):
+        # Arrange
+        self.aws_settings.regions_filter = self.regions[0]
+        self.aws_settings.max_attempts = 2
+        scan_command = [{'Service': 'service1', 'Request': 'request1'}]
+        when(dragoneye.cloud_scanner.base_cloud_scanner).load_yaml(self.aws_settings.commands_path).thenReturn(scan_command)
+        when(self.mock_handler).request1().thenRaise(ClientError({'Error': {'Code': 'Throttling', 'Message': 'Msg'}}, 'operation_name'))
+
+        # Act
+        output_path = self.scanner.scan()
+
+        # Assert
+        call_args = '\n'.join(str(call) for call in patched_logger.call_args_list)
+        self.assertIn('Throttling error on serviceName.request1() on attempt #2/2', call_args)
+        self.assertFalse(os.path.isfile(os.path.join(output_path, self.account_name, self.regions[0], 'service1-request1.json')))
+
+    def test_scan_resume_skips_completed_calls(self):
+        # Arrange
+        self.aws_settings.regions_filter = self.regions[0]
+        scan_command = [{'Service': 'service1', 'Request': 'request1'}, {'Service': 'service1', 'Request': 'request2'}]
+        when(dragoneye.cloud_scanner.base_cloud_scanner).load_yaml(self.aws_settings.commands_path).thenReturn(scan_command)
+        when(self.mock_handler).request1().thenReturn({'Items': ['first scan']}).thenReturn({'Items': ['second scan']})
+        when(self.mock_handler).request2().thenRaise(Exception('interrupted')).thenReturn({'Items': ['second scan']})
+        output_path = self.scanner.scan()
+        region_dir = os.path.join(output_path, self.account_name, self.regions[0])
+        # A file that the journal does not record, such as one that was left by an interrupted scan, is fetched again
+        with open(os.path.join(region_dir, 'service1-request2.json'), 'w') as result_file:
+            result_file.write('{"Items": [')
+
+        # Act
+        self.aws_settings.resume = True
+        self.aws_settings.clean = True
+        self.scanner.scan()
+
+        # Assert
+        with open(os.path.join(region_dir, 'service1-request1.json')) as result_file:
+            self.assertEqual(json.load(result_file), {'Items': ['first scan']})
+        with open(os.path.join(region_dir, 'service1-request2.json')) as result_file:
+            self.assertEqual(json.load(result_file), {'Items': ['second scan']})
+
+    def test_scan_refresh_fetches_stale_results_and_changed_dependents(self):
+        self._test_scan_refresh_fetches_stale_results_and_changed_dependents()
+
+    def test_scan_refresh_with_writer_processes_fetches_changed_dependents(self):
+        # The results are written by other processes, so the dependents must not check for changes before the journal records them
+        self.scanner.result_writer = ResultWriter(processes=2)
+        self._test_scan_refresh_fetches_stale_results_and_changed_dependents()
+
+    def _test_scan_refresh_fetches_stale_results_and_changed_dependents(self):
+        # Arrange
+        self.aws_settings.regions_filter = self.regions[0]
+        scan_command = [
+            {'Service': 'service1', 'Request': 'request1', 'Ttl': 3600},
+            {'Service': 'service1', 'Request': 'request2'},
+            {'Service': 'service1', 'Request': 'request3', 'Ttl': 3600,
+             'Parameters': [{'Name': 'Key1', 'Value': 'service1-request2.json|.Items[].Key1'}]},
+        ]
+        when(dragoneye.cloud_scanner.base_cloud_scanner).load_yaml(self.aws_settings.commands_path).thenReturn(scan_command)
+        when(self.mock_handler).request1().thenReturn({'Items': ['first scan']}).thenReturn({'Items': ['refresh']})
+        when(self.mock_handler).request2() \
+            .thenReturn({'Items': [{'Key1': 'Value1'}]}) \
+            .thenReturn({'Items': [{'Key1': 'Value1', 'Key2': 'Value2'}]}) \
+            .thenReturn({'Items': [{'Key1': 'Value1', 'Key2': 'Value2'}]})
+        when(self.mock_handler).request3(Key1='Value1') \
+            .thenReturn({'Items': ['first scan']}) \
+            .thenReturn({'Items': ['first refresh']}) \
+            .thenReturn({'Items': ['second refresh']})
+        output_path = self.scanner.scan()
+        region_dir = os.path.join(output_path, self.account_name, self.regions[0])
+        self.aws_settings.refresh = True
+
+        def read_result(relative_path: str) -> dict:
+            with open(os.path.join(region_dir, relative_path)) as result_file:
+                return json.load(result_file)
+
+        # Act
+        self.scanner.scan()
+        first_refresh_results = (read_result('service1-request1.json'), read_result(os.path.join('service1-request3', 'Key1-Value1.json')))
+        self.scanner.scan()
+        second_refresh_results = (read_result('service1-request1.json'), read_result(os.path.join('service1-request3', 'Key1-Value1.json')))
+
+        # Assert
+        # request1 is fresh, request2 has no Ttl, and request3 is fetched again only when the result of request2 changes
+        self.assertEqual(first_refresh_results, ({'Items': ['first scan']}, {'Items': ['first refresh']}))
+        self.assertEqual(second_refresh_results, ({'Items': ['first scan']}, {'Items': ['first refresh']}))
+        self.assertEqual(read_result('service1-request2.json'), {'Items': [{'Key1': 'Value1', 'Key2': 'Value2'}]})
+
+    def test_scan_stream_results_paginated_request(self):
+        # Arrange
+        self.aws_settings.regions_filter = self.regions[0]
+        self.aws_settings.stream_results = True
+        scan_command = [{'Service': 'service1', 'Request': 'request1'}]
+        pages = [
+            {'Items': [{'Key1': 'Value1'}], 'Marker': 'marker', 'ResponseMetadata': {'RequestId': '1'}},
+            {'Items': [{'Key1': 'Value2'}, {'Key1': 'Value3'}], 'ResponseMetadata': {'RequestId': '2'}}
+        ]
+        paginator = mock()
+        when(dragoneye.cloud_scanner.base_cloud_scanner).load_yaml(self.aws_settings.commands_path).thenReturn(scan_command)
+        when(self.mock_handler).can_paginate('request1').thenReturn(True)
+        when(self.mock_handler).get_paginator('request1').thenReturn(paginator)
+        when(paginator).paginate().thenReturn(iter(pages))
+
+        # Act
+        output_path = self.scanner.scan()
+
+        # Assert
+        with open(os.path.join(output_path, self.account_name, self.regions[0], 'service1-request1.json'), 'r') as result_file:
+            self.assertEqual(json.dumps({'Items': [{'Key1': 'Value1'}, {'Key1': 'Value2'}, {'Key1': 'Value3'}]}, indent=4, sort_keys=True),
+                             result_file.read())
+
+    def test_scan_deadline_saves_partial_results_of_paginated_request(self):
+        # Arrange
+        self.aws_settings.regions_filter = self.regions[0]
+        scan_command = [{'Service': 'service1', 'Request': 'request1'}]
+        paginator = mock()
+
+        def paginate():
+            # The scan is cancelled while the first page is fetched, so the second page is never requested
+            self.scanner.deadline.cancel()
+            yield {'Items': [{'Key1': 'Value1'}], 'Marker': 'marker', 'ResponseMetadata': {'RequestId': '1'}}
+            yield {'Items': [{'Key1': 'Value2'}], 'ResponseMetadata': {'RequestId': '2'}}
+
+        when(dragoneye.cloud_scanner.base_cloud_scanner).load_yaml(self.aws_settings.commands_path).thenReturn(scan_command)
+        when(self.mock_handler).can_paginate('request1').thenReturn(True)
+        when(self.mock_handler).get_paginator('request1').thenReturn(paginator)
+        when(paginator).paginate().thenReturn(paginate())
+
+        # Act
+        output_path = self.scanner.scan()
+
+        # Assert
+        with open(os.path.join(output_path, self.account_name, self.regions[0], 'service1-request1.json'), 'r') as result_file:
+            self.assertEqual(json.load(result_file), {'Items': [{'Key1': 'Value1'}]})
+        with open(os.path.join(output_path, 'cut-offs-report.json'), 'r') as cut_offs_file:
+            cut_offs = json.load(cut_offs_file)
+        self.assertEqual(cut_offs, [{'command': 'serviceName.request1', 'region': self.regions[0], 'call': 'serviceName.request1()', 'pages': 1,
+                                     'output': os.path.join(self.regions[0], 'service1-request1.json'), 'cut_off': 'scan cancellation'}])
+        self.assertFalse(self.scanner.journal.is_completed(os.path.join(output_path, self.account_name, self.regions[0], 'service1-request1.json')))
+
+    def test_scan_command_timeout_cuts_off_calls_before_they_start(self):
+        # Arrange
+        self.aws_settings.regions_filter = self.regions[0]
+        self.aws_settings.command_timeout = 0
+        scan_command = [{'Service': 'service1', 'Request': 'request1'}]
+        when(dragoneye.cloud_scanner.base_cloud_scanner).load_yaml(self.aws_settings.commands_path).thenReturn(scan_command)
+
+        # Act
+        output_path = self.scanner.scan()
+
+        # Assert
+        self.assertFalse(os.path.isfile(os.path.join(output_path, self.account_name, self.regions[0], 'service1-request1.json')))
+        with open(os.path.join(output_path, 'cut-offs-report.json'), 'r') as cut_offs_file:
+            cut_offs = json.load(cut_offs_file)
+        self.assertEqual([(cut_off['call'], cut_off['pages'], cut_off['cut_off']) for cut_off in cut_offs],
+                         [('service1.request1', 0, 'command deadline')])
+
+    def test_get_commands_dependencies(self):
+        # Arrange
+        scan_commands = [
+            {'Service': 'ec2', 'Request': 'describe-vpcs'},
+            {'Service': 'ec2', 'Request': 'describe-vpc-attribute',
+             'Parameters': [{'Name': 'VpcId', 'Value': 'ec2-describe-vpcs.json|.Vpcs[].VpcId'}]},
+            {'Service': 'elbv2', 'Request': 'describe-target-groups',
+             'Parameters': [{'Name': 'VpcId', 'Value': 'ec2-describe-vpcs.json|.Vpcs[].VpcId'}]},
+            {'Service': 'elbv2', 'Request': 'describe-target-health',
+             'Parameters': [{'Name': 'TargetGroupArn', 'Value': 'elbv2-describe-target-groups/*|.TargetGroups[].TargetGroupArn'}]},
+            {'Service': 's3', 'Request': 'list-buckets'},
+        ]
+
+        # Act
+        dependencies = self.scanner._get_commands_dependencies(scan_commands)
+
+        # Assert
+        self.assertDictEqual(dependencies, {0: set(), 1: {0}, 2: {0}, 3: {2}, 4: set()})
+
+    def test_plan_service_regions(self):
+        # Arrange
+        scan_commands = [
+            {'Service': 'service1', 'Request': 'request1'},
+            {'Service': 'configservice', 'Request': 'describe-config-rules'},
+            {'Service': 's3', 'Request': 'list-buckets'},
+            {'Service': 'globalaccelerator', 'Request': 'list-accelerators'},
+            {'Service': 'eks', 'Request': 'list-clusters'},
+        ]
+        when(self.session).get_available_regions("service1").thenReturn([self.regions[1]])
+        when(self.session).get_available_regions("config").thenReturn(self.regions)
+
+        # Act
+        service_regions = self.scanner._plan_service_regions(scan_commands, self.regions)
+
+        # Assert
+        self.assertDictEqual(service_regions, {
+            ('service1', 'eu-west-1'): 'eu-west-1',
+            ('config', 'us-east-1'): 'us-east-1',
+            ('config', 'eu-west-1'): 'eu-west-1',
+            ('s3', 'us-east-1'): 'us-east-1',
+            ('globalaccelerator', 'us-east-1'): 'us-west-2',
+            ('eks', 'us-east-1'): 'us-east-1',
+            ('eks', 'eu-west-1'): 'eu-west-1',
+        })
+
+    def test_prepare_scan_adds_tasks_only_for_supported_regions(self):
+        # Arrange
+        when(self.session).get_available_regions("service1").thenReturn([self.regions[0]])
+        scheduler = mock()
+
+        # Act
+        task_keys = self.scanner.prepare_scan(scheduler)
+
+        # Assert
+        self.assertCountEqual(task_keys, [('us-east-1', 0), ('us-east-1', 1), ('us-east-1', 2), ('eu-west-1', 2)])
+
+    def test_plan_estimates_calls_from_previous_scan(self):
+        # Arrange
+        account_data_dir = init_directory(self.aws_settings.output_path, self.account_name, False)
+        with open(os.path.join(account_data_dir, 'describe-regions.json'), 'w') as regions_file:
+            json.dump({'Regions': [{'RegionName': region} for region in self.regions]}, regions_file)
+        make_directory(os.path.join(account_data_dir, self.regions[0]))
+        with open(os.path.join(account_data_dir, self.regions[0], 'service1-request1.json'), 'w') as result_file:
+            json.dump({'Items': [{'Key1': 'a', 'Key2': 'x'}, {'Key1': 'b', 'Key2': 'y'}, {'Key1': 'c', 'Key2': 'z'}]}, result_file)
+
+        # Act
+        plan = self.scanner.plan(fan_out_warning=5)
+
+        # Assert
+        self.assertListEqual([command.dependencies for command in plan.commands], [[], [0], [0]])
+        self.assertListEqual([command.get_calls(self.regions[0]) for command in plan.commands], [1, 3, 9])
+        self.assertListEqual([command.get_calls(self.regions[1]) for command in plan.commands], [1, None, None])
+        self.assertListEqual(plan.get_critical_path(), [0, 2])
+        self.assertListEqual(plan.get_warnings(), ['service2-request3 makes 9 calls in us-east-1, one for every combination of Key1 (3) x Key2 (3)'])
+        self.assertFalse(os.path.exists(os.path.join(account_data_dir, self.regions[1])))
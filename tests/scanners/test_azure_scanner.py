@@ -5,6 +5,7 @@ import unittest
 from unittest.mock import patch, ANY
 
 from dragoneye.cloud_scanner.azure.azure_scanner import AzureScanner, AzureCloudScanSettings
+from dragoneye.utils.misc_utils import init_directory
 from mockito import when, unstub, mock
 import dragoneye
 
@@ -28,7 +29,7 @@ class TestAzureScanner(unittest.TestCase):
             should_clean_before_scan=True,
             output_path=self.temp_dir.name
         )
-        when(dragoneye.cloud_scanner.azure.azure_scanner).invoke_get_request(ANY, ANY, on_giveup=ANY).\
+        when(dragoneye.cloud_scanner.azure.azure_scanner).invoke_get_request(ANY, ANY, on_backoff=ANY, on_giveup=ANY).\
             thenReturn(mock({'status_code': 200, 'text': '{}'}))
 
     def tearDown(self) -> None:
@@ -42,31 +43,31 @@ class TestAzureScanner(unittest.TestCase):
         when(dragoneye.cloud_scanner.azure.azure_scanner)\
             .invoke_get_request(
             f'https://management.azure.com/subscriptions/{self.subscription_id}/resourcegroups?api-version=2020-09-01',
-            self.auth, on_giveup=ANY) \
+            self.auth, on_backoff=ANY, on_giveup=ANY) \
             .thenReturn(mock({'status_code': 200, 'text': self.resource_groups_text}))
         ### request1, resourceGroup1
         when(dragoneye.cloud_scanner.azure.azure_scanner)\
             .invoke_get_request(
             f'https://management.azure.com/subscriptions/{self.subscription_id}/resourceGroups/{self.resource_groups[0]}/providers/Microsoft.Compute/virtualMachines?api-version=2020-12-01',
-            self.auth, on_giveup=ANY)\
+            self.auth, on_backoff=ANY, on_giveup=ANY)\
             .thenReturn(mock({'status_code': 200, 'text': json.dumps({"value": [{"id": rg_id.format(self.subscription_id, self.resource_groups[0]), "vmName": f'{self.resource_groups[0]}-vm'}]})}))
         ### request1, resourceGroup2
         when(dragoneye.cloud_scanner.azure.azure_scanner) \
             .invoke_get_request(
             f'https://management.azure.com/subscriptions/{self.subscription_id}/resourceGroups/{self.resource_groups[1]}/providers/Microsoft.Compute/virtualMachines?api-version=2020-12-01',
-            self.auth, on_giveup=ANY) \
+            self.auth, on_backoff=ANY, on_giveup=ANY) \
             .thenReturn(mock({'status_code': 200, 'text': json.dumps({"value": [{"id": rg_id.format(self.subscription_id, self.resource_groups[1]), "vmName": f'{self.resource_groups[1]}-vm'}]})}))
         ### request2, vm1
         when(dragoneye.cloud_scanner.azure.azure_scanner)\
             .invoke_get_request(
             f'https://management.azure.com/subscriptions/{self.subscription_id}/resourceGroups/{self.resource_groups[0]}/providers/Microsoft.Compute/virtualMachines/{f"{self.resource_groups[0]}-vm"}?api-version=2020-12-01',
-            self.auth, on_giveup=ANY)\
+            self.auth, on_backoff=ANY, on_giveup=ANY)\
             .thenReturn(mock({'status_code': 200, 'text': json.dumps({"value": [{"id": rg_id.format(self.subscription_id, self.resource_groups[0]), "vmName": f'{self.resource_groups[0]}-vm'}]})}))
         ### request2, vm2
         when(dragoneye.cloud_scanner.azure.azure_scanner)\
             .invoke_get_request(
             f'https://management.azure.com/subscriptions/{self.subscription_id}/resourceGroups/{self.resource_groups[1]}/providers/Microsoft.Compute/virtualMachines/{f"{self.resource_groups[1]}-vm"}?api-version=2020-12-01',
-            self.auth, on_giveup=ANY)\
+            self.auth, on_backoff=ANY, on_giveup=ANY)\
             .thenReturn(mock({'status_code': 200, 'text': json.dumps({"value": [{"id": rg_id.format(self.subscription_id, self.resource_groups[1]), "vmName": f'{self.resource_groups[1]}-vm'}]})}))
 
         # Act
@@ -107,19 +108,19 @@ class TestAzureScanner(unittest.TestCase):
         when(dragoneye.cloud_scanner.azure.azure_scanner)\
             .invoke_get_request(
             f'https://management.azure.com/subscriptions/{self.subscription_id}/resourcegroups?api-version=2020-09-01',
-            self.auth, on_giveup=ANY) \
+            self.auth, on_backoff=ANY, on_giveup=ANY) \
             .thenReturn(mock({'status_code': 200, 'text': self.resource_groups_text}))
         ### request1, resourceGroup1
         when(dragoneye.cloud_scanner.azure.azure_scanner)\
             .invoke_get_request(
             f'https://management.azure.com/subscriptions/{self.subscription_id}/resourceGroups/{self.resource_groups[0]}/providers/Microsoft.Compute/virtualMachines?api-version=2020-12-01',
-            self.auth, on_giveup=ANY)\
+            self.auth, on_backoff=ANY, on_giveup=ANY)\
             .thenReturn(mock({'status_code': 200, 'text': json.dumps({"value": []})}))
         ### request1, resourceGroup2
         when(dragoneye.cloud_scanner.azure.azure_scanner) \
             .invoke_get_request(
             f'https://management.azure.com/subscriptions/{self.subscription_id}/resourceGroups/{self.resource_groups[1]}/providers/Microsoft.Compute/virtualMachines?api-version=2020-12-01',
-            self.auth, on_giveup=ANY) \
+            self.auth, on_backoff=ANY, on_giveup=ANY) \
             .thenReturn(mock({'status_code': 200, 'text': json.dumps({"value": []})}))
 
         # Act
@@ -159,37 +160,37 @@ class TestAzureScanner(unittest.TestCase):
         when(dragoneye.cloud_scanner.azure.azure_scanner)\
             .invoke_get_request(
             f'https://management.azure.com/subscriptions/{self.subscription_id}/resourcegroups?api-version=2020-09-01',
-            self.auth, on_giveup=ANY) \
+            self.auth, on_backoff=ANY, on_giveup=ANY) \
             .thenReturn(mock({'status_code': 200, 'text': self.resource_groups_text}))
         ### request1, resourceGroup1
         when(dragoneye.cloud_scanner.azure.azure_scanner)\
             .invoke_get_request(
             f'https://management.azure.com/subscriptions/{self.subscription_id}/resourceGroups/{self.resource_groups[0]}/providers/Microsoft.Compute/virtualMachines?api-version=2020-12-01',
-            self.auth, on_giveup=ANY)\
+            self.auth, on_backoff=ANY, on_giveup=ANY)\
             .thenReturn(mock({'status_code': 200, 'text': json.dumps({"value": [{"id": rg_id.format(self.subscription_id, self.resource_groups[0]), "vmName": f'{self.resource_groups[0]}-vm'}]})}))
         ### request1, resourceGroup2
         when(dragoneye.cloud_scanner.azure.azure_scanner) \
             .invoke_get_request(
             f'https://management.azure.com/subscriptions/{self.subscription_id}/resourceGroups/{self.resource_groups[1]}/providers/Microsoft.Compute/virtualMachines?api-version=2020-12-01',
-            self.auth, on_giveup=ANY) \
+            self.auth, on_backoff=ANY, on_giveup=ANY) \
             .thenReturn(mock({'status_code': 200, 'text': json.dumps({"value": [{"id": rg_id.format(self.subscription_id, self.resource_groups[1]), "vmName": f'{self.resource_groups[1]}-vm'}]})}))
         ### request2, vm1
         when(dragoneye.cloud_scanner.azure.azure_scanner)\
             .invoke_get_request(
             f'https://management.azure.com/subscriptions/{self.subscription_id}/resourceGroups/{self.resource_groups[0]}/providers/Microsoft.Compute/virtualMachines/{f"{self.resource_groups[0]}-vm"}?api-version=2020-12-01',
-            self.auth, on_giveup=ANY)\
+            self.auth, on_backoff=ANY, on_giveup=ANY)\
             .thenReturn(mock({'status_code': 200, 'text': json.dumps({"value": [{"id": rg_id.format(self.subscription_id, self.resource_groups[0]), "vmName": f'{self.resource_groups[0]}-vm'}]})}))
         ### request2, vm2
         when(dragoneye.cloud_scanner.azure.azure_scanner)\
             .invoke_get_request(
             f'https://management.azure.com/subscriptions/{self.subscription_id}/resourceGroups/{self.resource_groups[1]}/providers/Microsoft.Compute/virtualMachines/{f"{self.resource_groups[1]}-vm"}?api-version=2020-12-01',
-            self.auth, on_giveup=ANY)\
+            self.auth, on_backoff=ANY, on_giveup=ANY)\
             .thenReturn(mock({'status_code': 200, 'text': json.dumps({"value": [{"id": rg_id.format(self.subscription_id, self.resource_groups[1]), "vmName": f'{self.resource_groups[1]}-vm'}]})}))
         ### request3
         when(dragoneye.cloud_scanner.azure.azure_scanner)\
             .invoke_get_request(
             f'https://management.azure.com/subscriptions/{self.subscription_id}/providers/Microsoft.Compute/request3?api-version=2020-12-01',
-            self.auth, on_giveup=ANY)\
+            self.auth, on_backoff=ANY, on_giveup=ANY)\
             .thenRaise(Exception('some exception'))
 
         # Act
@@ -238,20 +239,20 @@ class TestAzureScanner(unittest.TestCase):
         when(dragoneye.cloud_scanner.azure.azure_scanner) \
             .invoke_get_request(
             f'https://management.azure.com/subscriptions/{self.subscription_id}/resourcegroups?api-version=2020-09-01',
-            self.auth, on_giveup=ANY) \
+            self.auth, on_backoff=ANY, on_giveup=ANY) \
             .thenReturn(mock({'status_code': 200, 'text': self.resource_groups_text}))
         ### request1, resourceGroup1
         when(dragoneye.cloud_scanner.azure.azure_scanner) \
             .invoke_get_request(
             f'https://management.azure.com/subscriptions/{self.subscription_id}/resourceGroups/{self.resource_groups[0]}'
             f'/providers/Microsoft.Compute/virtualMachines?api-version=2020-12-01',
-            self.auth, on_giveup=ANY) \
+            self.auth, on_backoff=ANY, on_giveup=ANY) \
             .thenReturn(mock({'status_code': 500, 'content': b'{"error": {"code": 500, "message": "some message"}}'}))
         ### request3
         when(dragoneye.cloud_scanner.azure.azure_scanner) \
             .invoke_get_request(
             f'https://management.azure.com/subscriptions/{self.subscription_id}/providers/Microsoft.Compute/request3?api-version=2020-12-01',
-            self.auth, on_giveup=ANY) \
+            self.auth, on_backoff=ANY, on_giveup=ANY) \
             .thenRaise(Exception('some exception'))
 
         # Act
@@ -266,8 +267,114 @@ class TestAzureScanner(unittest.TestCase):
                                                                    '/resourceGroups/resourceGroup1/providers/Microsoft.Compute/'
                                                                    'virtualMachines?api-version=2020-12-01'})
 
+    def test_scan_merges_urls_results_in_order(self):
+        # Arrange
+        self.azure_settings.max_parallel_requests_per_command = 1
+        resource_groups = [f'resourceGroup{index}' for index in range(10)]
+        when(dragoneye.cloud_scanner.azure.azure_scanner) \
+            .invoke_get_request(
+            f'https://management.azure.com/subscriptions/{self.subscription_id}/resourcegroups?api-version=2020-09-01',
+            self.auth, on_backoff=ANY, on_giveup=ANY) \
+            .thenReturn(mock({'status_code': 200, 'text': json.dumps({'value': [{'name': name} for name in resource_groups]})}))
+        for resource_group in resource_groups:
+            when(dragoneye.cloud_scanner.azure.azure_scanner) \
+                .invoke_get_request(
+                f'https://management.azure.com/subscriptions/{self.subscription_id}/resourceGroups/{resource_group}'
+                f'/providers/Microsoft.Compute/virtualMachines?api-version=2020-12-01',
+                self.auth, on_backoff=ANY, on_giveup=ANY) \
+                .thenReturn(mock({'status_code': 200, 'text': json.dumps({'value': [{'vmName': f'{resource_group}-vm'}]})}))
+
+        # Act
+        scanner = AzureScanner(self.token, self.azure_settings)
+        output_path = scanner.scan()
+        account_data_dir = os.path.join(output_path, self.account_name)
+
+        # Assert
+        with open(os.path.join(account_data_dir, 'request1.json'), 'r') as result_file:
+            results = json.load(result_file)
+            self.assertListEqual([dic['vmName'] for dic in results['value']], [f'{name}-vm' for name in resource_groups])
+
+    def test_scan_deadline_saves_partial_results_of_command(self):
+        # Arrange
+        self.azure_settings.max_parallel_requests_per_command = 1
+        resource_groups = [f'resourceGroup{index}' for index in range(5)]
+        scanner = AzureScanner(self.token, self.azure_settings)
+        when(dragoneye.cloud_scanner.azure.azure_scanner) \
+            .invoke_get_request(
+            f'https://management.azure.com/subscriptions/{self.subscription_id}/resourcegroups?api-version=2020-09-01',
+            self.auth, on_backoff=ANY, on_giveup=ANY) \
+            .thenReturn(mock({'status_code': 200, 'text': json.dumps({'value': [{'name': name} for name in resource_groups]})}))
+
+        def invoke_vms_url(url, *_args, **_kwargs):
+            resource_group = url.split('/')[6]
+            if resource_group == resource_groups[1]:
+                # The scan is cancelled while the second url is invoked, so the remaining urls are never invoked
+                scanner.deadline.cancel()
+            return mock({'status_code': 200, 'text': json.dumps({'value': [{'vmName': f'{resource_group}-vm'}]})})
+
+        for resource_group in resource_groups:
+            when(dragoneye.cloud_scanner.azure.azure_scanner) \
+                .invoke_get_request(
+                f'https://management.azure.com/subscriptions/{self.subscription_id}/resourceGroups/{resource_group}'
+                f'/providers/Microsoft.Compute/virtualMachines?api-version=2020-12-01',
+                self.auth, on_backoff=ANY, on_giveup=ANY) \
+                .thenAnswer(invoke_vms_url)
+
+        # Act
+        output_path = scanner.scan()
+        account_data_dir = os.path.join(output_path, self.account_name)
+
+        # Assert
+        with open(os.path.join(account_data_dir, 'request1.json'), 'r') as result_file:
+            results = json.load(result_file)
+            self.assertListEqual([dic['vmName'] for dic in results['value']], [f'{name}-vm' for name in resource_groups[:2]])
+        with open(os.path.join(output_path, 'cut-offs-report.json'), 'r') as cut_offs_file:
+            cut_offs = json.load(cut_offs_file)
+        self.assertListEqual([cut_off['call'].split('/')[6] for cut_off in cut_offs if cut_off['command'] == 'microsoft.compute.request1'],
+                             resource_groups[2:])
+        self.assertFalse(scanner.journal.is_completed(os.path.join(account_data_dir, 'request1.json')))
+
+    def test_scan_timeout_keeps_resource_groups_schema(self):
+        # Arrange
+        self.azure_settings.scan_timeout = 0
+        scanner = AzureScanner(self.token, self.azure_settings)
+
+        # Act
+        output_path = scanner.scan()
+        account_data_dir = os.path.join(output_path, self.account_name)
+
+        # Assert
+        with open(os.path.join(account_data_dir, 'resource-groups.json'), 'r') as result_file:
+            self.assertEqual(json.load(result_file),
+                             {'value': [], 'urls': [f'https://management.azure.com/subscriptions/{self.subscription_id}'
+                                                    f'/resourcegroups?api-version=2020-09-01']})
+        self.assertFalse(scanner.journal.is_completed(os.path.join(account_data_dir, 'resource-groups.json')))
+
     def _assert_failures_report_file(self, result_path, failure):
         with open(os.path.join(result_path, 'failures-report.json')) as failures_file:
             failures = json.loads(failures_file.read())
             self.assertEqual(len(failures), 1)
             self.assertEqual(failures[0], failure)
+
+    def test_get_endpoint_key(self):
+        self.assertEqual(AzureScanner._get_endpoint_key(
+            'https://management.azure.com/subscriptions/sub/providers/Microsoft.Compute/virtualMachines?api-version=2020-06-01'),
+            'microsoft.compute')
+        self.assertEqual(AzureScanner._get_endpoint_key(
+            'https://management.azure.com/subscriptions/sub/resourcegroups?api-version=2020-09-01'), 'resources')
+
+    def test_plan_estimates_requests_per_resource_group(self):
+        # Arrange
+        account_data_dir = init_directory(self.azure_settings.output_path, self.account_name, False)
+        with open(os.path.join(account_data_dir, 'resource-groups.json'), 'w') as result_file:
+            result_file.write(self.resource_groups_text)
+        with open(os.path.join(account_data_dir, 'request1.json'), 'w') as result_file:
+            json.dump({'value': [{'vmName': f'vm{index}', 'resourceGroup': self.resource_groups[0]} for index in range(3)]}, result_file)
+        scanner = AzureScanner(self.token, self.azure_settings)
+
+        # Act
+        plan = scanner.plan()
+
+        # Assert
+        self.assertListEqual([command.calls for command in plan.commands], [2, 3, 1])
+        self.assertListEqual(plan.get_critical_path(), [0, 1])
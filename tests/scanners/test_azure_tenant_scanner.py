@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import ANY
+
+from mockito import when, unstub, mock
+
+import dragoneye
+from dragoneye.cloud_scanner.azure.azure_scan_settings import AzureTenantScanSettings
+from dragoneye.cloud_scanner.azure.azure_tenant_scanner import AzureTenantScanner
+
+
+class TestAzureTenantScanner(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.token = 'token'
+        self.settings = AzureTenantScanSettings(
+            commands_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', 'azure_scan_commands.yaml'),
+            should_clean_before_scan=False,
+            output_path=self.temp_dir.name,
+            max_parallel_subscriptions=1
+        )
+        when(dragoneye.cloud_scanner.azure.azure_scanner).invoke_get_request(ANY, ANY, on_backoff=ANY, on_giveup=ANY). \
+            thenReturn(mock({'status_code': 200, 'text': '{}'}))
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+        unstub()
+
+    def test_scan_discovers_enabled_subscriptions(self):
+        # Arrange
+        next_link = 'https://management.azure.com/subscriptions?api-version=2020-01-01&$skiptoken=page2'
+        when(dragoneye.cloud_scanner.azure.azure_tenant_scanner).invoke_get_request(
+            'https://management.azure.com/subscriptions?api-version=2020-01-01', {'Authorization': self.token}). \
+            thenReturn(mock({'status_code': 200, 'text': json.dumps({'value': [{'subscriptionId': 'sub1', 'state': 'Enabled'},
+                                                                                {'subscriptionId': 'sub2', 'state': 'Disabled'}],
+                                                                      'nextLink': next_link})}))
+        when(dragoneye.cloud_scanner.azure.azure_tenant_scanner).invoke_get_request(next_link, {'Authorization': self.token}). \
+            thenReturn(mock({'status_code': 200, 'text': json.dumps({'value': [{'subscriptionId': 'sub3', 'state': 'Enabled'}]})}))
+
+        # Act
+        output_path = AzureTenantScanner(self.token, self.settings).scan()
+
+        # Assert
+        for subscription_id in ('sub1', 'sub3'):
+            self.assertTrue(os.path.isfile(os.path.join(output_path, subscription_id, 'resource-groups.json')))
+            self.assertTrue(os.path.isfile(os.path.join(output_path, subscription_id, 'request3.json')))
+            self.assertTrue(os.path.isfile(os.path.join(output_path, subscription_id, 'failures-report.json')))
+        self.assertFalse(os.path.isdir(os.path.join(output_path, 'sub2')))
+        with open(os.path.join(output_path, 'failures-report.json')) as failures_file:
+            self.assertEqual(json.load(failures_file), [])
+
+    def test_scan_given_subscriptions_with_request_of_subscription(self):
+        # Arrange
+        self.settings.subscription_ids = ['sub1', 'sub2']
+        self.settings.max_parallel_subscriptions = 2
+        for subscription_id in self.settings.subscription_ids:
+            when(dragoneye.cloud_scanner.azure.azure_scanner).invoke_get_request(
+                f'https://management.azure.com/subscriptions/{subscription_id}/providers/Microsoft.Compute/request3?api-version=2020-12-01',
+                {'Authorization': self.token}, on_backoff=ANY, on_giveup=ANY). \
+                thenReturn(mock({'status_code': 200, 'text': json.dumps({'value': [{'name': subscription_id}]})}))
+
+        # Act
+        output_path = AzureTenantScanner(self.token, self.settings).scan()
+
+        # Assert
+        for subscription_id in self.settings.subscription_ids:
+            with open(os.path.join(output_path, subscription_id, 'request3.json')) as result_file:
+                self.assertEqual(json.load(result_file)['value'], [{'name': subscription_id}])
@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+import unittest
+
+from mockito import when, unstub, mock
+
+import dragoneye
+from dragoneye.cloud_scanner.gcp.gcp_organization_scanner import GcpOrganizationScanner
+from dragoneye.cloud_scanner.gcp.gcp_scan_settings import GcpOrganizationScanSettings
+
+
+class TestGcpOrganizationScanner(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.settings = GcpOrganizationScanSettings(
+            commands_path='commands.yaml',
+            should_clean_before_scan=False,
+            output_path=self.temp_dir.name,
+            max_parallel_projects=1
+        )
+        when(dragoneye.cloud_scanner.base_cloud_scanner).load_yaml('commands.yaml').thenReturn([{
+            'ServiceName': 'service',
+            'ApiVersion': 'v1',
+            'ResourceType': 'resource1',
+            'Method': 'list'
+        }])
+        self.scanner = GcpOrganizationScanner(mock(), self.settings)
+
+        service = mock()
+        resource = mock()
+        request = mock()
+        when(self.scanner.service_pool).get_service('service', 'v1').thenReturn(service)
+        when(service).resource1().thenReturn(resource)
+        when(resource).list().thenReturn(request)
+        when(resource).list_next(previous_request=request, previous_response=...).thenReturn(None)
+        when(request).execute().thenReturn({'items': [{'name': 'item1'}]})
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+        unstub()
+
+    def _mock_list(self, resource, items_key: str, items: list, **parameters):
+        request = mock()
+        response = {items_key: items}
+        when(resource).list(**parameters).thenReturn(request)
+        when(request).execute().thenReturn(response)
+        when(resource).list_next(previous_request=request, previous_response=response).thenReturn(None)
+
+    def _assert_project_scanned(self, output_path: str, project_id: str):
+        with open(os.path.join(output_path, project_id, 'service-v1-resource1-list.json')) as result_file:
+            self.assertEqual(json.load(result_file), {'value': [{'name': 'item1'}]})
+
+    def test_scan_projects(self):
+        # Arrange
+        self.settings.project_ids = ['project1', 'project2']
+
+        # Act
+        output_path = self.scanner.scan()
+
+        # Assert
+        self._assert_project_scanned(output_path, 'project1')
+        self._assert_project_scanned(output_path, 'project2')
+
+    def test_scan_discovers_projects_of_parent_and_its_sub_folders(self):
+        # Arrange
+        self.settings.parent = 'organizations/1'
+        projects = mock()
+        folders = mock()
+        when(self.scanner.service_pool).get_service('cloudresourcemanager', 'v1').thenReturn(mock({'projects': lambda: projects}))
+        when(self.scanner.service_pool).get_service('cloudresourcemanager', 'v2').thenReturn(mock({'folders': lambda: folders}))
+        self._mock_list(projects, 'projects', [{'projectId': 'project1'}], filter='parent.type:organization parent.id:1 lifecycleState:ACTIVE')
+        self._mock_list(projects, 'projects', [{'projectId': 'project2'}], filter='parent.type:folder parent.id:2 lifecycleState:ACTIVE')
+        self._mock_list(folders, 'folders', [{'name': 'folders/2', 'lifecycleState': 'ACTIVE'},
+                                             {'name': 'folders/3', 'lifecycleState': 'DELETE_REQUESTED'}], parent='organizations/1')
+        self._mock_list(folders, 'folders', [], parent='folders/2')
+
+        # Act
+        output_path = self.scanner.scan()
+
+        # Assert
+        self._assert_project_scanned(output_path, 'project1')
+        self._assert_project_scanned(output_path, 'project2')
+        self.assertSetEqual({name for name in os.listdir(output_path) if os.path.isdir(os.path.join(output_path, name))},
+                            {'project1', 'project2'})
@@ -1,12 +1,33 @@
+import collections
 import json
 import os
 import tempfile
 import unittest
 
 from googleapiclient.errors import HttpError
-from mockito import when, unstub, mock
+from mockito import when, unstub, mock, ANY
 
 from dragoneye.cloud_scanner.gcp.gcp_scanner import GcpScanner, GcpCloudScanSettings
+from dragoneye.utils.misc_utils import init_directory
+
+
+class FakeBatchHttpRequest:
+    instances = []
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.requests = []
+        FakeBatchHttpRequest.instances.append(self)
+
+    def add(self, request, request_id):
+        self.requests.append((request, request_id))
+
+    def execute(self):
+        for request, request_id in self.requests:
+            try:
+                self.callback(request_id, request.execute(), None)
+            except Exception as ex:
+                self.callback(request_id, None, ex)
 
 
 class TestGcpScanner(unittest.TestCase):
@@ -28,6 +49,8 @@ class TestGcpScanner(unittest.TestCase):
 
         self.service_mock = mock()
         when(self.scanner)._create_service('service', 'v1').thenReturn(self.service_mock)
+        FakeBatchHttpRequest.instances = []
+        when(self.service_mock).new_batch_http_request(callback=ANY).thenAnswer(lambda callback: FakeBatchHttpRequest(callback))
 
         self.resource1_mock = mock()
         when(self.service_mock).resource1().thenReturn(self.resource1_mock)
@@ -248,3 +271,120 @@ class TestGcpScanner(unittest.TestCase):
             self.assertEqual(failures[0], failure_summary)
             failure_summary['parameters'] = {'param1': 'p1val2', 'param2': 'p2val2'}
             self.assertEqual(failures[1], failure_summary)
+
+    def test_scan_batches_get_requests(self):
+        # Arrange
+        self.gcp_settings.batch_size = 4
+
+        # Act
+        output_path = self.scanner.scan()
+        account_data_dir = os.path.join(output_path, self.account_name)
+
+        # Assert
+        # resource2/resource3/resource4/resource5 are get methods with 3/2/9/6 parameter sets, of which 2/2/4/6 are stubbed
+        self.assertEqual(len(FakeBatchHttpRequest.instances), 1 + 1 + 3 + 2)
+        self.assertEqual(sum(len(batch.requests) for batch in FakeBatchHttpRequest.instances), 2 + 2 + 4 + 6)
+        with open(os.path.join(account_data_dir, 'service-v1-resource5-get.json'), 'r') as result_file:
+            self.assertEqual(len(json.load(result_file)['value']), 6)
+
+    def test_scan_failed_batch_request_is_reported(self):
+        # Arrange
+        self.gcp_settings.batch_size = 4
+
+        def new_failing_batch(callback):
+            batch = FakeBatchHttpRequest(callback)
+            when(batch).execute().thenRaise(Exception('batch failed'))
+            return batch
+
+        when(self.service_mock).new_batch_http_request(callback=ANY).thenAnswer(new_failing_batch)
+
+        # Act
+        output_path = self.scanner.scan()
+        account_data_dir = os.path.join(output_path, self.account_name)
+
+        # Assert
+        with open(os.path.join(output_path, 'failures-report.json')) as failures_file:
+            failures = json.load(failures_file)
+        self.assertEqual({(failure['resource_type'][0], failure['exception']) for failure in failures},
+                         {(resource_type, 'batch failed') for resource_type in ('resource2', 'resource3', 'resource4', 'resource5')})
+        self.assertFalse(self.scanner.journal.is_completed(os.path.join(account_data_dir, 'service-v1-resource2-get.json')))
+        self.assertTrue(self.scanner.journal.is_completed(os.path.join(account_data_dir, 'service-v1-resource1-list.json')))
+
+    def test_scan_without_batching(self):
+        # Arrange
+        self.gcp_settings.batch_size = 0
+
+        # Act
+        output_path = self.scanner.scan()
+        account_data_dir = os.path.join(output_path, self.account_name)
+
+        # Assert
+        self.assertListEqual(FakeBatchHttpRequest.instances, [])
+        with open(os.path.join(account_data_dir, 'service-v1-resource4-get.json'), 'r') as result_file:
+            self.assertEqual(len(json.load(result_file)['value']), 4)
+
+    def test_scan_deadline_saves_partial_results_of_list_request(self):
+        # Arrange
+        next_request_mock = mock()
+        when(self.resource1_mock).list_next(previous_request=ANY, previous_response=ANY).thenReturn(next_request_mock)
+        when(next_request_mock).execute().thenReturn({'value': [{'param1': 'p1val4'}]})
+
+        def execute_first_page():
+            # The scan is cancelled while the first page is fetched, so the next page is never requested
+            self.scanner.deadline.cancel()
+            return self.res
+
+        when(self.resource1_method_mock).execute().thenAnswer(execute_first_page)
+
+        # Act
+        output_path = self.scanner.scan()
+        account_data_dir = os.path.join(output_path, self.account_name)
+
+        # Assert
+        with open(os.path.join(account_data_dir, 'service-v1-resource1-list.json'), 'r') as result_file:
+            self.assertEqual(json.load(result_file), {'value': self.res['value']})
+        with open(os.path.join(output_path, 'cut-offs-report.json'), 'r') as cut_offs_file:
+            cut_offs = json.load(cut_offs_file)
+        self.assertIn({'command': 'service.resource1.list', 'region': 'global', 'call': "service.v1.['resource1'].list()", 'pages': 1,
+                       'output': None, 'cut_off': 'scan cancellation'}, cut_offs)
+        # The commands that depend on the partial results are cut off before they start
+        self.assertEqual({cut_off['command'] for cut_off in cut_offs if cut_off['pages'] == 0},
+                         {'service.resource2.get', 'service.resource3.get', 'service.resource4.get', 'service.resource5.get'})
+        self.assertFalse(self.scanner.journal.is_completed(os.path.join(account_data_dir, 'service-v1-resource1-list.json')))
+
+    def test_scan_deadline_cuts_off_every_call_of_batch(self):
+        # Arrange
+        self.gcp_settings.batch_size = 4
+
+        def execute_first_page():
+            self.scanner.deadline.cancel()
+            return self.res
+
+        when(self.resource1_method_mock).execute().thenAnswer(execute_first_page)
+
+        # Act
+        output_path = self.scanner.scan()
+
+        # Assert
+        with open(os.path.join(output_path, 'cut-offs-report.json'), 'r') as cut_offs_file:
+            cut_offs = json.load(cut_offs_file)
+        self.assertListEqual(FakeBatchHttpRequest.instances, [])
+        self.assertEqual(collections.Counter(cut_off['command'] for cut_off in cut_offs if cut_off['pages'] == 0),
+                         {'service.resource2.get': 3, 'service.resource3.get': 2, 'service.resource4.get': 9, 'service.resource5.get': 6})
+
+    def test_plan_estimates_product_of_single_parameters(self):
+        # Arrange
+        account_data_dir = init_directory(self.gcp_settings.output_path, self.account_name, False)
+        with open(os.path.join(account_data_dir, 'service-v1-resource1-list.json'), 'w') as result_file:
+            json.dump({'value': [{'param1': f'p1val{index}', 'param2': f'p2val{index}', 'param3': f'p3val{index}'} for index in range(3)]},
+                      result_file)
+
+        # Act
+        plan = self.scanner.plan(fan_out_warning=9)
+
+        # Assert
+        self.assertListEqual([command.calls for command in plan.commands], [1, 3, 3, 9, 9])
+        self.assertListEqual(plan.get_warnings(), [
+            'service-v1-resource4-get makes 9 calls in global, one for every combination of param1 (3) x param2 (3)',
+            'service-v1-resource5-get makes 9 calls in global, one for every combination of param1/param2 (3) x param3 (3)'
+        ])
@@ -0,0 +1,59 @@
+import unittest
+
+from dragoneye.cloud_scanner.scan_plan import CommandPlan, FanOutFactor, ScanPlan
+
+
+class TestScanPlan(unittest.TestCase):
+    def setUp(self) -> None:
+        self.commands = [
+            CommandPlan(0, 'list-vpcs', [], {'us-east-1': [], 'eu-west-1': []}),
+            CommandPlan(1, 'describe-vpc', [0], {'us-east-1': [FanOutFactor(('VpcId',), 40)], 'eu-west-1': [FanOutFactor(('VpcId',), 2)]}),
+            CommandPlan(2, 'describe-subnet-attribute', [0],
+                        {'us-east-1': [FanOutFactor(('VpcId',), 40), FanOutFactor(('Attribute',), 30)],
+                         'eu-west-1': [FanOutFactor(('VpcId',), None), FanOutFactor(('Attribute',), 30)]}),
+            CommandPlan(3, 'list-buckets', [], {'us-east-1': []}),
+        ]
+        self.plan = ScanPlan(['us-east-1', 'eu-west-1'], self.commands, fan_out_warning=1000)
+
+    def test_get_scope_tasks(self):
+        # Act
+        scope_tasks = self.plan.get_scope_tasks()
+
+        # Assert
+        self.assertDictEqual(scope_tasks, {'us-east-1': {'tasks': 4, 'calls': 1242}, 'eu-west-1': {'tasks': 3, 'calls': None}})
+
+    def test_get_critical_path_follows_most_calls(self):
+        # Act
+        critical_path = self.plan.get_critical_path()
+
+        # Assert
+        self.assertListEqual(critical_path, [0, 2])
+
+    def test_get_critical_path_ignores_cyclic_dependencies(self):
+        # Arrange
+        self.commands[0].dependencies = [2]
+
+        # Act
+        critical_path = self.plan.get_critical_path()
+
+        # Assert
+        self.assertListEqual(critical_path, [2, 0, 1])
+
+    def test_get_warnings_reports_cartesian_fan_out(self):
+        # Act
+        warnings = self.plan.get_warnings()
+
+        # Assert
+        self.assertListEqual(warnings, ['describe-subnet-attribute makes 1200 calls in us-east-1, '
+                                        'one for every combination of VpcId (40) x Attribute (30)'])
+
+    def test_get_warnings_reports_cartesian_fan_out_without_estimates(self):
+        # Arrange
+        del self.commands[2].fan_out['us-east-1']
+
+        # Act
+        warnings = self.plan.get_warnings()
+
+        # Assert
+        self.assertListEqual(warnings, ['describe-subnet-attribute makes a call for every combination of VpcId (?) x Attribute (30), '
+                                        'which cannot be estimated without the results of a previous scan'])
@@ -1,74 +1,84 @@
 import unittest
-from unittest.mock import MagicMock, patch
 
 from botocore.exceptions import ClientError
 
-from dragoneye.utils.boto_backoff import rate_limiter
+from dragoneye.utils.boto_backoff import TokenBucket, AdaptiveRateLimiters, is_throttling_error
 
 
 class TestBotoBackoff(unittest.TestCase):
-    def test_rate_limiter_not_throttled(self):
-        # Arrange
-        @rate_limiter()
-        def func(a, b):
-            return a + b
-
+    def test_is_throttling_error(self):
+        self.assertTrue(is_throttling_error(ClientError({'Error': {'Code': 'Throttling', 'Message': 'Unknown'}}, 'operationName')))
+        self.assertTrue(is_throttling_error(ClientError({'Error': {'Code': 'TooManyRequestsException', 'Message': 'Unknown'}}, 'operationName')))
+        self.assertTrue(is_throttling_error(ClientError({'Error': {'Code': 'RequestLimitExceeded', 'Message': 'Unknown'}}, 'operationName')))
+        self.assertTrue(is_throttling_error(ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': 'Unknown'}}, 'operationName')))
+        self.assertTrue(is_throttling_error(ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Unknown'}}, 'operationName')))
+        self.assertTrue(is_throttling_error(ClientError({'Error': {'Code': 'SlowDown', 'Message': 'Unknown'}}, 'operationName')))
+        self.assertTrue(is_throttling_error(ClientError({'Error': {'Code': 'Unknown', 'Message': 'Rate exceeded'}}, 'operationName')))
+        self.assertFalse(is_throttling_error(ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'Denied'}}, 'operationName')))
+        self.assertFalse(is_throttling_error(ValueError('Throttling')))
+
+
+class TestTokenBucket(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 0.0
+        self.bucket = TokenBucket(max_rate=10, min_rate=1, decrease_factor=0.5, clock=lambda: self.now)
+
+    def test_reserve_burst_then_spaced_by_rate(self):
         # Act
-        result = func(1, 2)
+        burst_delays = [self.bucket.reserve() for _ in range(10)]
+        queued_delays = [self.bucket.reserve() for _ in range(3)]
 
         # Assert
-        self.assertEqual(result, 3)
+        self.assertListEqual(burst_delays, [0] * 10)
+        for expected, delay in zip([0.1, 0.2, 0.3], queued_delays):
+            self.assertAlmostEqual(expected, delay)
 
-    @patch('dragoneye.utils.boto_backoff.time.sleep')
-    def test_rate_limiter_error_code_throttling(self, unused_patched_sleep):
+    def test_reserve_refills_over_time(self):
         # Arrange
-        max_attempts = 3
+        for _ in range(10):
+            self.bucket.reserve()
 
-        func_mock = MagicMock(side_effect=ClientError(
-            {'Error': {
-                'Type': 'Sender',
-                'Code': 'Throttling',
-                'Message': 'Unknown'}
-             }, 'operationName'))
+        # Act
+        self.now += 0.5
+        delays = [self.bucket.reserve() for _ in range(6)]
 
-        # Act / Assert
-        with self.assertRaises(ClientError):
-            rate_limiter(max_attempts)(func_mock)()
+        # Assert
+        self.assertListEqual(delays[:5], [0] * 5)
+        self.assertAlmostEqual(0.1, delays[5])
 
-        self.assertEqual(func_mock.call_count, max_attempts)
+    def test_on_throttled_cuts_rate_and_drains_burst(self):
+        # Act
+        self.bucket.on_throttled()
+        self.bucket.on_throttled()
+        self.bucket.on_throttled()
+        self.bucket.on_throttled()
 
-    @patch('dragoneye.utils.boto_backoff.time.sleep')
-    def test_rate_limiter_error_code_too_many_requests(self, unused_patched_sleep):
-        # Arrange
-        max_attempts = 3
+        # Assert
+        self.assertEqual(self.bucket.rate, 1)
+        self.assertAlmostEqual(1, self.bucket.reserve())
 
-        func_mock = MagicMock(side_effect=ClientError(
-            {'Error': {
-                'Type': 'Sender',
-                'Code': 'TooManyRequestsException',
-                'Message': 'Unknown'}
-             }, 'operationName'))
+    def test_on_success_recovers_rate_up_to_max(self):
+        # Arrange
+        self.bucket.on_throttled()
 
-        # Act / Assert
-        with self.assertRaises(ClientError):
-            rate_limiter(max_attempts)(func_mock)()
+        # Act
+        self.bucket.on_success()
+        recovered_rate = self.bucket.rate
+        for _ in range(1000):
+            self.bucket.on_success()
 
-        self.assertEqual(func_mock.call_count, max_attempts)
+        # Assert
+        self.assertAlmostEqual(5.2, recovered_rate)
+        self.assertEqual(self.bucket.rate, 10)
 
-    @patch('dragoneye.utils.boto_backoff.time.sleep')
-    def test_rate_limiter_error_message_rate_exceeded(self, unused_patched_sleep):
+    def test_adaptive_rate_limiters_per_key(self):
         # Arrange
-        max_attempts = 3
+        rate_limiters = AdaptiveRateLimiters(max_rate=10)
 
-        func_mock = MagicMock(side_effect=ClientError(
-            {'Error': {
-                'Type': 'Sender',
-                'Code': 'Unknown',
-                'Message': 'Rate exceeded'}
-             }, 'operationName'))
-
-        # Act / Assert
-        with self.assertRaises(ClientError):
-            rate_limiter(max_attempts)(func_mock)()
+        # Act
+        rate_limiters.on_throttled(('ec2', 'us-east-1', 'describe_instances'))
+        rate_limiters.on_success(('ec2', 'eu-west-1', 'describe_instances'))
 
-        self.assertEqual(func_mock.call_count, max_attempts)
\ No newline at end of file
+        # Assert
+        self.assertDictEqual(rate_limiters.get_throttled_rates(), {('ec2', 'us-east-1', 'describe_instances'): 7})
+        self.assertEqual(rate_limiters.reserve(('ec2', 'eu-west-1', 'describe_instances')), 0)
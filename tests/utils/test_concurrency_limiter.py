@@ -0,0 +1,92 @@
+import unittest
+
+from dragoneye.utils.concurrency_limiter import AdaptiveConcurrencyLimit, AdaptiveConcurrencyLimiters
+
+
+class TestAdaptiveConcurrencyLimit(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 0.0
+        self.limit = AdaptiveConcurrencyLimit(initial_limit=4, max_limit=8, clock=lambda: self.now)
+
+    def _run_calls(self, count: int, latency: float, succeeded: bool = True):
+        for _ in range(count):
+            self.assertTrue(self.limit.try_acquire())
+            self.limit.release(latency, succeeded)
+
+    def test_try_acquire_bounded_by_limit(self):
+        # Act
+        acquired = [self.limit.try_acquire() for _ in range(5)]
+
+        # Assert
+        self.assertListEqual(acquired, [True, True, True, True, False])
+        self.assertEqual(self.limit.get_available(), 0)
+
+    def test_healthy_calls_increase_limit_up_to_max(self):
+        # Act
+        self._run_calls(5, 0.1)
+        limit_after_window = int(self.limit.limit)
+        self._run_calls(100, 0.1)
+
+        # Assert
+        self.assertEqual(limit_after_window, 5)
+        self.assertEqual(self.limit.limit, 8)
+        self.assertEqual(self.limit.peak_limit, 8)
+
+    def test_slow_or_failed_calls_do_not_increase_limit(self):
+        # Arrange
+        self._run_calls(1, 0.1)
+        limit = self.limit.limit
+
+        # Act
+        self._run_calls(1, 1)
+        self._run_calls(1, 0.1, succeeded=False)
+
+        # Assert
+        self.assertEqual(self.limit.limit, limit)
+
+    def test_release_without_latency_only_frees_slot(self):
+        # Arrange
+        self.limit.try_acquire()
+
+        # Act
+        self.limit.release(None)
+
+        # Assert
+        self.assertEqual(self.limit.limit, 4)
+        self.assertIsNone(self.limit.average_latency)
+        self.assertEqual(self.limit.in_flight, 0)
+
+    def test_throttles_cut_limit_once_per_latency(self):
+        # Arrange
+        self._run_calls(1, 1)
+        limit = self.limit.limit
+
+        # Act
+        self.limit.on_throttled()
+        self.limit.on_throttled()
+        cut_once = self.limit.limit
+        self.now += 2
+        self.limit.on_throttled()
+        self.limit.on_throttled()
+        self.now += 2
+        self.limit.on_throttled()
+
+        # Assert
+        self.assertEqual(cut_once, limit / 2)
+        self.assertEqual(self.limit.limit, 1)
+        self.assertEqual(self.limit.throttles, 5)
+
+    def test_limiters_per_key(self):
+        # Arrange
+        limiters = AdaptiveConcurrencyLimiters(initial_limit=1, max_limit=4)
+
+        # Act
+        first_acquired = limiters.try_acquire('iam/us-east-1')
+        second_acquired = limiters.try_acquire('iam/us-east-1')
+        other_acquired = limiters.try_acquire('ec2/us-east-1')
+
+        # Assert
+        self.assertTrue(first_acquired)
+        self.assertFalse(second_acquired)
+        self.assertTrue(other_acquired)
+        self.assertSetEqual(set(limiters.get_limits()), {'iam/us-east-1', 'ec2/us-east-1'})
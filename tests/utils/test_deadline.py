@@ -0,0 +1,68 @@
+import unittest
+
+from dragoneye.utils.deadline import Deadline
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestDeadline(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+
+    def test_deadline_without_timeout_is_never_cut_off(self):
+        # Arrange
+        deadline = Deadline(clock=self.clock)
+
+        # Act
+        self.clock.now = 10 ** 6
+
+        # Assert
+        self.assertIsNone(deadline.get_cut_off_reason())
+
+    def test_deadline_is_cut_off_once_timeout_passes(self):
+        # Arrange
+        deadline = Deadline(10, 'command', clock=self.clock)
+
+        # Act
+        self.clock.now = 9.9
+        before_timeout = deadline.get_cut_off_reason()
+        self.clock.now = 10
+        after_timeout = deadline.get_cut_off_reason()
+
+        # Assert
+        self.assertIsNone(before_timeout)
+        self.assertEqual(after_timeout, 'command deadline')
+
+    def test_child_is_cut_off_by_parent(self):
+        # Arrange
+        scan_deadline = Deadline(60, clock=self.clock)
+        command_deadline = scan_deadline.child(10, 'command')
+        unlimited_command_deadline = scan_deadline.child(None, 'command')
+
+        # Act
+        self.clock.now = 30
+        reasons_before_scan_deadline = (command_deadline.get_cut_off_reason(), unlimited_command_deadline.get_cut_off_reason())
+        self.clock.now = 60
+        reasons_after_scan_deadline = (command_deadline.get_cut_off_reason(), unlimited_command_deadline.get_cut_off_reason())
+
+        # Assert
+        self.assertEqual(reasons_before_scan_deadline, ('command deadline', None))
+        self.assertEqual(reasons_after_scan_deadline, ('scan deadline', 'scan deadline'))
+
+    def test_cancel_cuts_off_deadline_and_its_children(self):
+        # Arrange
+        scan_deadline = Deadline(clock=self.clock)
+        command_deadline = scan_deadline.child(10, 'command')
+
+        # Act
+        scan_deadline.cancel()
+
+        # Assert
+        self.assertEqual(scan_deadline.get_cut_off_reason(), 'scan cancellation')
+        self.assertEqual(command_deadline.get_cut_off_reason(), 'scan cancellation')
@@ -0,0 +1,77 @@
+import json
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dragoneye.utils.http_session import HttpSession, get_http_session
+from dragoneye.utils.misc_utils import invoke_get_request
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = json.dumps({'value': [{'path': self.path, 'auth': self.headers.get('Authorization')}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpSession(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _JsonHandler)
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_get_reuses_connection(self):
+        # Arrange
+        http_session = HttpSession(pool_size=2)
+
+        # Act
+        responses = [http_session.get(f'{self.base_url}/resource{index}', {'Authorization': 'token'}) for index in range(10)]
+
+        # Assert
+        self.assertTrue(all(response.status_code == 200 for response in responses))
+        self.assertEqual(responses[3].json()['value'][0], {'path': '/resource3', 'auth': 'token'})
+        self.assertDictEqual(http_session.get_stats(), {'requests': 10, 'connections': 1, 'reused_connections': 9})
+        http_session.close()
+
+    def test_get_from_multiple_threads_is_bounded_by_pool_size(self):
+        # Arrange
+        pool_size = 4
+        http_session = HttpSession(pool_size=pool_size)
+
+        # Act
+        with ThreadPoolExecutor(max_workers=pool_size) as executor:
+            responses = list(executor.map(lambda index: http_session.get(f'{self.base_url}/resource{index}', {}), range(100)))
+
+        # Assert
+        self.assertTrue(all(response.status_code == 200 for response in responses))
+        stats = http_session.get_stats()
+        self.assertEqual(stats['requests'], 100)
+        self.assertLessEqual(stats['connections'], pool_size)
+        http_session.close()
+
+    def test_invoke_get_request_uses_shared_session(self):
+        # Arrange
+        stats_before = get_http_session().get_stats()
+
+        # Act
+        response = invoke_get_request(f'{self.base_url}/shared', {})
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_http_session().get_stats()['requests'], stats_before['requests'] + 1)
@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from dragoneye.utils import json_serializer
+from dragoneye.utils.json_serializer import ResultsFormat, dumps, dump_to_file
+from dragoneye.utils.misc_utils import custom_serializer
+
+
+class TestJsonSerializer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.data = {
+            'b': [{'Created': datetime(2021, 1, 1, 10, 30, 15, 123456), 'Raw': b'payload'}],
+            'a': {'Updated': datetime(2021, 1, 2, tzinfo=timezone.utc), 'Name': 'näme', 'Count': 3, 'Ratio': 0.5, 'Empty': None}
+        }
+
+    def test_pretty_identical_to_previous_output(self):
+        for sort_keys in (False, True):
+            with self.subTest(sort_keys=sort_keys):
+                # Act
+                encoded = dumps(self.data, ResultsFormat.PRETTY, sort_keys)
+
+                # Assert
+                self.assertEqual(json.dumps(self.data, indent=4, sort_keys=sort_keys, default=custom_serializer), encoded)
+
+    def test_compact_same_values_as_pretty(self):
+        for native_encoder in (True, False):
+            with self.subTest(native_encoder=native_encoder):
+                with patch.object(json_serializer, 'orjson', json_serializer.orjson if native_encoder else None):
+                    # Act
+                    encoded = dumps(self.data, ResultsFormat.COMPACT, sort_keys=True)
+
+                # Assert
+                self.assertNotIn('\n', encoded)
+                self.assertEqual(['b', 'a'], list(json.loads(encoded)))
+                self.assertEqual(json.loads(dumps(self.data, ResultsFormat.PRETTY)), json.loads(encoded))
+
+    def test_compact_falls_back_to_stdlib_on_unsupported_values(self):
+        # Arrange
+        data = {'Size': 2 ** 70}
+
+        # Act
+        encoded = dumps(data, ResultsFormat.COMPACT)
+
+        # Assert
+        self.assertEqual('{"Size":1180591620717411303424}', encoded)
+
+    def test_dump_to_file(self):
+        for results_format in ResultsFormat:
+            with self.subTest(results_format=results_format), tempfile.TemporaryDirectory() as temp_dir:
+                # Arrange
+                output_file = os.path.join(temp_dir, 'output.json')
+
+                # Act
+                dump_to_file(self.data, output_file, results_format, sort_keys=True)
+
+                # Assert
+                with open(output_file, 'r', encoding='utf-8') as file:
+                    self.assertEqual(dumps(self.data, results_format, sort_keys=True), file.read())
+                self.assertListEqual(os.listdir(temp_dir), ['output.json'])
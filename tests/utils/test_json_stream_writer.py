@@ -0,0 +1,142 @@
+import json
+import os
+import tempfile
+import tracemalloc
+import unittest
+from datetime import datetime
+
+from dragoneye.utils.json_serializer import ResultsFormat, dumps
+from dragoneye.utils.json_stream_writer import JsonStreamWriter, JsonItemsSpool
+from dragoneye.utils.misc_utils import custom_serializer
+
+
+class TestJsonStreamWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_file = os.path.join(self.temp_dir.name, 'output.json')
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    @staticmethod
+    def _get_pages(pages_count: int, items_per_page: int):
+        return [
+            {
+                'Marker': f'marker-{page}',
+                'Items': [{'Name': f'item-{page}-{index}', 'Created': datetime(2021, 1, 1, 10, page % 60), 'Tags': {'b': 1, 'a': [1, 2]}}
+                          for index in range(items_per_page)],
+                'Empty': [],
+                'ResponseMetadata': {'RequestId': str(page)}
+            }
+            for page in range(pages_count)
+        ]
+
+    @staticmethod
+    def _merge_pages(pages):
+        data = {}
+        for page in pages:
+            if not data:
+                data = json.loads(json.dumps(page, default=custom_serializer))
+            else:
+                for key, value in data.items():
+                    if isinstance(value, list):
+                        value.extend(json.loads(json.dumps(page[key], default=custom_serializer)))
+        return data
+
+    def _read_output(self) -> str:
+        with open(self.output_file, 'r') as file:
+            return file.read()
+
+    def test_add_page_output_identical_to_json_dumps(self):
+        for sort_keys in (False, True):
+            with self.subTest(sort_keys=sort_keys):
+                # Arrange
+                pages = self._get_pages(3, 2)
+                writer = JsonStreamWriter(self.output_file, sort_keys=sort_keys)
+
+                # Act
+                for page in pages:
+                    writer.add_page(page)
+                writer.pop('ResponseMetadata')
+                writer.close()
+
+                # Assert
+                expected = self._merge_pages(pages)
+                expected.pop('ResponseMetadata')
+                self.assertEqual(json.dumps(expected, indent=4, sort_keys=sort_keys), self._read_output())
+                self.assertEqual(0, writer.pages)
+
+    def test_add_page_compact_output_identical_to_serializer(self):
+        # Arrange
+        pages = self._get_pages(3, 2)
+        writer = JsonStreamWriter(self.output_file, sort_keys=True, results_format=ResultsFormat.COMPACT)
+
+        # Act
+        for page in pages:
+            writer.add_page(page)
+        writer.close()
+
+        # Assert
+        self.assertEqual(dumps(self._merge_pages(pages), ResultsFormat.COMPACT), self._read_output())
+
+    def test_extend_from_spools(self):
+        # Arrange
+        spools = []
+        for items in ([{'id': 1}, {'id': 2}], [], [{'id': 3}]):
+            spool = JsonItemsSpool()
+            spool.extend(items)
+            spools.append(spool)
+        writer = JsonStreamWriter(self.output_file)
+
+        # Act
+        writer.extend('value', [])
+        for spool in spools:
+            writer.extend_from_spool('value', spool)
+            spool.close()
+        writer.set('urls', ['url1', 'url2'])
+        writer.close()
+
+        # Assert
+        expected = {'value': [{'id': 1}, {'id': 2}, {'id': 3}], 'urls': ['url1', 'url2']}
+        self.assertEqual(json.dumps(expected, indent=4), self._read_output())
+
+    def test_getitem_of_list_key_raises(self):
+        # Arrange
+        writer = JsonStreamWriter(self.output_file)
+        writer.add_page({'Status': 'ACTIVE', 'Items': [1]})
+
+        # Act / Assert
+        self.assertEqual('ACTIVE', writer['Status'])
+        with self.assertRaises(KeyError):
+            _ = writer['Items']
+        writer.discard()
+
+    def test_discard_does_not_write_file(self):
+        # Arrange
+        writer = JsonStreamWriter(self.output_file)
+        writer.add_page({'Items': [1, 2]})
+
+        # Act
+        writer.discard()
+
+        # Assert
+        self.assertFalse(os.path.exists(self.output_file))
+        self.assertFalse(os.path.exists(self.output_file + '.tmp'))
+
+    def test_peak_memory_does_not_grow_with_pages(self):
+        def get_peak_memory(pages_count: int) -> int:
+            writer = JsonStreamWriter(self.output_file, sort_keys=True)
+            tracemalloc.start()
+            for page in range(pages_count):
+                writer.add_page({'Items': [{'Name': f'item-{page}-{index}', 'Payload': 'x' * 100} for index in range(100)]})
+            writer.close()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return peak
+
+        # Act
+        small_peak = get_peak_memory(10)
+        large_peak = get_peak_memory(200)
+
+        # Assert
+        self.assertLess(large_peak, small_peak * 2)
@@ -1,9 +1,10 @@
 import os
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from unittest.mock import patch
 
-from dragoneye.utils.misc_utils import snakecase, elapsed_time, get_dynamic_values_from_files, custom_serializer
+from dragoneye.utils.misc_utils import snakecase, elapsed_time, get_dynamic_values_from_files, custom_serializer, compile_jq
 
 
 class TestMisUtils(unittest.TestCase):
@@ -51,6 +52,25 @@ class TestMisUtils(unittest.TestCase):
         names = get_dynamic_values_from_files('nofile.json|.value[].name', self.resource_path)
         self.assertListEqual(names, [])
 
+    def test_compile_jq_compiles_each_query_once(self):
+        # Act
+        program = compile_jq('.value[].name')
+
+        # Assert
+        self.assertIs(program, compile_jq('.value[].name'))
+        self.assertIsNot(program, compile_jq('.value[].id'))
+
+    def test_compile_jq_program_shared_between_threads(self):
+        # Arrange
+        program = compile_jq('.value[].id')
+
+        # Act
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda index: program.all({'value': [{'id': index}, {'id': -index}]}), range(200)))
+
+        # Assert
+        self.assertListEqual(results, [[index, -index] for index in range(200)])
+
     def test_custom_serializer_datetime(self):
         # Arrange
         date = datetime(2000, 10, 5, 1, 2, 3, 4)
@@ -1,38 +1,255 @@
 import collections
 import random
-from asyncio import Future
+import threading
 from time import sleep
-from typing import Deque, List, Tuple
 from unittest import TestCase
-from dragoneye.utils.threading_utils import ThreadedFunctionData, execute_parallel_functions_in_threads
+from dragoneye.utils.concurrency_limiter import AdaptiveConcurrencyLimiters
+from dragoneye.utils.threading_utils import ThreadedFunctionData, TaskScheduler, TaskFanOut, TaskRetry
 
 
 class TestParallelTasksExecution(TestCase):
 
-    def test_parallel_execution(self):
-        deque_tasks: Deque[List[ThreadedFunctionData]] = collections.deque()
-        independed_tasks: List[ThreadedFunctionData] = []
-        dependable_tasks: List[ThreadedFunctionData] = []
-        tasks_size: int = 100
-
-        for index in range(tasks_size):
-            independed_tasks.append(ThreadedFunctionData(self.do_wait_and_get,
-                                                         (f'in-dependent task id={index}\n', random.uniform(0.5, 1)),
-                                                         'error msg', 'timeout msg'))
-
-        for index in range(tasks_size, tasks_size * 2):
-            dependable_tasks.append(ThreadedFunctionData(self.do_wait_and_get,
-                                                         (f'dependent task id={index}\n', random.uniform(0.1, 0.5)),
-                                                         'error msg', 'timeout msg'))
-
-        deque_tasks.append(independed_tasks)
-        deque_tasks.append(dependable_tasks)
-        tasks_responses: List[Tuple[Future, str, str]] = execute_parallel_functions_in_threads(deque_tasks, 10, 10)
-        for index in range(tasks_size):
-            self.assertRegexpMatches(tasks_responses[index][0].result(), r'^in-dependent.*')
-
-        for index in range(tasks_size, tasks_size * 2):
-            self.assertRegexpMatches(tasks_responses[index][0].result(), r'^dependent.*')
+    def test_task_scheduler_runs_dependent_after_its_dependencies(self):
+        # Arrange
+        finished = []
+        lock = threading.Lock()
+
+        def do_wait_and_record(name: str, delay: float):
+            sleep(delay)
+            with lock:
+                finished.append(name)
+
+        scheduler = TaskScheduler(4)
+        scheduler.add_task('slow', ThreadedFunctionData(do_wait_and_record, ('slow', 0.5), 'error msg'))
+        scheduler.add_task('fast', ThreadedFunctionData(do_wait_and_record, ('fast', 0.05), 'error msg'))
+        scheduler.add_task('depends-on-fast', ThreadedFunctionData(do_wait_and_record, ('depends-on-fast', 0.05), 'error msg'), ['fast'])
+        scheduler.add_task('depends-on-both', ThreadedFunctionData(do_wait_and_record, ('depends-on-both', 0), 'error msg'),
+                           ['fast', 'slow', 'unknown'])
+
+        # Act
+        futures = scheduler.run()
+
+        # Assert
+        self.assertEqual(len(futures), 4)
+        self.assertListEqual(finished, ['fast', 'depends-on-fast', 'slow', 'depends-on-both'])
+
+    def test_task_scheduler_runs_dependents_of_failed_task(self):
+        # Arrange
+        def fail():
+            raise Exception('some error')
+
+        scheduler = TaskScheduler(2)
+        scheduler.add_task('failing', ThreadedFunctionData(fail, (), 'error msg'))
+        scheduler.add_task('dependent', ThreadedFunctionData(self.do_wait_and_get, ('dependent', 0), 'error msg'), ['failing'])
+
+        # Act
+        futures = scheduler.run()
+
+        # Assert
+        self.assertIsNotNone(futures['failing'].exception())
+        self.assertEqual(futures['dependent'].result(), 'dependent')
+
+    def test_task_scheduler_cyclic_dependencies(self):
+        # Arrange
+        scheduler = TaskScheduler(2)
+        scheduler.add_task('a', ThreadedFunctionData(self.do_wait_and_get, ('a', 0), 'error msg'), ['b'])
+        scheduler.add_task('b', ThreadedFunctionData(self.do_wait_and_get, ('b', 0), 'error msg'), ['a'])
+
+        # Act
+        futures = scheduler.run()
+
+        # Assert
+        self.assertEqual(futures['a'].result(), 'a')
+        self.assertEqual(futures['b'].result(), 'b')
+
+    def test_task_scheduler_fan_out_is_bounded_and_completes_in_order(self):
+        # Arrange
+        max_workers = 3
+        lock = threading.Lock()
+        concurrency = {'current': 0, 'max': 0}
+        merged = []
+
+        def do_count_and_get(value: int) -> int:
+            with lock:
+                concurrency['current'] += 1
+                concurrency['max'] = max(concurrency['max'], concurrency['current'])
+            sleep(random.uniform(0.01, 0.05))
+            with lock:
+                concurrency['current'] -= 1
+            return value
+
+        def fan_out(prefix: int) -> TaskFanOut:
+            return TaskFanOut([ThreadedFunctionData(do_count_and_get, (prefix + index,), 'error msg') for index in range(10)],
+                              merged.append)
+
+        scheduler = TaskScheduler(max_workers)
+        scheduler.add_task('parent1', ThreadedFunctionData(fan_out, (0,), 'error msg'), group='group1')
+        scheduler.add_task('parent2', ThreadedFunctionData(fan_out, (100,), 'error msg'), group='group2')
+        scheduler.add_task('dependent', ThreadedFunctionData(lambda: len(merged), (), 'error msg'), ['parent1', 'parent2'])
+
+        # Act
+        futures = scheduler.run()
+
+        # Assert
+        self.assertLessEqual(concurrency['max'], max_workers)
+        self.assertEqual(futures['dependent'].result(), 2)
+        self.assertIn(list(range(10)), merged)
+        self.assertIn(list(range(100, 110)), merged)
+
+    def test_task_scheduler_fan_out_max_parallel(self):
+        # Arrange
+        lock = threading.Lock()
+        concurrency = {'current': 0, 'max': 0}
+
+        def do_count():
+            with lock:
+                concurrency['current'] += 1
+                concurrency['max'] = max(concurrency['max'], concurrency['current'])
+            sleep(0.02)
+            with lock:
+                concurrency['current'] -= 1
+
+        scheduler = TaskScheduler(10)
+        scheduler.add_task('parent', ThreadedFunctionData(
+            lambda: TaskFanOut([ThreadedFunctionData(do_count, (), 'error msg') for _ in range(12)], max_parallel=2), (), 'error msg'))
+
+        # Act
+        scheduler.run()
+
+        # Assert
+        self.assertEqual(concurrency['max'], 2)
+
+    def test_task_scheduler_round_robin_between_groups(self):
+        # Arrange
+        started = []
+        scheduler = TaskScheduler(1)
+        for index in range(3):
+            scheduler.add_task(('busy', index), ThreadedFunctionData(started.append, ('busy',), 'error msg'), group='busy')
+        scheduler.add_task(('quiet', 0), ThreadedFunctionData(started.append, ('quiet',), 'error msg'), group='quiet')
+
+        # Act
+        scheduler.run()
+
+        # Assert
+        self.assertListEqual(started, ['busy', 'quiet', 'busy', 'busy'])
+
+    def test_task_scheduler_retry_does_not_hold_worker(self):
+        # Arrange
+        started = []
+
+        def do_retry(attempt: int):
+            started.append(('retry', attempt))
+            return TaskRetry(0.2, (attempt + 1,)) if attempt == 0 else attempt
+
+        scheduler = TaskScheduler(1)
+        scheduler.add_task('retry', ThreadedFunctionData(do_retry, (0,), 'error msg'))
+        scheduler.add_task('other', ThreadedFunctionData(started.append, ('other',), 'error msg'))
+        scheduler.add_task('dependent', ThreadedFunctionData(started.append, ('dependent',), 'error msg'), ['retry'])
+
+        # Act
+        futures = scheduler.run()
+
+        # Assert
+        self.assertListEqual(started, [('retry', 0), 'other', ('retry', 1), 'dependent'])
+        self.assertEqual(futures['retry'].result(), 1)
+
+    def test_task_scheduler_retry_sub_task(self):
+        # Arrange
+        attempts = collections.Counter()
+
+        def do_sub_task(index: int):
+            attempts[index] += 1
+            return TaskRetry(0) if attempts[index] < 3 else index
+
+        scheduler = TaskScheduler(2)
+        merged = []
+        scheduler.add_task('parent', ThreadedFunctionData(
+            lambda: TaskFanOut([ThreadedFunctionData(do_sub_task, (index,), 'error msg') for index in range(4)], merged.extend),
+            (), 'error msg'))
+
+        # Act
+        scheduler.run()
+
+        # Assert
+        self.assertListEqual(merged, [0, 1, 2, 3])
+        self.assertEqual(set(attempts.values()), {3})
+
+    def test_task_scheduler_concurrency_limit_per_key(self):
+        # Arrange
+        lock = threading.Lock()
+        concurrency = collections.defaultdict(lambda: {'current': 0, 'max': 0})
+
+        def do_count(key: str):
+            with lock:
+                concurrency[key]['current'] += 1
+                concurrency[key]['max'] = max(concurrency[key]['max'], concurrency[key]['current'])
+            sleep(0.02)
+            with lock:
+                concurrency[key]['current'] -= 1
+
+        scheduler = TaskScheduler(10, AdaptiveConcurrencyLimiters(initial_limit=2, max_limit=2))
+        for index in range(8):
+            for key in ('iam', 'ec2'):
+                scheduler.add_task((key, index), ThreadedFunctionData(do_count, (key,), 'error msg', concurrency_key=key))
+
+        # Act
+        futures = scheduler.run()
+
+        # Assert
+        self.assertEqual(len(futures), 16)
+        self.assertEqual(concurrency['iam']['max'], 2)
+        self.assertEqual(concurrency['ec2']['max'], 2)
+
+    def test_task_scheduler_concurrency_limit_holds_across_retry_with_new_args(self):
+        # Arrange
+        lock = threading.Lock()
+        concurrency = {'current': 0, 'max': 0}
+
+        def do_count(attempt: int):
+            with lock:
+                concurrency['current'] += 1
+                concurrency['max'] = max(concurrency['max'], concurrency['current'])
+            sleep(0.02)
+            with lock:
+                concurrency['current'] -= 1
+            return TaskRetry(0, (attempt + 1,)) if attempt == 0 else attempt
+
+        scheduler = TaskScheduler(10, AdaptiveConcurrencyLimiters(initial_limit=1, max_limit=1))
+        for index in range(6):
+            scheduler.add_task(index, ThreadedFunctionData(do_count, (0,), 'error msg', concurrency_key='iam'))
+
+        # Act
+        futures = scheduler.run()
+
+        # Assert
+        self.assertListEqual([future.result() for future in futures.values()], [1] * 6)
+        self.assertEqual(concurrency['max'], 1)
+
+    def test_task_scheduler_tasks_added_by_running_task(self):
+        # Arrange
+        finished = []
+        lock = threading.Lock()
+        scheduler = TaskScheduler(4)
+
+        def do_record(name: str):
+            with lock:
+                finished.append(name)
+
+        def do_add_tasks():
+            # The dependent is added before its dependency, and depends on a task that is already done
+            scheduler.add_task('added-dependent', ThreadedFunctionData(do_record, ('added-dependent',), 'error msg'), ['added', 'first'])
+            scheduler.add_task('added', ThreadedFunctionData(do_record, ('added',), 'error msg'))
+            do_record('adding')
+
+        scheduler.add_task('first', ThreadedFunctionData(do_record, ('first',), 'error msg'))
+        scheduler.add_task('adding', ThreadedFunctionData(do_add_tasks, (), 'error msg'), ['first'])
+
+        # Act
+        futures = scheduler.run()
+
+        # Assert
+        self.assertEqual(len(futures), 4)
+        self.assertListEqual(finished, ['first', 'adding', 'added', 'added-dependent'])
 
     @staticmethod
     def do_wait_and_get(message: str, delay: float) -> str:
@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from dragoneye.utils.result_store import ResultStore
+
+
+class TestResultStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.directory = self.temp_dir.name
+        self.store = ResultStore(['data.json', 'items'])
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def _write_file(self, relative_path: str, result: dict) -> str:
+        file_path = os.path.join(self.directory, relative_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as file:
+            json.dump(result, file)
+        return file_path
+
+    def test_get_dynamic_values_of_published_result(self):
+        # Arrange
+        self.store.publish(os.path.join(self.directory, 'data.json'), {'value': [{'name': 'a'}, {'name': 'b'}]}, self.directory)
+
+        # Act
+        values = self.store.get_dynamic_values('data.json|.value[].name', self.directory)
+
+        # Assert
+        self.assertEqual(['a', 'b'], values)
+
+    def test_get_dynamic_values_not_dynamic(self):
+        self.assertEqual(['static'], self.store.get_dynamic_values('static', self.directory))
+
+    def test_get_dynamic_values_before_result_exists_is_not_cached(self):
+        # Arrange
+        values_before = self.store.get_dynamic_values('data.json|.value[].name', self.directory)
+        self._write_file('data.json', {'value': [{'name': 'a'}]})
+
+        # Act
+        values_after = self.store.get_dynamic_values('data.json|.value[].name', self.directory)
+
+        # Assert
+        self.assertEqual([], values_before)
+        self.assertEqual(['a'], values_after)
+
+    def test_get_dynamic_values_of_result_with_serialized_values(self):
+        # Arrange
+        self.store.publish(os.path.join(self.directory, 'data.json'), {'value': [{'created': datetime(2021, 1, 1)}]}, self.directory)
+
+        # Act
+        values = self.store.get_dynamic_values('data.json|.value[].created', self.directory)
+
+        # Assert
+        self.assertEqual(['2021-01-01T00:00:00'], values)
+
+    def test_publish_not_referenced_result_is_read_from_file(self):
+        # Arrange
+        file_path = self._write_file('other.json', {'value': ['from-file']})
+
+        # Act
+        self.store.publish(file_path, {'value': ['from-memory']}, self.directory)
+        values = self.store.get_dynamic_values('other.json|.value[]', self.directory)
+
+        # Assert
+        self.assertEqual(['from-file'], values)
+
+    def test_get_dynamic_values_glob_pattern_merges_published_and_saved_results(self):
+        # Arrange
+        self._write_file(os.path.join('items', 'a.json'), {'value': ['a']})
+        self.store.publish(os.path.join(self.directory, 'items', 'b.json'), {'value': ['b']}, self.directory)
+        self.store.publish(os.path.join(self.directory, 'items', 'nested', 'c.json'), {'value': ['c']}, self.directory)
+
+        # Act
+        values = self.store.get_dynamic_values('items/*|.value[]', self.directory)
+
+        # Assert
+        self.assertEqual(['a', 'b'], values)
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+from dragoneye.utils.json_serializer import ResultsFormat
+from dragoneye.utils.result_writer import ResultWriter, shutdown_process_pools
+
+
+def add_count(data: dict) -> None:
+    data['Count'] = len(data['Vpcs'])
+
+
+class TestResultWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data = {'Vpcs': [{'VpcId': f'vpc-{index}', 'CidrBlock': '10.0.0.0/16'} for index in range(100)]}
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def _write(self, writer: ResultWriter, file_name: str, **kwargs) -> dict:
+        output_file = os.path.join(self.temp_dir.name, file_name)
+        written = {}
+        writer.write(self.data, output_file, ResultsFormat.PRETTY, sort_keys=True,
+                     on_written=lambda sha256: written.setdefault('sha256', sha256), **kwargs)
+        writer.wait()
+        with open(output_file, 'rb') as result_file:
+            written['content'] = result_file.read()
+        return written
+
+    def test_processes_write_the_same_content_as_threads(self):
+        # Act
+        in_thread = self._write(ResultWriter(), 'in-thread.json')
+        in_process = self._write(ResultWriter(processes=2), 'in-process.json')
+
+        # Assert
+        self.assertEqual(in_thread['content'], in_process['content'])
+        self.assertEqual(in_process['sha256'], hashlib.sha256(in_process['content']).hexdigest())
+        self.assertEqual(in_thread['sha256'], in_process['sha256'])
+
+    def test_transform_is_applied_in_process(self):
+        # Act
+        written = self._write(ResultWriter(processes=2), 'transformed.json', transform=add_count)
+
+        # Assert
+        self.assertIn(b'"Count": 100', written['content'])
+        self.assertNotIn('Count', self.data)
+
+    def test_failed_write_does_not_raise(self):
+        # Arrange
+        writer = ResultWriter(processes=2)
+        output_file = os.path.join(self.temp_dir.name, 'missing-directory', 'result.json')
+        written = []
+        failed = []
+
+        # Act
+        writer.write(self.data, output_file, on_written=written.append, on_failed=failed.append)
+        writer.wait()
+
+        # Assert
+        self.assertEqual(written, [])
+        self.assertEqual(len(failed), 1)
+        self.assertIsInstance(failed[0], OSError)
+        self.assertFalse(os.path.exists(output_file))
+
+    def test_failed_write_in_thread_calls_on_failed(self):
+        # Arrange
+        writer = ResultWriter()
+        output_file = os.path.join(self.temp_dir.name, 'missing-directory', 'result.json')
+        failed = []
+
+        # Act
+        writer.write(self.data, output_file, on_failed=failed.append)
+
+        # Assert
+        self.assertEqual(len(failed), 1)
+        with self.assertRaises(OSError):
+            writer.write(self.data, output_file)
+
+    def test_write_after_process_pools_shut_down(self):
+        # Arrange
+        self._write(ResultWriter(processes=2), 'before-shutdown.json')
+
+        # Act
+        shutdown_process_pools()
+        written = self._write(ResultWriter(processes=2), 'after-shutdown.json')
+
+        # Assert
+        self.assertIn('sha256', written)
+
+    def test_wait_returns_once_result_is_written(self):
+        # Arrange
+        writer = ResultWriter(processes=2)
+        output_file = os.path.join(self.temp_dir.name, 'waited.json')
+        written = []
+
+        # Act
+        writer.write(self.data, output_file, on_written=written.append, wait=True)
+
+        # Assert
+        self.assertEqual(len(written), 1)
+        self.assertTrue(os.path.isfile(output_file))
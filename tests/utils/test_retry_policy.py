@@ -0,0 +1,123 @@
+import random
+import unittest
+
+from botocore.exceptions import EndpointConnectionError
+from mockito import mock, unstub, verify, captor
+
+from dragoneye.utils.retry_policy import RetryPolicy, CallRetries
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def tearDown(self) -> None:
+        unstub()
+
+    def test_get_retry_delay_per_call_attempts(self):
+        # Arrange
+        policy = RetryPolicy(max_attempts=3, scan_budget=100)
+        call = CallRetries()
+
+        # Act
+        delays = [policy.get_retry_delay(call) for _ in range(3)]
+
+        # Assert
+        self.assertIsNotNone(delays[0])
+        self.assertIsNotNone(delays[1])
+        self.assertIsNone(delays[2])
+        self.assertEqual(call.retries, 2)
+
+    def test_get_retry_delay_scan_budget(self):
+        # Arrange
+        policy = RetryPolicy(max_attempts=5, scan_budget=3)
+        calls = [CallRetries() for _ in range(5)]
+
+        # Act
+        delays = [policy.get_retry_delay(call) for call in calls]
+
+        # Assert
+        self.assertEqual(sum(1 for delay in delays if delay is not None), 3)
+        self.assertEqual(policy.retries_used, 3)
+
+    def test_get_retry_delay_throttled_calls_do_not_use_scan_budget(self):
+        # Arrange
+        policy = RetryPolicy(max_attempts=3, scan_budget=1)
+        calls = [CallRetries() for _ in range(5)]
+
+        # Act
+        throttled_delays = [policy.get_retry_delay(call, throttled=True) for call in calls for _ in range(3)]
+        failed_delay = policy.get_retry_delay(CallRetries())
+
+        # Assert
+        self.assertEqual(sum(1 for delay in throttled_delays if delay is not None), 5 * 2)
+        self.assertEqual([call.retries for call in calls], [2] * 5)
+        self.assertIsNotNone(failed_delay)
+        self.assertEqual(policy.retries_used, 1)
+
+    def test_get_retry_delay_jittered_exponential_backoff(self):
+        # Arrange
+        policy = RetryPolicy(max_attempts=10, scan_budget=100, base_delay=1, max_delay=5, rand=random.Random(0))
+        call = CallRetries()
+
+        # Act
+        delays = [policy.get_retry_delay(call) for _ in range(9)]
+
+        # Assert
+        for retry, delay in enumerate(delays, start=1):
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(5, 2 ** retry))
+        self.assertGreater(len(set(delays)), 1)
+
+    def test_bind(self):
+        # Arrange
+        policy = RetryPolicy()
+        call = CallRetries()
+
+        # Act
+        with policy.bind(call):
+            bound_call = policy.get_bound_call()
+
+        # Assert
+        self.assertIs(bound_call, call)
+        self.assertIsNone(policy.get_bound_call())
+
+    def test_botocore_handler_retries_transient_errors_of_bound_call(self):
+        # Arrange
+        policy = RetryPolicy(max_attempts=2, scan_budget=100)
+        events = mock()
+        client = mock({'meta': mock({'events': events})})
+        policy.register_botocore_handler(client)
+        handler = captor()
+        verify(events).register('needs-retry', handler, unique_id='dragoneye-retry-policy')
+        error = EndpointConnectionError(endpoint_url='https://ec2.us-east-1.amazonaws.com')
+        call = CallRetries()
+
+        # Act
+        with policy.bind(call):
+            first_retry = handler.value(response=None, attempts=1, caught_exception=error, operation=None, request_dict={'context': {}})
+            second_retry = handler.value(response=None, attempts=2, caught_exception=error, operation=None, request_dict={'context': {}})
+        not_transient = handler.value(response=None, attempts=1, caught_exception=ValueError(), operation=None, request_dict={'context': {}})
+
+        # Assert
+        self.assertIsNotNone(first_retry)
+        self.assertIsNone(second_retry)
+        self.assertIsNone(not_transient)
+        self.assertEqual(call.retries, 1)
+
+    def test_botocore_handler_leaves_throttling_errors_to_caller(self):
+        # Arrange
+        policy = RetryPolicy(max_attempts=2, scan_budget=100)
+        events = mock()
+        client = mock({'meta': mock({'events': events})})
+        policy.register_botocore_handler(client)
+        handler = captor()
+        verify(events).register('needs-retry', handler, unique_id='dragoneye-retry-policy')
+        http_response = mock({'status_code': 503})
+        slow_down = (http_response, {'Error': {'Code': 'SlowDown', 'Message': 'Please reduce your request rate.'}})
+        unavailable = (http_response, {'Error': {'Code': 'ServiceUnavailable', 'Message': 'Service unavailable'}})
+
+        # Act
+        throttled_retry = handler.value(response=slow_down, attempts=1, caught_exception=None, operation=None, request_dict={'context': {}})
+        transient_retry = handler.value(response=unavailable, attempts=1, caught_exception=None, operation=None, request_dict={'context': {}})
+
+        # Assert
+        self.assertIsNone(throttled_retry)
+        self.assertIsNotNone(transient_retry)
@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+import unittest
+
+from dragoneye.utils.run_log import RunLog
+from dragoneye.utils.scan_metrics import CallLabels, CallMeasurement
+
+
+class TestRunLog(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.account_data_dir = self.temp_dir.name
+        self.run_log = RunLog(self.account_data_dir, top_count=2, clock=lambda: 1000.0)
+        self.describe_instances = CallLabels('aws', 'account', 'ec2', 'describe_instances', 'us-east-1')
+        self.list_buckets = CallLabels('aws', 'account', 's3', 'list_buckets', 'us-east-1')
+
+    def tearDown(self) -> None:
+        self.run_log.close()
+        self.temp_dir.cleanup()
+
+    def _output_file(self, name: str) -> str:
+        return os.path.join(self.account_data_dir, 'us-east-1', name)
+
+    def test_record_call_streams_records_to_file(self):
+        # Act
+        self.run_log.record_call(self.describe_instances, 'ec2.describe_instances()', CallMeasurement(pages=3, duration=1.5),
+                                 self._output_file('ec2-describe_instances.json'))
+        self.run_log.record_result(self._output_file('ec2-describe_instances.json'), 2048)
+        self.run_log.close()
+
+        # Assert
+        with open(self.run_log.path, 'r') as log_file:
+            records = [json.loads(line) for line in log_file]
+        self.assertEqual(records, [
+            {'time': 1000.0, 'command': 'ec2.describe_instances', 'region': 'us-east-1', 'call': 'ec2.describe_instances()', 'status': 'ok',
+             'duration': 1.5, 'pages': 3, 'retries': 0, 'throttled': False, 'output': 'us-east-1/ec2-describe_instances.json'},
+            {'time': 1000.0, 'output': 'us-east-1/ec2-describe_instances.json', 'bytes': 2048}
+        ])
+
+    def test_read_failures_yields_only_failed_calls(self):
+        # Arrange
+        failure = {'service': 's3', 'action': 'list_buckets', 'parameters': {}, 'region': 'us-east-1', 'exception': ValueError('denied')}
+        self.run_log.record_call(self.describe_instances, 'ec2.describe_instances()', CallMeasurement(duration=0.1))
+        self.run_log.record_call(self.list_buckets, 's3.list_buckets()', CallMeasurement(duration=0.1), failure=failure)
+        self.run_log.close()
+
+        # Act
+        failures = list(self.run_log.read_failures())
+
+        # Assert
+        self.assertEqual(failures, [{**failure, 'exception': 'denied'}])
+        self.assertEqual(self.run_log.calls, 2)
+        self.assertEqual(self.run_log.failures, 1)
+
+    def test_get_report_keeps_top_calls_and_command_shares(self):
+        # Arrange
+        for index, duration in enumerate([0.5, 3.0, 1.0, 2.0]):
+            self.run_log.record_call(self.describe_instances, f'ec2.describe_instances({index})', CallMeasurement(duration=duration))
+        self.run_log.record_call(self.list_buckets, 's3.list_buckets()', CallMeasurement(duration=0.5))
+        for size in [10, 30, 20]:
+            self.run_log.record_result(self._output_file(f'result-{size}.json'), size)
+        self.run_log.close()
+
+        # Act
+        report = self.run_log.get_report()
+
+        # Assert
+        self.assertEqual([call['call'] for call in report['slowest_calls']], ['ec2.describe_instances(1)', 'ec2.describe_instances(3)'])
+        self.assertEqual([result['bytes'] for result in report['largest_results']], [30, 20])
+        self.assertEqual(report['commands'], [{'command': 'ec2.describe_instances', 'calls': 4, 'seconds': 6.5, 'share': 0.9286},
+                                              {'command': 's3.list_buckets', 'calls': 1, 'seconds': 0.5, 'share': 0.0714}])
+        self.assertEqual(report['call_seconds'], 7.0)
+        self.assertIsNotNone(report['wall_seconds'])
+
+    def test_read_cut_offs_yields_partial_and_skipped_calls(self):
+        # Arrange
+        self.run_log.record_call(self.describe_instances, 'ec2.describe_instances()', CallMeasurement(pages=2, duration=0.1, cut_off='command deadline'),
+                                 self._output_file('ec2-describe_instances.json'))
+        self.run_log.record_cut_off(self.list_buckets, 's3.list_buckets', 'scan deadline')
+        self.run_log.close()
+
+        # Act
+        cut_offs = list(self.run_log.read_cut_offs())
+
+        # Assert
+        self.assertEqual(cut_offs, [
+            {'command': 'ec2.describe_instances', 'region': 'us-east-1', 'call': 'ec2.describe_instances()', 'pages': 2,
+             'output': 'us-east-1/ec2-describe_instances.json', 'cut_off': 'command deadline'},
+            {'command': 's3.list_buckets', 'region': 'us-east-1', 'call': 's3.list_buckets', 'pages': 0, 'output': None, 'cut_off': 'scan deadline'}
+        ])
+        self.assertEqual(self.run_log.cut_offs, 2)
+        self.assertEqual(self.run_log.get_report()['cut_offs'], 2)
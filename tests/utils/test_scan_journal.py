@@ -0,0 +1,137 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+from dragoneye.utils.scan_journal import ScanJournal, JOURNAL_FILE_NAME
+
+
+class TestScanJournal(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.account_data_dir = self.temp_dir.name
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def _write_result(self, relative_path: str, content: bytes) -> str:
+        file_path = os.path.join(self.account_data_dir, relative_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'wb') as file:
+            file.write(content)
+        return file_path
+
+    def test_resume_loads_completed_calls(self):
+        # Arrange
+        result_file = self._write_result(os.path.join('us-east-1', 'ec2-DescribeVpcs.json'), b'{"Vpcs": []}')
+        empty_result_file = os.path.join(self.account_data_dir, 'us-east-1', 's3-GetBucketPolicy.json')
+        journal = ScanJournal(self.account_data_dir)
+        journal.record(result_file)
+        journal.record(empty_result_file, has_result=False)
+        journal.close()
+
+        # Act
+        resumed_journal = ScanJournal(self.account_data_dir, load=True)
+        resumed_journal.close()
+
+        # Assert
+        self.assertTrue(resumed_journal.is_completed(result_file))
+        self.assertTrue(resumed_journal.is_completed(empty_result_file))
+        self.assertFalse(resumed_journal.is_completed(os.path.join(self.account_data_dir, 'us-east-1', 'ec2-DescribeSubnets.json')))
+        self.assertEqual(resumed_journal.get_hash(result_file), hashlib.sha256(b'{"Vpcs": []}').hexdigest())
+        self.assertIsNone(resumed_journal.get_hash(empty_result_file))
+
+    def test_without_resume_previous_calls_are_not_loaded(self):
+        # Arrange
+        result_file = self._write_result('resource-groups.json', b'{}')
+        journal = ScanJournal(self.account_data_dir)
+        journal.record(result_file)
+        journal.close()
+
+        # Act
+        new_journal = ScanJournal(self.account_data_dir)
+        new_journal.close()
+
+        # Assert
+        self.assertFalse(new_journal.is_completed(result_file))
+
+    def test_resume_after_torn_entry(self):
+        # Arrange
+        first_file = self._write_result('first.json', b'{}')
+        second_file = self._write_result('second.json', b'{}')
+        journal = ScanJournal(self.account_data_dir)
+        journal.record(first_file)
+        journal.close()
+        with open(os.path.join(self.account_data_dir, JOURNAL_FILE_NAME), 'a') as journal_file:
+            journal_file.write('{"file": "torn.js')
+
+        # Act
+        resumed_journal = ScanJournal(self.account_data_dir, load=True)
+        resumed_journal.record(second_file)
+        resumed_journal.close()
+        resumed_again_journal = ScanJournal(self.account_data_dir, load=True)
+        resumed_again_journal.close()
+
+        # Assert
+        self.assertTrue(resumed_again_journal.is_completed(first_file))
+        self.assertTrue(resumed_again_journal.is_completed(second_file))
+        self.assertFalse(resumed_again_journal.is_completed(os.path.join(self.account_data_dir, 'torn.json')))
+
+    def test_is_fresh(self):
+        # Arrange
+        now = [1000.0]
+        result_file = self._write_result('iam-ListUsers.json', b'{}')
+        journal = ScanJournal(self.account_data_dir, clock=lambda: now[0])
+        journal.record(result_file)
+        journal.close()
+        now[0] += 600
+
+        # Act
+        loaded_journal = ScanJournal(self.account_data_dir, load=True, clock=lambda: now[0])
+        loaded_journal.close()
+
+        # Assert
+        self.assertTrue(loaded_journal.is_fresh(result_file, 3600))
+        self.assertFalse(loaded_journal.is_fresh(result_file, 300))
+        self.assertFalse(loaded_journal.is_fresh(result_file, None))
+        self.assertFalse(loaded_journal.is_fresh(os.path.join(self.account_data_dir, 'ec2-DescribeVpcs.json'), 3600))
+
+    def test_record_tracks_changed_results(self):
+        # Arrange
+        unchanged_file = self._write_result(os.path.join('us-east-1', 'ec2-DescribeVpcs.json'), b'{"Vpcs": []}')
+        changed_file = self._write_result(os.path.join('us-east-1', 'ec2-DescribeSubnets', 'VpcId-vpc-1.json'), b'{"Subnets": []}')
+        journal = ScanJournal(self.account_data_dir)
+        journal.record(unchanged_file)
+        journal.record(changed_file)
+        journal.close()
+        self._write_result(os.path.join('us-east-1', 'ec2-DescribeSubnets', 'VpcId-vpc-1.json'), b'{"Subnets": [{}]}')
+        loaded_journal = ScanJournal(self.account_data_dir, load=True)
+
+        # Act
+        unchanged = loaded_journal.record(unchanged_file)
+        changed = loaded_journal.record(changed_file)
+        loaded_journal.close()
+
+        # Assert
+        self.assertFalse(unchanged)
+        self.assertTrue(changed)
+        self.assertFalse(loaded_journal.has_changes(['us-east-1/ec2-DescribeVpcs.json', 'eu-west-1/ec2-DescribeSubnets']))
+        self.assertTrue(loaded_journal.has_changes(['us-east-1/ec2-DescribeSubnets']))
+        self.assertTrue(loaded_journal.has_changes(['us-east-1/ec2-Describe*']))
+
+    def test_load_compacts_journal(self):
+        # Arrange
+        result_file = self._write_result('resource-groups.json', b'{}')
+        journal = ScanJournal(self.account_data_dir)
+        for _ in range(3):
+            journal.record(result_file)
+        journal.close()
+
+        # Act
+        loaded_journal = ScanJournal(self.account_data_dir, load=True)
+        loaded_journal.close()
+
+        # Assert
+        with open(os.path.join(self.account_data_dir, JOURNAL_FILE_NAME)) as journal_file:
+            self.assertEqual(len(journal_file.readlines()), 1)
+        self.assertTrue(loaded_journal.is_completed(result_file))
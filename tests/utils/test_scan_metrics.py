@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from dragoneye.utils import scan_metrics
+from dragoneye.utils.scan_metrics import CallLabels, ScanMetrics, METRICS_JSON_FILE_NAME, METRICS_PROMETHEUS_FILE_NAME
+
+
+class TestScanMetrics(unittest.TestCase):
+    def setUp(self) -> None:
+        self.metrics = ScanMetrics()
+        self.labels = CallLabels('aws', 'account', 'ec2', 'describe_instances', 'us-east-1')
+
+    def _measure(self, latency: float, **measured) -> None:
+        with patch.object(scan_metrics.time, 'monotonic', side_effect=[0.0, latency]):
+            with self.metrics.measure_call(self.labels) as measurement:
+                for key, value in measured.items():
+                    setattr(measurement, key, value)
+
+    def test_measure_call_aggregates_calls_per_labels(self):
+        # Act
+        self._measure(0.2, pages=3, retries=1)
+        self._measure(3.0, pages=1, throttled=True, failed=True)
+        self.metrics.add_bytes_written(self.labels, 1024)
+
+        # Assert
+        call = self.metrics.to_dict()['calls'][0]
+        self.assertEqual(call['calls'], 2)
+        self.assertEqual(call['errors'], 1)
+        self.assertEqual(call['pages'], 4)
+        self.assertEqual(call['throttles'], 1)
+        self.assertEqual(call['retries'], 1)
+        self.assertEqual(call['bytes_written'], 1024)
+        self.assertEqual(call['in_flight'], 0)
+        self.assertEqual(call['latency_max'], 3.0)
+        self.assertEqual(call['latency_buckets']['0.25'], 1)
+        self.assertEqual(call['latency_buckets']['5.0'], 1)
+        self.assertEqual(self.metrics.to_dict()['totals']['calls'], 2)
+
+    def test_measure_call_counts_call_in_flight_and_raising_call_as_failed(self):
+        # Act
+        with self.assertRaises(ValueError):
+            with self.metrics.measure_call(self.labels):
+                in_flight = self.metrics.to_dict()['calls'][0]['in_flight']
+                raise ValueError()
+
+        # Assert
+        call = self.metrics.to_dict()['calls'][0]
+        self.assertEqual(in_flight, 1)
+        self.assertEqual(call['in_flight'], 0)
+        self.assertEqual(call['errors'], 1)
+
+    def test_to_prometheus_writes_cumulative_histogram(self):
+        # Arrange
+        self.labels = CallLabels('azure', 'sub"scription', 'microsoft.compute', 'virtual-machines', 'global')
+        self._measure(0.07)
+        self._measure(0.3)
+
+        # Act
+        text = self.metrics.to_prometheus()
+
+        # Assert
+        labels = 'provider="azure",account="sub\\"scription",service="microsoft.compute",operation="virtual-machines",region="global"'
+        self.assertIn('# TYPE dragoneye_call_duration_seconds histogram', text)
+        self.assertIn(f'dragoneye_call_duration_seconds_bucket{{{labels},le="0.05"}} 0', text)
+        self.assertIn(f'dragoneye_call_duration_seconds_bucket{{{labels},le="0.1"}} 1', text)
+        self.assertIn(f'dragoneye_call_duration_seconds_bucket{{{labels},le="+Inf"}} 2', text)
+        self.assertIn(f'dragoneye_call_duration_seconds_count{{{labels}}} 2', text)
+        self.assertIn(f'dragoneye_calls_in_flight{{{labels}}} 0', text)
+
+    def test_exporting_writes_metrics_when_done(self):
+        # Arrange
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # Act
+            with self.metrics.exporting(temp_dir, interval=0.01):
+                self._measure(0.1)
+
+            # Assert
+            with open(os.path.join(temp_dir, METRICS_JSON_FILE_NAME)) as metrics_file:
+                self.assertEqual(json.load(metrics_file)['totals']['calls'], 1)
+            self.assertTrue(os.path.isfile(os.path.join(temp_dir, METRICS_PROMETHEUS_FILE_NAME)))